@@ -1,11 +1,17 @@
+import importlib
 import logbook
-from class_registry import ClassRegistry
 from class_registry import RegistryKeyError
-from .base_symbol_fetcher import BaseSymbolFetcher
-from .scripts.azul import cli
-from .base_price_manager import BasePriceManager
+from .lazy_class_registry import LazyClassRegistry
+from .metrics import RunMetrics
 import pathlib
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Only for the annotations. The classes are imported when they are first used, see _LAZY_ATTRIBUTES.
+    from .base_price_manager import BasePriceManager
+    from .base_storage import BaseStorage
 
 """
 Some global vars. 
@@ -13,29 +19,105 @@ Some global vars.
 name = 'azul'
 
 __all__ = [
+    'convert_price_data',
     'get_price_data',
+    'get_price_data_status',
+    'BaseStorage',
     'BaseSymbolFetcher',
     'cli',
     'BasePriceManager',
+    'BaseAsyncPriceManager',
+    'SyncPriceManagerAdapter',
     'FORMAT_YMD',
     'price_manager_registry',
+    'RunMetrics',
+    'storage_registry',
     'symbol_fetcher_registry',
     'update_price_data'
 ]
 
-symbol_fetcher_registry = ClassRegistry()
-from .faang_symbol_fetcher import FaangSymbolFetcher
-from .sp500_wikipedia_symbol_fetcher import SP500WikipediaSymbolFetcher
+"""
+The classes, and the modules that define them, are only imported the first time they are used, so that importing
+azul (and running azul --help) doesn't import pandas, zipline, requests and pyEX. The registries import the module
+that registers a key when the key is looked up.
+"""
+_LAZY_ATTRIBUTES = {
+    'cli': '.scripts.azul',
+    'BaseStorage': '.base_storage',
+    'BaseSymbolFetcher': '.base_symbol_fetcher',
+    'BasePriceManager': '.base_price_manager',
+    'BaseAsyncPriceManager': '.base_async_price_manager',
+    'SyncPriceManagerAdapter': '.sync_price_manager_adapter',
+    'CSVStorage': '.csv_storage',
+    'ParquetStorage': '.parquet_storage',
+    'FeatherStorage': '.feather_storage',
+    'FaangSymbolFetcher': '.faang_symbol_fetcher',
+    'SP500WikipediaSymbolFetcher': '.sp500_wikipedia_symbol_fetcher',
+    'PolygonCommonStockSymbolFetcher': '.polygon_common_stock_symbol_fetcher',
+    'IEXSymbolFetcher': '.iex_symbol_fetcher',
+    'PolygonPriceManager': '.polygon_price_manager',
+    'IEXPriceManager': '.iex_price_manager',
+    'AsyncPolygonPriceManager': '.async_polygon_price_manager',
+    'SyntheticPriceManager': '.synthetic_price_manager'
+}
+
+_LAZY_MODULES = ['http_client', 'rate_limiter', 'response_cache', 'job_manifest', 'data_index']
+
+storage_registry = LazyClassRegistry()
+storage_registry.register_module('csv', 'azul.csv_storage')
+storage_registry.register_module('parquet', 'azul.parquet_storage')
+storage_registry.register_module('feather', 'azul.feather_storage')
+
+symbol_fetcher_registry = LazyClassRegistry()
+symbol_fetcher_registry.register_module('faang', 'azul.faang_symbol_fetcher')
+symbol_fetcher_registry.register_module('sp500_wikipedia', 'azul.sp500_wikipedia_symbol_fetcher')
+symbol_fetcher_registry.register_module('polygon_cs', 'azul.polygon_common_stock_symbol_fetcher')
+symbol_fetcher_registry.register_module('iex', 'azul.iex_symbol_fetcher')
+
+price_manager_registry = LazyClassRegistry()
+price_manager_registry.register_module('polygon', 'azul.polygon_price_manager')
+price_manager_registry.register_module('iex', 'azul.iex_price_manager')
+price_manager_registry.register_module('polygon_async', 'azul.async_polygon_price_manager')
+price_manager_registry.register_module('synthetic', 'azul.synthetic_price_manager')
+
+
+def __getattr__(attribute_name: str):
+    # Imports the lazy classes and modules the first time they are used.
+    if attribute_name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[attribute_name], __name__)
+        value = getattr(module, attribute_name)
+    elif attribute_name in _LAZY_MODULES:
+        value = importlib.import_module('.' + attribute_name, __name__)
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, attribute_name))
+    globals()[attribute_name] = value
+    return value
+
 
-price_manager_registry = ClassRegistry()
-from .polygon_price_manager import PolygonPriceManager
-from .iex_price_manager import IEXPriceManager
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_MODULES))
 
 
 FORMAT_YMD = '%Y-%m-%d'
 
 
-def get_price_data(symbol_source: str, data_source: str, output_dir: str, start: datetime, end: datetime) -> None:
+def get_price_data(
+        symbol_source: str,
+        data_source: str,
+        output_dir: str,
+        start: datetime,
+        end: datetime,
+        workers: int = 1,
+        file_format: str = 'csv',
+        compression: str = None,
+        cache: bool = True,
+        resume: bool = False,
+        streaming: bool = False,
+        processes: int = 0,
+        refresh_symbols: bool = False,
+        metrics_json: str = None,
+        metrics_prometheus: str = None
+) -> List[str]:
     """
     Gets symbols, downloads minute data, generates daily data, and stores it in output_dir.
 
@@ -50,19 +132,54 @@ def get_price_data(symbol_source: str, data_source: str, output_dir: str, start:
             The source of the price data.
             ``polygon`` will get price data from polygon.io
             ``iex`` will get price data from IEX.
+            ``synthetic`` will generate random price data, for benchmarks and tests.
         output_dir (str):
             The directory to store the data in.
         start (datetime):
             The date to start getting data from.
         end (datetime):
             The date to end getting data from.
+        workers (int):
+            The number of symbols to download concurrently. Defaults to 1 (one symbol at a time).
+        file_format (str):
+            The format of the files to write.
+            ``csv`` writes CSV files that zipline's csvdir bundle can ingest.
+            ``parquet`` writes Parquet files.
+            ``feather`` writes Feather files.
+        compression (str):
+            The compression to use for the parquet and feather formats. Defaults to no compression.
+        cache (bool):
+            Whether to keep the raw responses from the data source in ``~/.azul/cache`` and reuse them instead of
+            downloading sessions again. Defaults to True.
+        resume (bool):
+            Whether to record the progress of the download in ``.azul_manifest.json`` in output_dir, and to resume
+            the interrupted download recorded there, if there is one, skipping the symbols and sessions it already
+            retrieved. Defaults to False, which records nothing.
+        streaming (bool):
+            Whether to process and write each symbol's data one session at a time. This keeps the memory used per
+            symbol to about one session of minute bars, however long the date range is. The files written are the
+            same. Defaults to False.
+        processes (int):
+            The number of processes to check, resample and write the symbols' data on, while the worker threads
+            download. Defaults to 0, which does that work on the worker threads.
+        refresh_symbols (bool):
+            Whether to fetch the symbols again rather than reuse the ones saved in ``~/.azul/symbols`` by an earlier
+            run. Saved symbols are reused for a day by default. Defaults to False.
+        metrics_json (str):
+            A file to write the time spent in each stage of the download, and the requests, bytes and rows, to as
+            JSON, per symbol and for the run. A summary is always logged at the end of the run.
+        metrics_prometheus (str):
+            A file to write the run's metrics to in the Prometheus text format.
 
     Returns:
-        None
+        failed (List[str]): The symbols that couldn't be retrieved.
 
     """
     # Set the logger
     log = logbook.Logger('get_price_data')
+    from . import data_index, http_client, job_manifest, rate_limiter, response_cache
+
+    storage = _get_storage(log, file_format, compression)
 
     try:
         sym_fetcher = symbol_fetcher_registry.get(symbol_source)
@@ -70,6 +187,9 @@ def get_price_data(symbol_source: str, data_source: str, output_dir: str, start:
         log.error('No symbol fetcher registered with key: %s', symbol_source)
         raise
 
+    if refresh_symbols:
+        sym_fetcher.refresh_interval = timedelta(0)
+
     # Get the symbols
     log.notice('Fetching ticker symbols...')
     symbols = sym_fetcher.symbols()
@@ -90,14 +210,264 @@ def get_price_data(symbol_source: str, data_source: str, output_dir: str, start:
         pathlib.Path(default_output_dir_path).mkdir(parents=True, exist_ok=True)
         output_dir = str(default_output_dir_path)
 
+    price_manager.rate_limiter = rate_limiter.get_rate_limiter(data_source)
+    price_manager.storage = storage
+    price_manager.response_cache = response_cache.get_response_cache() if cache else None
+    if resume:
+        price_manager.job_manifest = job_manifest.JobManifest(output_dir, params={
+            'symbol_source': symbol_source,
+            'data_source': data_source,
+            'start': None if start is None else start.isoformat(),
+            'end': None if end is None else end.isoformat(),
+            'file_format': file_format,
+            'compression': compression
+        }, resume=True)
+    else:
+        # The files a recorded job wrote are about to be replaced, so it can't be resumed any more.
+        job_manifest.discard_job(output_dir)
+    price_manager.streaming = streaming
+    price_manager.processes = processes
+    price_manager.metrics = RunMetrics()
+    price_manager.data_index = data_index.DataIndex(output_dir)
+
+    # Make sure every worker can keep a connection open.
+    if workers > http_client.get_http_client().pool_size:
+        http_client.configure_http_client(pool_size=workers)
+
     log.notice('Fetching price data...')
-    price_manager.get_price_data(symbols, output_dir, start, end)
+    failed = price_manager.get_price_data(symbols, output_dir, start, end, workers=workers)
     log.notice('Fetched price data.')
+    _log_rate_limiter_stats(log, price_manager)
+    _report_metrics(log, price_manager.metrics, data_source, metrics_json, metrics_prometheus)
+    return failed
+
+
+def update_price_data(
+        data_source: str,
+        output_dir_path: pathlib.Path,
+        end: datetime = None,
+        workers: int = 1,
+        file_format: str = 'csv',
+        cache: bool = True
+) -> List[str]:
+    """
+    Appends the price data after the last stored minute bar to each symbol's minute and daily data in output_dir_path.
+
+    The last stored minute bar is read from the data index in ``.azul_index.json`` if the symbol's file hasn't changed
+    since it was indexed.
+
+    Args:
+        data_source (str):
+            The source of the price data. See get_price_data.
+        output_dir_path (Path):
+            The directory the data is stored in. Defaults to ``~/.azul/<data_source>``.
+        end (datetime):
+            The date to end getting data from. Defaults to today.
+        workers (int):
+            The number of symbols to update concurrently. Defaults to 1 (one symbol at a time).
+        file_format (str):
+            The format of the stored files. See get_price_data.
+        cache (bool):
+            Whether to use the response cache. See get_price_data.
+
+    Returns:
+        failed (List[str]): The symbols that couldn't be updated.
+
+    """
+    # Set the logger
+    log = logbook.Logger('update_price_data')
+    from . import data_index, rate_limiter, response_cache
+
+    storage = _get_storage(log, file_format)
+
+    # Get the price manager
+    try:
+        price_manager = price_manager_registry.get(data_source)
+    except RegistryKeyError:
+        log.error('No price manager registered with key: %s', data_source)
+        raise
+
+    if output_dir_path is None:
+        output_dir_path = pathlib.Path.home() / ('.azul/' + data_source)
+
+    price_manager.rate_limiter = rate_limiter.get_rate_limiter(data_source)
+    price_manager.storage = storage
+    price_manager.response_cache = response_cache.get_response_cache() if cache else None
+    price_manager.data_index = data_index.DataIndex(str(output_dir_path))
+
+    log.notice('Updating price data...')
+    failed = price_manager.update_price_data(str(output_dir_path), end, workers=workers)
+    log.notice('Updated price data.')
+    _log_rate_limiter_stats(log, price_manager)
+    return failed
 
 
-def update_price_data(data_source: str, output_dir_path: pathlib.Path) -> None:
-    pass
+def _log_rate_limiter_stats(log: logbook.Logger, price_manager: 'BasePriceManager') -> None:
+    if price_manager.rate_limiter is None:
+        return
 
+    stats = price_manager.rate_limiter.stats()
+    log.notice('Rate limited {} of {} requests for a total of {:.1f} seconds.'.format(
+        stats['num_waits'], stats['num_requests'], stats['wait_time']))
 
 
+def _report_metrics(
+        log: logbook.Logger,
+        metrics: RunMetrics,
+        data_source: str,
+        metrics_json: str = None,
+        metrics_prometheus: str = None
+) -> None:
+    metrics.finish()
+    log.notice('Run metrics:\n{}'.format(metrics.summary()))
+    if metrics_json is not None:
+        metrics.write_json(metrics_json)
+        log.notice('Wrote the run metrics to: {}'.format(metrics_json))
+    if metrics_prometheus is not None:
+        metrics.write_prometheus(metrics_prometheus, labels={'data_source': data_source})
+        log.notice('Wrote the run metrics to: {}'.format(metrics_prometheus))
+
+
+def convert_price_data(
+        input_dir: str,
+        output_dir: str,
+        input_format: str,
+        output_format: str = 'csv',
+        compression: str = None
+) -> None:
+    """
+    Converts the minute and daily data in input_dir from one file format to another.
+
+    Converting to ``csv`` creates the layout that zipline's csvdir bundle expects: ``<output_dir>/minute/<TICKER>.csv``
+    and ``<output_dir>/daily/<TICKER>.csv``. The converted files are recorded in output_dir's data index.
+
+    Args:
+        input_dir (str):
+            The directory containing the minute and daily directories to convert.
+        output_dir (str):
+            The directory to write the converted minute and daily directories to.
+        input_format (str):
+            The format of the files in input_dir. See get_price_data.
+        output_format (str):
+            The format to convert the files to. Defaults to ``csv``.
+        compression (str):
+            The compression to use for the output files, if the output format supports it.
+
+    Returns:
+        None
+
+    """
+    # Set the logger
+    log = logbook.Logger('convert_price_data')
+    from . import data_index
+
+    input_storage = _get_storage(log, input_format)
+    output_storage = _get_storage(log, output_format, compression)
+    index = data_index.DataIndex(output_dir)
+
+    for frequency in ['minute', 'daily']:
+        input_dir_path = pathlib.Path(input_dir, frequency)
+        output_dir_path = pathlib.Path(output_dir, frequency)
+        tickers = input_storage.tickers(input_dir_path)
+        if not tickers:
+            continue
+
+        output_dir_path.mkdir(parents=True, exist_ok=True)
+        for ticker in tickers:
+            df = input_storage.read(input_storage.path(input_dir_path, ticker))
+            output_path = output_storage.path(output_dir_path, ticker)
+            output_storage.write(df, output_path)
+            index.record(ticker, frequency, output_path, df)
+        log.notice('Converted {} {} files.'.format(len(tickers), frequency))
+
+    index.save()
+
+
+def get_price_data_status(
+        output_dir: str,
+        file_format: str = 'csv',
+        symbols: List[str] = None,
+        verify: bool = False,
+        rebuild: bool = False
+) -> List[dict]:
+    """
+    Describes the data stored for each symbol in output_dir from its data index, without reading the files.
+
+    Args:
+        output_dir (str):
+            The directory containing the minute and daily directories.
+        file_format (str):
+            The format of the stored files. See get_price_data.
+        symbols (List[str]):
+            The symbols to describe. Defaults to every symbol with a file or an entry in the index.
+        verify (bool):
+            Whether to check every file against its checksum in the index. This reads every file. Otherwise files
+            are only compared with the index by their size and modification time. Defaults to False.
+        rebuild (bool):
+            Whether to rebuild the index by reading every file first, e.g. for data that was downloaded before azul
+            kept an index. Defaults to False.
+
+    Returns:
+        status (List[dict]): For each symbol, sorted: its ``symbol``, the ``first`` and ``last`` minute bars, the
+            number of ``minute_rows`` and ``daily_rows``, the number of ``missing_sessions`` in the daily data, and its
+            ``state``. The state is ``ok`` if the files are the ones in the index, ``changed`` if a file has changed
+            since it was indexed, ``missing`` if an indexed file doesn't exist and ``unindexed`` if a file isn't in
+            the index. The values that come from the index are None for files that aren't in it.
+
+    """
+    # Set the logger
+    log = logbook.Logger('get_price_data_status')
+    from . import data_index
+
+    storage = _get_storage(log, file_format)
+    index = data_index.DataIndex(output_dir)
+    if rebuild:
+        log.notice('Rebuilding the data index in: {}'.format(output_dir))
+        index.rebuild(storage)
+
+    dir_paths = {frequency: pathlib.Path(output_dir, frequency) for frequency in data_index.FREQUENCIES}
+    if symbols is None:
+        symbols = set(index.tickers())
+        for dir_path in dir_paths.values():
+            symbols.update(storage.tickers(dir_path))
+
+    # The first state in this list that any of a symbol's files is in is the symbol's state.
+    states = [data_index.MISSING, data_index.CHANGED, data_index.UNINDEXED, data_index.OK]
+    status = []
+    for ticker in sorted(symbols):
+        entries = {}
+        file_states = []
+        for frequency, dir_path in dir_paths.items():
+            path = storage.path(dir_path, ticker)
+            file_state = index.verify(ticker, frequency, path) if verify else index.state(ticker, frequency, path)
+            if file_state is not None:
+                file_states.append(file_state)
+            entries[frequency] = index.entry(ticker, frequency) or {}
+
+        status.append({
+            'symbol': ticker,
+            'first': entries['minute'].get('first'),
+            'last': entries['minute'].get('last'),
+            'minute_rows': entries['minute'].get('rows'),
+            'daily_rows': entries['daily'].get('rows'),
+            'missing_sessions': entries['daily'].get('missing_sessions'),
+            'state': next((state for state in states if state in file_states), data_index.MISSING)
+        })
+
+    # Verifying records the checksums that weren't computed when bars were appended.
+    index.save()
+    return status
+
+
+def _get_storage(log: logbook.Logger, file_format: str, compression: str = None) -> 'BaseStorage':
+    try:
+        return storage_registry.get(file_format, compression=compression)
+    except RegistryKeyError:
+        log.error('No storage registered with key: %s', file_format)
+        raise
+
 
+# Module __getattr__ needs Python 3.7 or later. Before that, import the lazy classes and modules straight away.
+if sys.version_info < (3, 7):
+    for _attribute_name in list(_LAZY_ATTRIBUTES) + _LAZY_MODULES:
+        __getattr__(_attribute_name)
@@ -0,0 +1,58 @@
+import asyncio
+import logbook
+
+log = logbook.Logger('AsyncFetchScheduler')
+
+
+class AsyncFetchScheduler(object):
+    """
+    Runs fetches on an event loop with at most max_concurrency of them in flight at once.
+
+    Any number of fetches can be scheduled. The ones over the limit wait their turn, so thousands of
+    (ticker, session) fetches can be started at once without opening thousands of connections.
+
+    Args:
+        max_concurrency (int): The most fetches to run at once.
+        rate_limiter (TokenBucketRateLimiter): Limits how often fetches start. None means no limit.
+
+    """
+
+    def __init__(self, max_concurrency: int = 100, rate_limiter=None):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1, got: {}'.format(max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+
+        # The semaphore is created on the event loop that runs the fetches.
+        self._semaphore = None
+
+        self.num_fetches = 0
+        self.num_in_flight = 0
+        self.max_in_flight = 0
+
+    async def run(self, func, *args):
+        """
+        Waits for a free slot, then awaits func(*args).
+
+        Args:
+            func (coroutine function): The fetch.
+            *args: Passed to func.
+
+        Returns:
+            The result of the fetch.
+
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+
+            self.num_fetches += 1
+            self.num_in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.num_in_flight)
+            try:
+                return await func(*args)
+            finally:
+                self.num_in_flight -= 1
@@ -0,0 +1,141 @@
+import asyncio
+import logbook
+import time
+import pandas as pd
+from typing import Optional
+from azul import price_manager_registry
+from .base_async_price_manager import BaseAsyncPriceManager, get_running_loop
+from .http_client import RETRY_STATUS_CODES
+from .polygon_price_manager import PolygonPriceManager
+
+log = logbook.Logger('AsyncPolygonPriceManager')
+
+# Use aiohttp for the requests if it is installed. Otherwise the requests are made by the shared HttpClient on
+# worker threads.
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+@price_manager_registry.register('polygon_async')
+class AsyncPolygonPriceManager(BaseAsyncPriceManager, PolygonPriceManager):
+    """
+    Gets minute bars from polygon with many session requests in flight at once.
+
+    Each session is one request, and MAX_CONCURRENT_REQUESTS of them are in flight at once across all the symbols.
+    The responses are read and cached the same way as PolygonPriceManager's.
+
+    """
+
+    # The synchronous paths fetch the same way PolygonPriceManager does.
+    _minute_dataframe_for_date = PolygonPriceManager._minute_dataframe_for_date
+
+    def __init__(self):
+        super().__init__()
+        self._session = None
+
+    async def _minute_dataframe_for_date_async(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
+        end_timestamp = start_timestamp.replace(hour=23, minute=59)
+        data = await self._cached_response_async(
+            ticker,
+            start_timestamp,
+            lambda: self._historic_agg_response_async(ticker, start_timestamp, end_timestamp)
+        )
+
+        # Reading the response is CPU bound, so do it off the event loop.
+        loop = get_running_loop()
+        return await loop.run_in_executor(
+            None, self._session_minute_dataframe, data, ticker, start_timestamp, end_timestamp)
+
+    async def _historic_agg_response_async(
+            self,
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> Optional[bytes]:
+        """
+        Gets the raw minute aggregates response for a ticker between two times.
+
+        Throttled and failed requests are retried the same way as the HttpClient retries them, waiting as long as a
+        Retry-After header asks and taking a token from the rate limiter before each retry.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The time to get minute bars from.
+            end_timestamp (Timestamp): The time to get minute bars to.
+
+        Returns:
+            data (bytes): The body of the response, or None if there was an error.
+
+        """
+        if self._session is None:
+            loop = get_running_loop()
+            return await loop.run_in_executor(
+                None, self._historic_agg_response, ticker, start_timestamp, end_timestamp)
+
+        url, params = self._historic_agg_request(ticker, start_timestamp, end_timestamp)
+        params = {key: str(value) for key, value in params.items()}
+
+        status = None
+        data = None
+        num_throttled = 0
+        # The request awaits, so other coroutines run on this thread while it is in flight. Its wall time is measured
+        # here rather than with a stage timer, which would take their time out of it.
+        started = time.perf_counter()
+        for attempt in range(self._http_client.max_retries + 1):
+            if attempt > 0 and self.rate_limiter is not None:
+                # The scheduler took a token for the first attempt. Each retry takes another.
+                await self.rate_limiter.acquire_async()
+            try:
+                async with self._session.get(url, params=params) as response:
+                    status = response.status
+                    retry_after = response.headers.get('Retry-After')
+                    data = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self._http_client.max_retries:
+                    # Fail the session rather than the symbol, and leave its other sessions to finish.
+                    log.error('Error getting {}: {}'.format(url, e))
+                    status = None
+                    data = None
+                    break
+                delay = self._http_client._retry_delay(attempt)
+                log.info('Error getting {}: {}. Retrying in {:.2f} seconds.'.format(url, e, delay))
+            else:
+                if status == 429:
+                    num_throttled += 1
+                if status not in RETRY_STATUS_CODES or attempt == self._http_client.max_retries:
+                    break
+                delay = self._http_client._retry_delay(attempt, retry_after)
+                log.info('Response status code {} for {}. Retrying in {:.2f} seconds.'.format(status, url, delay))
+            await asyncio.sleep(delay)
+
+        if self.metrics is not None:
+            self.metrics.add_time('http', ticker, wall=time.perf_counter() - started)
+            self.metrics.count('requests', ticker)
+            self.metrics.count('bytes_received', ticker, len(data or b''))
+            self.metrics.count('retries', ticker, attempt)
+            self.metrics.count('throttled', ticker, num_throttled)
+            if status != 200:
+                self.metrics.count('http_errors', ticker)
+
+        if status != 200:
+            self._log_historic_agg_error(ticker, start_timestamp, end_timestamp, status)
+            return None
+
+        return data
+
+    async def _open_async(self) -> None:
+        if aiohttp is None:
+            return
+        timeout = self._http_client.timeout
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.MAX_CONCURRENT_REQUESTS),
+            timeout=aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+        )
+
+    async def _close_async(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
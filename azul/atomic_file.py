@@ -0,0 +1,91 @@
+import contextlib
+import os
+import pathlib
+import tempfile
+
+# The temporary files are named after the file they replace, with this suffix, and start with a dot.
+TEMP_SUFFIX = '.tmp'
+
+
+def _current_umask() -> int:
+    # The umask can only be read by setting it, so read it once, before any threads are writing files.
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _current_umask()
+
+
+class AtomicFile(object):
+    """
+    A file that is written under a temporary name next to its path and moved into place when it is complete, so
+    whatever reads the path sees either the old file or the whole new one, never part of it.
+
+    The temporary file is created, empty, when the AtomicFile is, with the permissions of the file it replaces, or
+    those of a new file if there isn't one. Write it by opening temp_path, then call commit to
+    replace path with it or discard to delete it.
+
+    Args:
+        path (Path): The file to write. Its directory is created if needed.
+
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix='.' + self.path.name + '.',
+                                         suffix=TEMP_SUFFIX)
+        os.close(fd)
+        self.temp_path = pathlib.Path(temp_path)
+
+        # mkstemp makes the file readable by its owner only.
+        try:
+            mode = self.path.stat().st_mode & 0o7777
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, mode)
+
+    def commit(self) -> None:
+        """
+        Replaces the file with the temporary file.
+        """
+        try:
+            os.replace(str(self.temp_path), str(self.path))
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self) -> None:
+        """
+        Deletes the temporary file, leaving the file as it was.
+        """
+        try:
+            os.remove(str(self.temp_path))
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def atomic_write(path: pathlib.Path, mode: str = 'w', **kwargs):
+    """
+    Opens a file to be written atomically. The file is replaced when the with block finishes, and left as it was if
+    the block raises.
+
+    Args:
+        path (Path): The file to write.
+        mode (str): The mode to open the temporary file with, e.g. ``w`` or ``wb``.
+        **kwargs: Passed to open.
+
+    Returns:
+        file: The temporary file, open for writing.
+
+    """
+    atomic_file = AtomicFile(path)
+    try:
+        with open(str(atomic_file.temp_path), mode, **kwargs) as f:
+            yield f
+    except BaseException:
+        atomic_file.discard()
+        raise
+    atomic_file.commit()
@@ -0,0 +1,301 @@
+import asyncio
+import logbook
+import pandas as pd
+import pathlib
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+from .base_price_manager import BasePriceManager
+from .async_fetch_scheduler import AsyncFetchScheduler
+
+log = logbook.Logger('BaseAsyncPriceManager')
+
+# The event loop running the calling coroutine. get_event_loop returns the same loop from a coroutine before Python 3.7.
+get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+def run_coroutine(coroutine):
+    """
+    Runs a coroutine to completion on a new event loop and returns its result.
+
+    Args:
+        coroutine (coroutine): The coroutine to run.
+
+    Returns:
+        The result of the coroutine.
+
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class BaseAsyncPriceManager(BasePriceManager):
+    """
+    A price manager that fetches sessions with coroutines, running all the symbols' fetches on one event loop.
+
+    Subclasses implement _minute_dataframe_for_date_async. Each symbol's sessions are fetched newest first, a window
+    of sessions at a time, so a symbol that stops returning data stops being fetched after about one window. The
+    fetches of every symbol share an AsyncFetchScheduler that keeps at most MAX_CONCURRENT_REQUESTS of them in flight.
+
+    get_price_data and update_price_data keep working from synchronous code.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # The most fetches to have in flight at once, across all the symbols.
+        self.MAX_CONCURRENT_REQUESTS = 100
+
+        # The number of sessions of one symbol to fetch at once.
+        self.SESSIONS_PER_WINDOW = 20
+
+        # Schedules the fetches of the current get_price_data_async call.
+        self.scheduler = None
+
+    def get_price_data(
+            self,
+            symbols: List[str],
+            output_dir: str,
+            start_date: datetime,
+            end_date: datetime,
+            workers: int = 1
+    ) -> List[str]:
+        """
+        Runs get_price_data_async on a new event loop.
+
+        Args:
+            symbols (List[str]): The ticker symbols to get data for.
+            output_dir (str): The directory to store the data in.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+            workers (int): Ignored. The concurrency is set by MAX_CONCURRENT_REQUESTS.
+
+        Returns:
+            failed (List[str]): The symbols that couldn't be retrieved.
+
+        """
+        return run_coroutine(self.get_price_data_async(symbols, output_dir, start_date, end_date))
+
+    async def get_price_data_async(
+            self,
+            symbols: List[str],
+            output_dir: str,
+            start_date: datetime,
+            end_date: datetime
+    ) -> List[str]:
+        """
+        Downloads minute data for each symbol, generates daily data, and stores both in output_dir.
+
+        The symbols are downloaded concurrently. Each symbol's data is processed and written on a worker thread once
+        all its sessions have been fetched, so writing one symbol doesn't hold up the fetches of the others.
+
+        Args:
+            symbols (List[str]): The ticker symbols to get data for.
+            output_dir (str): The directory to store the data in.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+
+        Returns:
+            failed (List[str]): The symbols that couldn't be retrieved.
+
+        """
+        minute_dir_path = pathlib.Path(output_dir, 'minute')
+        daily_dir_path = pathlib.Path(output_dir, 'daily')
+
+        if self.job_manifest is not None:
+            num_symbols = len(symbols)
+            symbols = [ticker for ticker in symbols if not self.job_manifest.is_symbol_complete(ticker)]
+            if len(symbols) < num_symbols:
+                log.notice('Skipping {} symbols that were already retrieved.'.format(num_symbols - len(symbols)))
+
+        self.scheduler = AsyncFetchScheduler(self.MAX_CONCURRENT_REQUESTS, self.rate_limiter)
+
+        async def safely(ticker):
+            try:
+                await self._download_and_process_data_async(
+                    ticker, start_date, end_date, minute_dir_path, daily_dir_path)
+            except Exception as e:
+                log.error('Error retrieving {}: {}'.format(ticker, e))
+                return False
+            return True
+
+        self._open_process_pool()
+        await self._open_async()
+        try:
+            results = await asyncio.gather(*[safely(ticker) for ticker in symbols])
+        finally:
+            await self._close_async()
+            self._close_process_pool()
+
+        failed = [ticker for ticker, succeeded in zip(symbols, results) if not succeeded]
+        if failed:
+            log.warning('Failed to retrieve {} of {} symbols: {}'.format(len(failed), len(symbols), ', '.join(failed)))
+
+        log.info('Made {} fetches, at most {} at once'.format(self.scheduler.num_fetches, self.scheduler.max_in_flight))
+
+        if self.job_manifest is not None:
+            self.job_manifest.finish()
+        return failed
+
+    async def _download_and_process_data_async(
+            self,
+            ticker: str,
+            start_date: datetime,
+            end_date: datetime,
+            minute_dir_path: pathlib.Path,
+            daily_dir_path: pathlib.Path
+    ) -> None:
+        loop = get_running_loop()
+        if self.streaming:
+            # A streaming download fetches one session at a time, so it runs the synchronous path on a worker thread.
+            await loop.run_in_executor(
+                None, self._stream_and_process_data, ticker, start_date, end_date, minute_dir_path, daily_dir_path)
+        else:
+            df = await self._minute_dataframe_for_dates_async(ticker, start_date, end_date)
+            await loop.run_in_executor(None, self._process_and_write_data, ticker, df, minute_dir_path, daily_dir_path)
+
+        if self.job_manifest is not None:
+            self.job_manifest.mark_symbol_complete(ticker)
+
+    async def _minute_dataframe_for_dates_async(
+            self,
+            ticker: str,
+            start_date: datetime,
+            end_date: datetime
+    ) -> pd.DataFrame:
+        """
+        Returns a DataFrame containing the all the minute bars for stock between the start and end dates.
+
+        The same as _minute_dataframe_for_dates, except that SESSIONS_PER_WINDOW sessions are fetched at once.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+
+        Returns:
+            combined_df (DataFrame): Contains the all the minute bars for a stock between the start and end dates.
+
+        """
+        session_dates = self._session_dates_in_range(ticker, start_date, end_date)
+
+        session_dfs = []
+        num_missing_dates = 0
+        window_size = max(1, self.SESSIONS_PER_WINDOW)
+        for window_end in range(len(session_dates), 0, -window_size):
+            window = session_dates[max(0, window_end - window_size):window_end]
+            dfs = await self._session_minute_dataframes_async(ticker, window)
+
+            # Go through the window newest first, the same as the synchronous path, so the same sessions are kept.
+            for timestamp, df in zip(reversed(window), reversed(dfs)):
+                if df.empty:
+                    num_missing_dates += 1
+                    log.info('No minute data for {} on {}'.format(ticker, timestamp.date()))
+                else:
+                    num_missing_dates = 0
+                    log.info('Retrieved minute data for {} on {}'.format(ticker, timestamp.date()))
+                    session_dfs.append(df)
+
+                if num_missing_dates >= self.MISSING_DATE_THRESHOLD:
+                    log.info('No minute data for {} for {} days. Quitting.'.format(
+                        ticker, self.MISSING_DATE_THRESHOLD))
+                    return self._combined_minute_dataframe(session_dfs)
+
+        return self._combined_minute_dataframe(session_dfs)
+
+    async def _session_minute_dataframes_async(
+            self,
+            ticker: str,
+            session_dates: pd.DatetimeIndex
+    ) -> List[pd.DataFrame]:
+        """
+        Fetches the minute bars for some sessions concurrently.
+
+        Sessions recorded in the job manifest are read from it instead of being fetched again.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session_dates (DatetimeIndex): The sessions, oldest first.
+
+        Returns:
+            dfs (List[DataFrame]): The minute bars for each session, oldest first. Empty if there weren't any.
+
+        """
+        dfs = self.job_manifest.sessions(ticker, session_dates) if self.job_manifest is not None else None
+        if dfs is not None:
+            return dfs
+
+        dfs = await asyncio.gather(*[self._fetch_session_minute_dataframe_async(ticker, timestamp)
+                                     for timestamp in session_dates])
+        if self.job_manifest is not None:
+            self.job_manifest.record_sessions(ticker, session_dates, dfs)
+        return dfs
+
+    async def _fetch_session_minute_dataframe_async(self, ticker: str, timestamp: pd.Timestamp) -> pd.DataFrame:
+        # Cached sessions don't need a request, so they don't wait for the scheduler or the rate limiter.
+        if self._sessions_are_cached(ticker, [timestamp]):
+            return await self._minute_dataframe_for_date_async(ticker, timestamp)
+        return await self.scheduler.run(self._minute_dataframe_for_date_async, ticker, timestamp)
+
+    async def _cached_response_async(
+            self,
+            ticker: str,
+            session: pd.Timestamp,
+            fetch: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[bytes]:
+        """
+        The same as _cached_response, except that fetch is a coroutine function.
+        """
+        if self.response_cache is None:
+            return await fetch()
+
+        provider = type(self).__name__
+        data = self.response_cache.get(provider, ticker, session)
+        if data is None:
+            data = await fetch()
+            if data is not None:
+                self.response_cache.put(provider, ticker, session, data)
+        else:
+            self._count('cached_responses', ticker)
+        return data
+
+    async def _open_async(self) -> None:
+        """
+        Called on the event loop before any fetches. Subclasses can open their connections here.
+        """
+        pass
+
+    async def _close_async(self) -> None:
+        """
+        Called on the event loop after all the fetches.
+        """
+        pass
+
+    def _minute_dataframe_for_date(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
+        # Lets the synchronous paths, like update_price_data, use the async fetch.
+        async def fetch():
+            await self._open_async()
+            try:
+                return await self._minute_dataframe_for_date_async(ticker, start_timestamp)
+            finally:
+                await self._close_async()
+
+        return run_coroutine(fetch())
+
+    async def _minute_dataframe_for_date_async(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
+        """
+        Returns a DataFrame containing the minute bars for one session.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The session.
+
+        Returns:
+            df (DataFrame): The minute bars, sorted oldest first, indexed by (timezone naive) UTC time. Empty if there
+                weren't any.
+
+        """
+        raise NotImplementedError
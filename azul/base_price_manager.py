@@ -1,31 +1,228 @@
 import logbook
 import pandas as pd
-import zipline as zl
 from datetime import datetime, timedelta
+import os
 import pathlib
+import tempfile
 import azul
 import numpy as np
-from typing import List, Tuple
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from .calendar_index import get_calendar_index
+from . import post_processing
+from .metrics import NULL_TIMER
 
 log = logbook.Logger('BasePriceManager')
 
+# What _reconcile_sessions changed. added and removed are the indexes of the rows that were added and removed.
+# num_missing is the number of minutes that are missing from minute data.
+SessionReport = namedtuple('SessionReport', ['added', 'removed', 'num_missing'])
+
+# When streaming, the number of sessions' daily bars to collect before adding them to the symbol's daily bars.
+DAILY_BARS_PER_FOLD = 64
+
 
 class BasePriceManager(object):
 
     def __init__(self, calendar_name='NYSE'):
-        self._calendar = zl.get_calendar(name=calendar_name)
+        # The calendar's sessions and minutes are computed once and shared by every price manager.
+        self._calendar = get_calendar_index(calendar_name)
         self._cols = ['open', 'high', 'low', 'close', 'volume', 'dividend', 'split']
 
         # The number of days the price manager will keep trying to pull data for a symbol that is not returning data.
         self.MISSING_DATE_THRESHOLD = 5
 
-    def get_price_data(self, symbols: List[str], output_dir: str, start_date: datetime, end_date: datetime) -> None:
+        # The number of sessions the price manager can fetch with one call to _minute_dataframe_for_date_range.
+        # Subclasses that implement _minute_dataframe_for_date_range should set this to more than 1.
+        self.MAX_SESSIONS_PER_REQUEST = 1
+
+        # The number of symbols the price manager can fetch with one request. get_price_data downloads the symbols
+        # this many at a time, calling _prefetch before each group. Subclasses that implement _prefetch should set
+        # this to more than 1.
+        self.MAX_SYMBOLS_PER_REQUEST = 1
+
+        # Limits how often the price manager asks its provider for data. None means no limit.
+        self.rate_limiter = None
+
+        # How the minute and daily data files are written.
+        self.storage = azul.storage_registry.get('csv')
+
+        # Keeps the raw responses from the provider so sessions aren't downloaded twice. None means no caching.
+        self.response_cache = None
+
+        # Records the progress of get_price_data so an interrupted download can be resumed. None means no record.
+        self.job_manifest = None
+
+        # Whether get_price_data processes and writes one session at a time rather than a symbol's whole history at
+        # once. Streaming bounds the memory used per symbol to about one session's minute bars.
+        self.streaming = False
+
+        # The number of processes get_price_data checks, resamples and writes the symbols' data on. 0 does it on the
+        # threads that download the data, where the work is serialized by the GIL.
+        self.processes = 0
+        self._process_pool = None
+
+        # Records the time spent in each stage of get_price_data and counts the requests, bytes and rows. None
+        # records nothing.
+        self.metrics = None
+
+        # Records the first and last bars, rows and checksum of every file written, so what is stored can be found
+        # without reading the files. None records nothing.
+        self.data_index = None
+
+    def get_price_data(
+            self,
+            symbols: List[str],
+            output_dir: str,
+            start_date: datetime,
+            end_date: datetime,
+            workers: int = 1
+    ) -> List[str]:
+        """
+        Downloads minute data for each symbol, generates daily data, and stores both in output_dir.
+
+        Args:
+            symbols (List[str]): The ticker symbols to get data for.
+            output_dir (str): The directory to store the data in.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+            workers (int): The number of symbols to download concurrently. 1 downloads them one at a time.
+
+        Returns:
+            failed (List[str]): The symbols that couldn't be retrieved.
+
+        """
         minute_dir_path = pathlib.Path(output_dir, 'minute')
         daily_dir_path = pathlib.Path(output_dir, 'daily')
 
-        for ticker in symbols:
-            self._download_and_process_data(
-                ticker, start_date, end_date, minute_dir_path, daily_dir_path)
+        if self.job_manifest is not None:
+            num_symbols = len(symbols)
+            symbols = [ticker for ticker in symbols if not self.job_manifest.is_symbol_complete(ticker)]
+            if len(symbols) < num_symbols:
+                log.notice('Skipping {} symbols that were already retrieved.'.format(num_symbols - len(symbols)))
+
+        def download(ticker):
+            self._download_and_process_data(ticker, start_date, end_date, minute_dir_path, daily_dir_path)
+            if self.job_manifest is not None:
+                self.job_manifest.mark_symbol_complete(ticker)
+
+        def prefetch(group):
+            # The symbols are still downloaded one at a time if prefetching them fails.
+            try:
+                self._prefetch(group, start_date, end_date)
+            except Exception as e:
+                log.warning('Error prefetching {} symbols: {}'.format(len(group), e))
+
+        self._open_process_pool()
+        try:
+            failed = self._for_each_symbol(symbols, download, workers, group_size=self.MAX_SYMBOLS_PER_REQUEST,
+                                           prepare_group=prefetch)
+        finally:
+            self._close_process_pool()
+            if self.data_index is not None:
+                self.data_index.save()
+
+        if self.job_manifest is not None:
+            self.job_manifest.finish()
+        return failed
+
+    def update_price_data(self, output_dir: str, end_date: datetime = None, workers: int = 1) -> List[str]:
+        """
+        Appends any sessions after the last stored minute bar to the minute and daily data in output_dir.
+
+        The symbols to update are the ones with minute data in output_dir.
+
+        Args:
+            output_dir (str): The directory the data is stored in.
+            end_date (datetime): Date to stop pulling data. Defaults to today.
+            workers (int): The number of symbols to update concurrently. 1 updates them one at a time.
+
+        Returns:
+            failed (List[str]): The symbols that couldn't be updated.
+
+        """
+        minute_dir_path = pathlib.Path(output_dir, 'minute')
+        daily_dir_path = pathlib.Path(output_dir, 'daily')
+
+        symbols = self.storage.tickers(minute_dir_path)
+        if not symbols:
+            log.notice('No minute data to update in: {}'.format(minute_dir_path))
+            return []
+
+        try:
+            return self._for_each_symbol(
+                symbols,
+                lambda ticker: self._update_data(ticker, end_date, minute_dir_path, daily_dir_path),
+                workers
+            )
+        finally:
+            if self.data_index is not None:
+                self.data_index.save()
+
+    def _for_each_symbol(
+            self,
+            symbols: List[str],
+            func,
+            workers: int,
+            group_size: int = None,
+            prepare_group=None
+    ) -> List[str]:
+        """
+        Calls func for each symbol, optionally on a pool of threads.
+
+        An exception raised for one symbol is logged and doesn't stop the others.
+
+        Args:
+            symbols (List[str]): The ticker symbols.
+            func (callable): Called with each ticker symbol.
+            workers (int): The number of symbols to process concurrently. 1 processes them one at a time.
+            group_size (int): The symbols are processed this many at a time. None processes them all at once.
+            prepare_group (callable): Called with each group of symbols before they are processed.
+
+        Returns:
+            failed (List[str]): The symbols func raised an exception for.
+
+        """
+        if workers is None or workers < 1:
+            raise ValueError('workers must be at least 1, got: {}'.format(workers))
+
+        if group_size is None or group_size < 1:
+            group_size = max(1, len(symbols))
+
+        failed = []
+        for group_start in range(0, len(symbols), group_size):
+            group = symbols[group_start:group_start + group_size]
+            if prepare_group is not None:
+                prepare_group(group)
+            failed.extend(self._failed_symbols(group, func, workers))
+
+        if failed:
+            log.warning('Failed to retrieve {} of {} symbols: {}'.format(len(failed), len(symbols), ', '.join(failed)))
+        return failed
+
+    def _failed_symbols(self, symbols: List[str], func, workers: int) -> List[str]:
+        """
+        Calls func for each symbol and returns the symbols it raised an exception for.
+        """
+        def safely(ticker):
+            try:
+                func(ticker)
+            except Exception as e:
+                log.error('Error retrieving {}: {}'.format(ticker, e))
+                return False
+            return True
+
+        if workers == 1:
+            failed = [ticker for ticker in symbols if not safely(ticker)]
+        else:
+            # Each symbol writes its own files so the symbols can be processed independently. The results are
+            # collected in symbol order so the logs and the failures are reported the same way as a serial run.
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(safely, ticker) for ticker in symbols]
+                failed = [ticker for ticker, future in zip(symbols, futures) if not future.result()]
+
+        return failed
 
     def _download_and_process_data(
             self,
@@ -35,24 +232,376 @@ class BasePriceManager(object):
             minute_dir_path: pathlib.Path,
             daily_dir_path: pathlib.Path
     ) -> None:
+        if self.streaming:
+            self._stream_and_process_data(ticker, start_date, end_date, minute_dir_path, daily_dir_path)
+            return
+
         df = self._minute_dataframe_for_dates(ticker, start_date, end_date)
+        self._process_and_write_data(ticker, df, minute_dir_path, daily_dir_path)
+
+    def _process_and_write_data(
+            self,
+            ticker: str,
+            df: pd.DataFrame,
+            minute_dir_path: pathlib.Path,
+            daily_dir_path: pathlib.Path
+    ) -> None:
+        """
+        Checks a symbol's minute bars against the calendar, generates the daily bars, and writes both.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            df (DataFrame): The minute bars, sorted oldest first.
+            minute_dir_path (Path): The directory to write the minute data to.
+            daily_dir_path (Path): The directory to write the daily data to.
+
+        Returns:
+            None
 
+        """
         if df.empty:
             return
 
+        if self._process_pool is not None:
+            # Hand the work to a worker process and wait for it there. The thread is free of the GIL while it waits,
+            # so the other threads keep downloading.
+            recorded = self._process_pool.submit(
+                post_processing.process_and_write_data,
+                self._calendar.name,
+                type(self.storage),
+                self.storage.compression,
+                ticker,
+                *post_processing.encode_dataframe(df),
+                minute_dir_path,
+                daily_dir_path,
+                self.metrics is not None,
+                self.data_index is not None
+            ).result()
+            if recorded['metrics'] is not None:
+                self.metrics.merge(recorded['metrics'])
+            if recorded['index'] is not None:
+                self.data_index.merge(recorded['index'])
+            return
+
         df = self._check_sessions(df, ticker, frequency='minute')
         minute_dir_path.mkdir(parents=True, exist_ok=True)
-        filename = pathlib.Path(minute_dir_path, ticker + '.csv')
-        df.to_csv(filename)
+        self._write(df, self.storage.path(minute_dir_path, ticker), ticker, 'minute')
+
+        with self._timed('resample', ticker):
+            daily_df = self._resample_minute_data_to_daily_data(df)
+        daily_df = self._check_sessions(daily_df, ticker, frequency='daily')
+        daily_dir_path.mkdir(parents=True, exist_ok=True)
+        self._write(daily_df, self.storage.path(daily_dir_path, ticker), ticker, 'daily')
+        log.notice('Retrieved: {}'.format(ticker))
+
+    def _stream_and_process_data(
+            self,
+            ticker: str,
+            start_date: datetime,
+            end_date: datetime,
+            minute_dir_path: pathlib.Path,
+            daily_dir_path: pathlib.Path
+    ) -> None:
+        """
+        Downloads and processes a symbol's data one session at a time, writing the same files as
+        _download_and_process_data.
+
+        The sessions arrive newest first, but the files are written oldest first. Each session is spooled to disk as
+        it arrives and then, oldest first, is checked against the calendar, written to the minute file and
+        resampled to a daily bar. Only the daily bars, one per session, are kept in memory. Sessions the job manifest
+        has already spooled are read from its spool rather than spooled again.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+            minute_dir_path (Path): The directory to write the minute data to.
+            daily_dir_path (Path): The directory to write the daily data to.
+
+        Returns:
+            None
+
+        """
+        minute_dir_path.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='.azul_stream_', dir=str(minute_dir_path.parent)) as spool_dir:
+            # The spooled files, and whether they are this method's to remove.
+            spool_paths = []
+            for timestamp, df in self._available_session_minute_dataframes(ticker, start_date, end_date):
+                spool_path = None if self.job_manifest is None else self.job_manifest.spooled_path(ticker, timestamp)
+                if spool_path is None:
+                    spool_path = os.path.join(spool_dir, '{}.pkl'.format(len(spool_paths)))
+                    df.to_pickle(spool_path)
+                    spool_paths.append((spool_path, True))
+                else:
+                    spool_paths.append((str(spool_path), False))
+                del df
+
+            if not spool_paths:
+                return
+
+            # The daily bars are folded into daily_df a few sessions at a time, so there is one small DataFrame
+            # rather than one per session.
+            daily_df = None
+            daily_dfs = []
+            num_bars = 0
+            num_removed = 0
+            num_missing = 0
+            first_timestamp = None
+            last_timestamp = None
+            minute_path = self.storage.path(minute_dir_path, ticker)
+            with self.storage.writer(minute_path) as writer:
+                for spool_path, owned in reversed(spool_paths):
+                    df = pd.read_pickle(spool_path)
+                    if owned:
+                        os.remove(spool_path)
+                    df.index.name = 'date'
+
+                    with self._timed('check_sessions', ticker):
+                        df, report = self._reconcile_sessions(df, ticker, frequency='minute', log_summary=False)
+                    num_bars += len(df)
+                    num_removed += len(report.removed)
+                    num_missing += report.num_missing
+                    if df.empty:
+                        continue
+
+                    with self._timed('write', ticker):
+                        writer.write(df)
+                    self._count('rows_written', ticker, len(df))
+                    if first_timestamp is None:
+                        first_timestamp = df.index[0]
+                    last_timestamp = df.index[-1]
+                    with self._timed('resample', ticker):
+                        daily_dfs.append(self._resample_minute_data_to_daily_data(df))
+                    if len(daily_dfs) >= DAILY_BARS_PER_FOLD:
+                        daily_df = self._fold_daily_dataframes(daily_df, daily_dfs)
+
+            if self.data_index is not None:
+                with self._timed('index', ticker):
+                    self.data_index.record_summary(ticker, 'minute', minute_path, {
+                        'first': None if first_timestamp is None else first_timestamp.isoformat(),
+                        'last': None if last_timestamp is None else last_timestamp.isoformat(),
+                        'rows': num_bars
+                    })
+
+        if num_missing > 0:
+            log.info('Missing {} minutes for {}'.format(num_missing, ticker))
+        if num_removed > 0:
+            log.info('Removed {} minute bars for {}', num_removed, ticker)
+        log.info('Downloaded and processed {} minute bars for {}', num_bars, ticker)
+
+        daily_df = self._fold_daily_dataframes(daily_df, daily_dfs)
+        if daily_df is None:
+            return
 
-        daily_df = self._resample_minute_data_to_daily_data(df)
         daily_df = self._check_sessions(daily_df, ticker, frequency='daily')
         daily_dir_path.mkdir(parents=True, exist_ok=True)
-        filename = pathlib.Path(daily_dir_path, ticker + '.csv')
-        daily_df.to_csv(filename)
+        self._write(daily_df, self.storage.path(daily_dir_path, ticker), ticker, 'daily')
         log.notice('Retrieved: {}'.format(ticker))
 
+    def _write(self, df: pd.DataFrame, path: pathlib.Path, ticker: str, frequency: str) -> None:
+        """
+        Writes a symbol's minute or daily bars with the storage, records the time and the rows written, and records
+        the file in the data index.
+        """
+        with self._timed('write', ticker):
+            self.storage.write(df, path)
+        self._count('rows_written', ticker, len(df))
+        if self.data_index is not None:
+            with self._timed('index', ticker):
+                self.data_index.record(ticker, frequency, path, df)
+
+    def _append(self, df: pd.DataFrame, path: pathlib.Path, ticker: str, frequency: str) -> None:
+        """
+        Appends bars to a symbol's minute or daily file, like _write.
+
+        The file's entry in the data index is updated from the appended bars if it was current. Otherwise the file is
+        read to record it.
+        """
+        indexed = self.data_index is not None and self.data_index.is_current(ticker, frequency, path)
+        with self._timed('write', ticker):
+            self.storage.append(df, path)
+        self._count('rows_written', ticker, len(df))
+        if self.data_index is not None:
+            with self._timed('index', ticker):
+                if indexed:
+                    self.data_index.record_append(ticker, frequency, path, df)
+                else:
+                    self.data_index.record(ticker, frequency, path, self.storage.read(path))
+
+    def _truncate(self, path: pathlib.Path, timestamp: pd.Timestamp, ticker: str, frequency: str) -> None:
+        """
+        Removes the bars at and after timestamp from the end of a symbol's minute or daily file, like _append.
+        """
+        indexed = self.data_index is not None and self.data_index.is_current(ticker, frequency, path)
+        with self._timed('write', ticker):
+            removed = self.storage.truncate(path, timestamp)
+        if indexed:
+            with self._timed('index', ticker):
+                self.data_index.record_truncate(ticker, frequency, path, removed)
+
+    def _open_process_pool(self) -> None:
+        """
+        Starts the pool of processes that _process_and_write_data hands its work to, if processes is more than 0.
+
+        Streaming downloads process the data as it arrives, so they don't use the pool.
+        """
+        if self.processes > 0 and not self.streaming:
+            self._process_pool = post_processing.create_process_pool(self.processes)
+
+    def _close_process_pool(self) -> None:
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
+
+    @staticmethod
+    def _fold_daily_dataframes(daily_df: Optional[pd.DataFrame], daily_dfs: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Appends the daily bars in daily_dfs to daily_df and empties daily_dfs.
+
+        Returns:
+            daily_df (DataFrame): All the daily bars. None if there aren't any.
+
+        """
+        if daily_dfs:
+            daily_df = pd.concat(([] if daily_df is None else [daily_df]) + daily_dfs)
+            del daily_dfs[:]
+        return daily_df
+
+    def _update_data(
+            self,
+            ticker: str,
+            end_date: datetime,
+            minute_dir_path: pathlib.Path,
+            daily_dir_path: pathlib.Path
+    ) -> None:
+        minute_path = self.storage.path(minute_dir_path, ticker)
+
+        # The data index knows the last bar without opening the file, unless the file has changed since.
+        last_timestamp = None
+        if self.data_index is not None:
+            last_timestamp = self.data_index.last_timestamp(ticker, 'minute', minute_path)
+        if last_timestamp is None:
+            last_timestamp = self.storage.last_timestamp(minute_path)
+
+        if last_timestamp is None:
+            log.info('No minute data stored for {}. Skipping.'.format(ticker))
+            return
+
+        if last_timestamp.tzinfo is not None:
+            last_timestamp = last_timestamp.tz_convert(None)
+
+        # Only ask for the sessions after the last one that is stored, unless the last one was stored before it
+        # closed, e.g. by a run during the session or one that was interrupted. Then ask for it again too, so its
+        # missing minutes and its daily bar are replaced.
+        last_session = self._calendar.minute_to_session_label(last_timestamp, direction='previous')
+        last_session_is_partial = last_timestamp < self._calendar.session_close(last_session).tz_convert(None)
+        if last_session_is_partial:
+            start_date = last_session.tz_convert(None).to_pydatetime()
+        else:
+            start_date = (last_timestamp.normalize() + timedelta(days=1)).to_pydatetime()
+        if end_date is None:
+            end_date = datetime.today()
+
+        if start_date > end_date:
+            log.info('{} is up to date.'.format(ticker))
+            return
+
+        df = self._minute_dataframe_for_dates(ticker, start_date, end_date)
+
+        if df.empty:
+            log.info('No new minute data for {}.'.format(ticker))
+            return
+
+        df = self._check_sessions(df, ticker, frequency='minute')
+        daily_path = self.storage.path(daily_dir_path, ticker)
+
+        # Replace the stored bars of the session that was fetched again.
+        first_timestamp = None if df.empty else df.index[0]
+        if first_timestamp is not None and first_timestamp.tzinfo is not None:
+            first_timestamp = first_timestamp.tz_convert(None)
+        if last_session_is_partial and first_timestamp is not None and first_timestamp <= last_timestamp:
+            log.info('Replacing the partial session {} for {}.'.format(last_session.date(), ticker))
+            self._truncate(minute_path, df.index[0], ticker, 'minute')
+            if daily_path.exists():
+                self._truncate(daily_path, df.index[0].normalize(), ticker, 'daily')
+        self._append(df, minute_path, ticker, 'minute')
+
+        # The new minute bars only cover new sessions, and the one that was replaced, so only those daily bars need to
+        # be computed.
+        with self._timed('resample', ticker):
+            daily_df = self._resample_minute_data_to_daily_data(df)
+        daily_df = self._check_sessions(daily_df, ticker, frequency='daily')
+        daily_dir_path.mkdir(parents=True, exist_ok=True)
+        self._append(daily_df, daily_path, ticker, 'daily')
+        log.notice('Updated: {}'.format(ticker))
+
     def _resample_minute_data_to_daily_data(self, df):
+        """
+        Aggregates minute bars into one daily bar per day with bars, labelled with the day.
+
+        The bars are grouped by day with NumPy: the first bar of each day is found by searching the sorted bars for
+        the start of every day between the first and last bar, and each column is reduced with ``reduceat`` or by
+        taking the first and last bar of each day. This gives the same result as resampling with pandas without going
+        through its groupby machinery or creating the empty days that resample would then drop. Data the kernel
+        can't handle the same way (missing values, unsorted or timezone aware bars) is resampled with pandas.
+
+        Args:
+            df (DataFrame): The minute bars, indexed by date.
+
+        Returns:
+            daily_df (DataFrame): The daily bars.
+
+        """
+        if df.empty or not self._can_aggregate_with_numpy(df):
+            return self._resample_minute_data_to_daily_data_with_pandas(df)
+
+        dates = df.index.values
+        day_starts = np.arange(
+            dates[0].astype('datetime64[D]'),
+            dates[-1].astype('datetime64[D]') + np.timedelta64(1, 'D')
+        ).astype(dates.dtype)
+
+        # The position of the first bar of each day, and of the first bar after it. Days without bars are skipped.
+        starts = np.searchsorted(dates, day_starts)
+        ends = np.append(starts[1:], len(dates))
+        has_bars = starts < ends
+        starts = starts[has_bars]
+        ends = ends[has_bars]
+
+        columns = {
+            'open': df['open'].values[starts],
+            'high': np.maximum.reduceat(df['high'].values, starts),
+            'low': np.minimum.reduceat(df['low'].values, starts),
+            'close': df['close'].values[ends - 1],
+            'volume': np.add.reduceat(df['volume'].values, starts),
+            'dividend': df['dividend'].values[ends - 1],
+            'split': df['split'].values[ends - 1]
+        }
+
+        # resample skips missing values, which the kernel doesn't. Missing values only change the result if they
+        # are the first or last bar of a day, or are reduced, and then the kernel's result is missing too.
+        if any(values.dtype.kind == 'f' and np.isnan(values).any() for values in columns.values()):
+            return self._resample_minute_data_to_daily_data_with_pandas(df)
+
+        index = pd.DatetimeIndex(day_starts[has_bars], name=df.index.name)
+
+        daily_df = pd.DataFrame(columns, index=index)
+        return daily_df[self._cols]
+
+    def _can_aggregate_with_numpy(self, df: pd.DataFrame) -> bool:
+        """
+        Returns True if _resample_minute_data_to_daily_data can aggregate the minute bars with NumPy.
+        """
+        if not isinstance(df.index, pd.DatetimeIndex) or df.index.tz is not None:
+            return False
+        if not df.index.is_monotonic_increasing:
+            return False
+        for col in self._cols:
+            if col not in df.columns or df[col].dtype.kind not in 'iuf':
+                return False
+        return True
+
+    def _resample_minute_data_to_daily_data_with_pandas(self, df):
         ohlc_dict = {
             'open': 'first',
             'high': 'max',
@@ -121,36 +670,64 @@ class BasePriceManager(object):
             combined_df (DataFrame): Contains the all the minute bars for a stock between the start and end dates.
 
         """
+        # Collect the sessions' frames and concatenate them once at the end. Concatenating inside the loop would copy
+        # everything retrieved so far on every session.
+        session_dfs = [df for _, df in self._available_session_minute_dataframes(ticker, start_date, end_date)]
+        return self._combined_minute_dataframe(session_dfs)
 
-        start_date, end_date = self._validated_start_and_end_dates(start_date, end_date)
+    def _combined_minute_dataframe(self, session_dfs: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Concatenates the minute bars of several sessions. Empties session_dfs.
+
+        Args:
+            session_dfs (List[DataFrame]): The minute bars for each session, newest session first.
+
+        Returns:
+            combined_df (DataFrame): The minute bars, sorted oldest first.
 
+        """
         combined_df = pd.DataFrame(columns=self._cols)
         combined_df.index.name = 'date'
 
-        #
-        # # Get the date the symbol was listed on the exchange.
-        # list_date = self._list_date(ticker)
-        #
-        # if list_date is not None:
-        #     # If the we are asking for data from before the stock was listed, then set the start date to the day
-        #     # the stock was listed.
-        #     if list_date > start_date:
-        #         log.info('The symbol {} was not listed until: {}. Adjusting start time.', ticker, list_date)
-        #         start_date = list_date
+        if not session_dfs:
+            return combined_df
 
-        # Build a list of the trading days from the dates passed in.
-        session_dates = self._calendar.sessions_in_range(start_date, end_date)
+        # The sessions were retrieved newest first, so reversing them puts the dataframe oldest first, newest last.
+        session_dfs.reverse()
+        combined_df = pd.concat(session_dfs)
+        del session_dfs[:]
+        combined_df.index.name = 'date'
+
+        # Each session is already sorted so this should only be needed if a session's bars overlap another's.
+        if not combined_df.index.is_monotonic_increasing:
+            combined_df.sort_index(inplace=True)
+        return combined_df
+
+    def _available_session_minute_dataframes(self, ticker: str, start_date: datetime, end_date: datetime):
+        """
+        Yields the minute bars for each session between the start and end dates that has data, newest session first.
+
+        Stops once MISSING_DATE_THRESHOLD sessions in a row have no data.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
 
+        Yields:
+            timestamp (Timestamp): The session label.
+            df (DataFrame): The minute bars for the session.
+
+        """
+        session_dates = self._session_dates_in_range(ticker, start_date, end_date)
         if session_dates.empty:
-            log.info('The symbol {} did not trade between {} and {} ', ticker, start_date, end_date)
-            return combined_df
+            return
 
         # Iterate over the trading dates backwards. This means we don't need to know exactly
         # when the stock started trading. Note: this won't pull data for stocks that have been delisted.
         # TODO: Add code to capture data for delisted stocks.
         num_missing_dates = 0
-        for timestamp in reversed(session_dates):
-            df = self._minute_dataframe_for_date(ticker, timestamp)
+        for timestamp, df in self._session_minute_dataframes(ticker, session_dates):
             if df.empty:
                 # Start counting the number of consecutive trading dates we are missing data.
                 num_missing_dates += 1
@@ -159,89 +736,470 @@ class BasePriceManager(object):
                 # reset missing date counter
                 num_missing_dates = 0
                 log.info('Retrieved minute data for {} on {}'.format(ticker, timestamp.date()))
-                combined_df = pd.concat([combined_df, df])
+                yield timestamp, df
 
             if num_missing_dates >= self.MISSING_DATE_THRESHOLD:
                 log.info('No minute data for {} for {} days. Quitting.'.format(ticker, self.MISSING_DATE_THRESHOLD))
                 break
 
-        # Sort the dataframe oldest first, newest last.
-        combined_df.sort_index(inplace=True)
-        return combined_df
+    def _session_dates_in_range(self, ticker: str, start_date: datetime, end_date: datetime) -> pd.DatetimeIndex:
+        """
+        Returns the sessions between the start and end dates.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+
+        Returns:
+            session_dates (DatetimeIndex): The sessions, oldest first.
+
+        """
+        start_date, end_date = self._validated_start_and_end_dates(start_date, end_date)
+
+        #
+        # # Get the date the symbol was listed on the exchange.
+        # list_date = self._list_date(ticker)
+        #
+        # if list_date is not None:
+        #     # If the we are asking for data from before the stock was listed, then set the start date to the day
+        #     # the stock was listed.
+        #     if list_date > start_date:
+        #         log.info('The symbol {} was not listed until: {}. Adjusting start time.', ticker, list_date)
+        #         start_date = list_date
+
+        # Build a list of the trading days from the dates passed in.
+        session_dates = self._calendar.sessions_in_range(start_date, end_date)
+
+        if session_dates.empty:
+            log.info('The symbol {} did not trade between {} and {} ', ticker, start_date, end_date)
+        return session_dates
 
     # def _list_date(self, ticker: str) -> datetime:
     #     return None
 
+    def _session_minute_dataframes(self, ticker: str, session_dates: pd.DatetimeIndex):
+        """
+        Yields the minute bars for each session, newest session first.
+
+        The sessions are fetched lazily, so a caller that stops iterating stops fetching. If the price manager
+        supports date range requests, the sessions are fetched MAX_SESSIONS_PER_REQUEST at a time and then split
+        by session. Sessions recorded in the job manifest are read from it instead of being fetched again.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session_dates (DatetimeIndex): The sessions to get minute bars for, oldest first.
+
+        Yields:
+            timestamp (Timestamp): The session label.
+            df (DataFrame): The minute bars for the session. Empty if there weren't any.
+
+        """
+        chunk_size = max(1, self.MAX_SESSIONS_PER_REQUEST)
+        for chunk_end in range(len(session_dates), 0, -chunk_size):
+            chunk = session_dates[max(0, chunk_end - chunk_size):chunk_end]
+            dfs = self.job_manifest.sessions(ticker, chunk) if self.job_manifest is not None else None
+            if dfs is None:
+                dfs = self._fetch_session_minute_dataframes(ticker, chunk)
+                if self.job_manifest is not None:
+                    self.job_manifest.record_sessions(ticker, chunk, dfs)
+
+            for timestamp, df in zip(reversed(chunk), reversed(dfs)):
+                yield timestamp, df
+
+    def _fetch_session_minute_dataframes(self, ticker: str, session_dates: pd.DatetimeIndex) -> List[pd.DataFrame]:
+        """
+        Asks the provider for the minute bars for some sessions with one request.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session_dates (DatetimeIndex): The sessions, oldest first. At most MAX_SESSIONS_PER_REQUEST of them.
+
+        Returns:
+            dfs (List[DataFrame]): The minute bars for each session. Empty if there weren't any.
+
+        """
+        if not self._sessions_are_cached(ticker, session_dates):
+            self._wait_for_rate_limit()
+        if len(session_dates) == 1:
+            return [self._minute_dataframe_for_date(ticker, session_dates[0])]
+
+        df = self._minute_dataframe_for_date_range(ticker, session_dates[0], session_dates[-1])
+        return self._split_minute_dataframe_by_session(df, session_dates)
+
+    def _wait_for_rate_limit(self) -> None:
+        """
+        Waits until the rate limiter allows another request to the provider. Call this before each request.
+        """
+        if self.rate_limiter is not None:
+            with self._timed('rate_limit'):
+                self.rate_limiter.acquire()
+
+    def _cached_response(
+            self,
+            ticker: str,
+            session: pd.Timestamp,
+            fetch: Callable[[], Optional[bytes]]
+    ) -> Optional[bytes]:
+        """
+        Gets the raw response for a session from the response cache, or fetches and caches it if it isn't cached.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session (Timestamp): The session the response is for.
+            fetch (Callable): Gets the response from the provider. Returns None if the request failed, in which case
+                nothing is cached.
+
+        Returns:
+            data (bytes): The response, or None if the request failed.
+
+        """
+        if self.response_cache is None:
+            return fetch()
+
+        provider = type(self).__name__
+        data = self.response_cache.get(provider, ticker, session)
+        if data is None:
+            data = fetch()
+            if data is not None:
+                self.response_cache.put(provider, ticker, session, data)
+        else:
+            self._count('cached_responses', ticker)
+        return data
+
+    def _sessions_are_cached(self, ticker: str, session_dates: pd.DatetimeIndex) -> bool:
+        """
+        Returns True if the responses for all the sessions are in the response cache.
+        """
+        if self.response_cache is None:
+            return False
+        provider = type(self).__name__
+        return all(self.response_cache.contains(provider, ticker, session) for session in session_dates)
+
+    @staticmethod
+    def _split_minute_dataframe_by_session(df: pd.DataFrame, session_dates: pd.DatetimeIndex) -> List[pd.DataFrame]:
+        """
+        Splits a DataFrame of minute bars, sorted oldest first, into one DataFrame per session.
+
+        Like _minute_dataframe_for_date, a session holds the bars from midnight to midnight (UTC) of the session date.
+
+        Args:
+            df (DataFrame): The minute bars for all the sessions.
+            session_dates (DatetimeIndex): The sessions to split the minute bars into, oldest first.
+
+        Returns:
+            dfs (List[DataFrame]): One DataFrame per session. Empty if there were no bars for the session.
+
+        """
+        if df.empty:
+            return [pd.DataFrame() for _ in session_dates]
+
+        # Compare the session dates with the index in the timezone of the index.
+        day_starts = session_dates.normalize()
+        if day_starts.tz is not None:
+            day_starts = day_starts.tz_convert(None)
+        if df.index.tz is not None:
+            day_starts = day_starts.tz_localize('UTC').tz_convert(df.index.tz)
+        day_ends = day_starts + timedelta(days=1)
+        start_positions = df.index.searchsorted(day_starts)
+        end_positions = df.index.searchsorted(day_ends)
+
+        dfs = []
+        for start_position, end_position in zip(start_positions, end_positions):
+            if start_position == end_position:
+                dfs.append(pd.DataFrame())
+            else:
+                dfs.append(df.iloc[start_position:end_position])
+        return dfs
+
+    def _timed(self, stage: str, ticker: str = None):
+        """
+        Returns a context manager that records the time spent in it as a stage in metrics.
+
+        Args:
+            stage (str): The stage, e.g. ``http`` or ``decode``. See azul.metrics.STAGES.
+            ticker (str): The symbol the time is spent on. None only counts it towards the run.
+
+        Returns:
+            timer: The context manager. It does nothing if there are no metrics.
+
+        """
+        if self.metrics is None:
+            return NULL_TIMER
+        return self.metrics.time(stage, ticker)
+
+    def _count(self, name: str, ticker: str = None, value: int = 1) -> None:
+        """
+        Adds value to a counter in metrics, if there are metrics.
+        """
+        if self.metrics is not None:
+            self.metrics.count(name, ticker, value)
+
+    def _count_response(self, ticker: Optional[str], response) -> None:
+        """
+        Counts a response from the provider: the request, the bytes received, and any errors, retries and 429s.
+
+        Args:
+            ticker (str): The symbol the request was for. None if it was for several.
+            response (Response): The response returned by the HttpClient.
+
+        """
+        if self.metrics is None:
+            return
+        self.metrics.count('requests', ticker)
+        self.metrics.count('bytes_received', ticker, len(response.content or b''))
+        if response.status_code != 200:
+            self.metrics.count('http_errors', ticker)
+        self.metrics.count('retries', ticker, getattr(response, 'num_retries', 0))
+        self.metrics.count('throttled', ticker, getattr(response, 'num_throttled', 0))
+
+    def _prefetch(self, symbols: List[str], start_date: datetime, end_date: datetime) -> None:
+        """
+        Called by get_price_data before downloading each group of MAX_SYMBOLS_PER_REQUEST symbols.
+
+        Subclasses that can fetch several symbols with one request implement this to fetch the group's sessions
+        together, for _minute_dataframe_for_date to use.
+
+        Args:
+            symbols (List[str]): The ticker symbols about to be downloaded.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+
+        Returns:
+            None
+
+        """
+        pass
+
     def _minute_dataframe_for_date(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
         raise NotImplementedError
 
+    def _minute_dataframe_for_date_range(
+            self,
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> pd.DataFrame:
+        """
+        Returns a DataFrame containing the minute bars for all the sessions from start_timestamp to end_timestamp.
+
+        Subclasses that can fetch several sessions with one request implement this and set MAX_SESSIONS_PER_REQUEST.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The first session to get minute bars for.
+            end_timestamp (Timestamp): The last session to get minute bars for.
+
+        Returns:
+            df (DataFrame): The minute bars, sorted oldest first, indexed by (timezone naive) UTC time.
+
+        """
+        raise NotImplementedError
+
     def _fixna(self, df, symbol):
-        cols = ['close', 'high', 'low', 'open']
-        df[cols] = df[cols].replace({0: np.nan})
-        df[cols] = df[cols].replace({-1.0: np.nan})
-        if df.isnull().sum().sum() > 0:
-            # fixna_list.append(symbol)
-            df['open'] = df['open'].bfill().ffill()
-            df['close'] = df['close'].bfill().ffill()
-            df.loc[df['low'].isnull(), 'low'] = df['open']
-            df.loc[df['high'].isnull(), 'high'] = df['open']
-            df.loc[df['close'].isnull(), 'close'] = df['open']
+        with self._timed('fixna', symbol):
+            df, num_repaired = self._fixna_with_count(df, symbol)
+        if num_repaired > 0:
+            log.info('Repaired {} prices for {}'.format(num_repaired, symbol))
         return df
 
+    def _fixna_with_count(self, df: pd.DataFrame, symbol: str) -> Tuple[pd.DataFrame, int]:
+        """
+        Replaces missing prices, and the 0 and -1 prices providers use for missing prices, in one pass over the
+        open, high, low and close columns.
+
+        Missing opens and closes are filled from the next bar, or the previous bar at the end of the data. Missing
+        lows, highs and any closes that are still missing are then set to the bar's open.
+
+        Args:
+            df (DataFrame): The minute bars. The price columns are changed in place.
+            symbol (str): Ticker symbol for the stock.
+
+        Returns:
+            df (DataFrame): The repaired minute bars.
+            num_repaired (int): The number of prices that were replaced.
+
+        """
+        cols = ['close', 'high', 'low', 'open']
+        prices = np.column_stack([np.asarray(df[col].values, dtype='float64') for col in cols])
+        bad = np.isnan(prices) | (prices == 0) | (prices == -1)
+        if not bad.any():
+            return df, 0
+
+        prices[bad] = np.nan
+        close, high, low, open_ = prices.T
+        open_ = self._backfill_then_forward_fill(open_)
+        close = self._backfill_then_forward_fill(close)
+        for values in [close, high, low]:
+            # Copy the open into any prices that are still missing.
+            missing = np.isnan(values)
+            values[missing] = open_[missing]
+
+        # Only the columns that had bad prices are changed.
+        for i, (col, values) in enumerate(zip(cols, [close, high, low, open_])):
+            if bad[:, i].any():
+                df[col] = self._with_dtype_of(values, df[col])
+
+        num_repaired = int(bad.sum()) - int(np.isnan(close).sum() + np.isnan(high).sum() + np.isnan(low).sum()
+                                            + np.isnan(open_).sum())
+        return df, num_repaired
+
+    @staticmethod
+    def _backfill_then_forward_fill(values: np.ndarray) -> np.ndarray:
+        """
+        Returns a copy of values with each NaN replaced by the next value that isn't NaN, or by the previous one if
+        there isn't a next one.
+        """
+        missing = np.isnan(values)
+        if not missing.any():
+            return values.copy()
+
+        positions = np.arange(len(values))
+        # The position of the next value that isn't missing, found by taking the minimum from the end.
+        next_positions = np.where(missing, len(values), positions)
+        next_positions = np.minimum.accumulate(next_positions[::-1])[::-1]
+        # The position of the previous value that isn't missing.
+        previous_positions = np.maximum.accumulate(np.where(missing, -1, positions))
+
+        fill_positions = np.where(next_positions < len(values), next_positions, previous_positions)
+        filled = values.copy()
+        can_fill = missing & (fill_positions >= 0)
+        filled[can_fill] = values[fill_positions[can_fill]]
+        return filled
+
+    @staticmethod
+    def _with_dtype_of(values: np.ndarray, column: pd.Series) -> np.ndarray:
+        # Keep float32 prices as float32. Integer prices become floats, the same as replacing them with NaN would.
+        if column.dtype.kind == 'f' and column.dtype != values.dtype:
+            return values.astype(column.dtype)
+        return values
+
     def _check_sessions(self, df, ticker, frequency='daily'):
+        """
+        Reconciles price data with the calendar's sessions. See _reconcile_sessions.
+
+        Returns:
+            df (DataFrame): The reconciled price data.
+
+        """
+        with self._timed('check_sessions', ticker):
+            df, _ = self._reconcile_sessions(df, ticker, frequency)
+        return df
+
+    def _reconcile_sessions(
+            self,
+            df: pd.DataFrame,
+            ticker: str,
+            frequency: str = 'daily',
+            log_summary: bool = True
+    ) -> Tuple[pd.DataFrame, 'SessionReport']:
+        """
+        Reconciles price data with the calendar's sessions between the first and last bar.
+
+        Bars outside of the calendar's sessions (or, for minute data, outside of the sessions' trading minutes) are
+        removed. For daily data, missing sessions are added by carrying the previous session's prices forward with
+        zero volume, no dividend and no split. Missing minutes are counted but not added.
+
+        Both are done with one reindex against the calendar, so the cost grows with the number of bars rather than
+        with the number of missing sessions.
+
+        Args:
+            df (DataFrame): The price data, sorted oldest first.
+            ticker (str): Ticker symbol for the stock.
+            frequency (str): ``minute`` or ``daily``.
+            log_summary (bool): Whether to log what was changed. Callers reconciling a symbol's data in pieces can
+                log the totals themselves.
 
-        # Remove any data that are outside of the trading sessions for the calendar.
+        Returns:
+            df (DataFrame): The reconciled price data.
+            report (SessionReport): The rows that were added and removed.
 
+        """
         if df.empty:
-            return df
+            return df, SessionReport(added=df.index, removed=df.index, num_missing=0)
 
         asset_first_day = df.index[0]
         asset_last_day = df.index[-1]
-        sessions = self._calendar.sessions_in_range(asset_first_day, asset_last_day)
-        asset_sessions = sessions[sessions.slice_indexer(asset_first_day, asset_last_day)]
 
         if frequency == 'minute':
-            minutes_passed = len(df)
-            asset_first_day = self._calendar.minute_to_session_label(asset_first_day, direction='next')
-            asset_last_day = self._calendar.minute_to_session_label(asset_last_day, direction='previous')
-            minutes_in_session = self._calendar.minutes_for_sessions_in_range(asset_first_day, asset_last_day)
-            df = df[df.index.isin(minutes_in_session)]
-            if (minutes_passed) > len(minutes_in_session):
-                # print('Removed ' + str((minutes_passed) - len(minutes_in_session)) + ' minutes')
-                pass
-            elif minutes_passed < len(minutes_in_session):
-                num_missing_sessions = len(minutes_in_session) - minutes_passed
-                log.info('Missing sessions for {}'.format(ticker))
-        elif frequency == 'daily' and len(df) != len(asset_sessions):
-            missing_sessions = asset_sessions.difference(
-                pd.to_datetime(np.array(df.index), unit='s', utc=True, )).tolist()
-            extra_sessions = pd.to_datetime(np.array(df.index), unit='s', utc=True, ).difference(
-                asset_sessions).tolist()
-            if len(missing_sessions) > 0:
-                # missing_sessions_list.append(symbol)
-                # print('Adding ' + str(len(missing_sessions)) + ' sessions for ' + str(ticker))
-                pass
-            if len(extra_sessions) > 0:
-                # extra_sessions_list.append(symbol)
-                # print('Removing ' + str(len(extra_sessions)) + ' sessions for ' + str(symbol))
-                pass
-            for missing_session in missing_sessions:
-                prev_date = self._calendar.previous_session_label(missing_session)
-                row_to_copy = df[(df.index == prev_date)]
-                row_to_copy_val = row_to_copy.values
-                # from IPython import embed; embed()
-                df.loc[missing_session] = row_to_copy_val[0]
-                df.loc[missing_session].volume = 0
-                # row = row_to_copy
-                # table.append(row)
-
-            for extra_session in extra_sessions:
-                # delete stuff
-                df.drop(extra_session)
+            first_session = self._calendar.minute_to_session_label(asset_first_day, direction='next')
+            last_session = self._calendar.minute_to_session_label(asset_last_day, direction='previous')
+            expected_index = self._calendar.minutes_for_sessions_in_range(first_session, last_session)
+            expected_index = self._index_in_timezone_of(expected_index, df.index)
+        else:
+            sessions = self._calendar.sessions_in_range(asset_first_day, asset_last_day)
+            sessions = self._index_in_timezone_of(sessions, df.index)
+            expected_index = sessions[sessions.slice_indexer(asset_first_day, asset_last_day)]
 
+        # Remove the bars that aren't in the calendar.
+        in_calendar = df.index.isin(expected_index)
+        removed = df.index[~in_calendar]
+        if len(removed) > 0:
+            df = df[in_calendar]
+
+        added = df.index[:0]
         if frequency == 'minute':
-            log.info('Downloaded and processed {} minute bars for {}', len(df), ticker)
+            num_missing = len(expected_index) - len(df)
+            if num_missing > 0 and log_summary:
+                log.info('Missing {} minutes for {}'.format(num_missing, ticker))
         else:
-            log.info('Downsampled {} daily bars for {}', len(df), ticker)
+            missing = ~expected_index.isin(df.index)
+            if missing.any():
+                df = self._fill_missing_sessions(df, expected_index, missing)
+                added = df.index[missing[len(expected_index) - len(df):]]
+            num_missing = 0
+
+        if log_summary:
+            if len(added) > 0 or len(removed) > 0:
+                log.info('Added {} and removed {} {} bars for {}', len(added), len(removed), frequency, ticker)
+
+            if frequency == 'minute':
+                log.info('Downloaded and processed {} minute bars for {}', len(df), ticker)
+            else:
+                log.info('Downsampled {} daily bars for {}', len(df), ticker)
+
+        return df, SessionReport(added=added, removed=removed, num_missing=num_missing)
+
+    def _fill_missing_sessions(self, df: pd.DataFrame, sessions: pd.DatetimeIndex, missing: np.ndarray) -> pd.DataFrame:
+        """
+        Adds the missing sessions to daily price data, carrying the previous session's prices forward.
+
+        Args:
+            df (DataFrame): The daily price data. Every row is one of the sessions.
+            sessions (DatetimeIndex): All the sessions the price data should have.
+            missing (ndarray): A boolean mask of the sessions that are missing.
 
+        Returns:
+            df (DataFrame): The price data with a row for every session. Sessions before the first bar can't be filled
+                and are left out.
+
+        """
+        index_name = df.index.name
+        dtypes = df.dtypes
+        price_cols = [col for col in ['open', 'high', 'low', 'close'] if col in df.columns]
+
+        df = df.reindex(sessions)
+        df[price_cols] = df[price_cols].ffill()
+        if 'volume' in df.columns:
+            df.loc[missing, 'volume'] = 0
+        if 'dividend' in df.columns:
+            df.loc[missing, 'dividend'] = 0.0
+        if 'split' in df.columns:
+            df.loc[missing, 'split'] = 1.0
+
+        # Drop the sessions before the first bar (they have nothing to carry forward), then undo the upcasting the
+        # reindex did to fit in the missing values.
+        first_valid = np.argmax(df['close'].notnull().values) if 'close' in df.columns else 0
+        df = df.iloc[first_valid:]
+        df = df.astype(dtypes)
+        df.index.name = index_name
         return df
+
+    @staticmethod
+    def _index_in_timezone_of(index: pd.DatetimeIndex, other: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        # The calendar's indexes are in UTC. Convert them to the timezone (or lack of one) of the price data.
+        if other.tz is None:
+            return index.tz_convert(None) if index.tz is not None else index
+        if index.tz is None:
+            index = index.tz_localize('UTC')
+        return index.tz_convert(other.tz)
@@ -0,0 +1,197 @@
+import logbook
+import pathlib
+import pandas as pd
+from typing import List
+
+log = logbook.Logger('BaseStorage')
+
+
+class BaseStorage(object):
+    """
+    Reads and writes the price data for one ticker to one file.
+
+    Args:
+        compression (str): The compression to use, if the format supports it. None means no compression.
+
+    """
+
+    # The file extension, including the dot.
+    extension = None
+
+    def __init__(self, compression: str = None):
+        self.compression = compression
+
+    def path(self, dir_path: pathlib.Path, ticker: str) -> pathlib.Path:
+        """
+        Returns the path of a ticker's file in a directory.
+        """
+        return pathlib.Path(dir_path, ticker + self.extension)
+
+    def tickers(self, dir_path: pathlib.Path) -> List[str]:
+        """
+        Returns the tickers that have a file in a directory, sorted.
+        """
+        return sorted(path.name[:-len(self.extension)] for path in pathlib.Path(dir_path).glob('*' + self.extension))
+
+    def write(self, df: pd.DataFrame, path: pathlib.Path) -> None:
+        """
+        Writes a DataFrame of price data, replacing the file if it exists.
+
+        Args:
+            df (DataFrame): The price data, indexed by date.
+            path (Path): The file to write.
+
+        Returns:
+            None
+
+        """
+        raise NotImplementedError
+
+    def read(self, path: pathlib.Path) -> pd.DataFrame:
+        """
+        Reads a file of price data.
+
+        Args:
+            path (Path): The file to read.
+
+        Returns:
+            df (DataFrame): The price data, indexed by date.
+
+        """
+        raise NotImplementedError
+
+    def writer(self, path: pathlib.Path) -> 'StorageWriter':
+        """
+        Returns a StorageWriter that writes a file a piece at a time, replacing the file if it exists.
+
+        The default writer keeps the pieces in memory and writes them when it is closed. Formats that can write
+        pieces as they arrive should override this.
+
+        Args:
+            path (Path): The file to write.
+
+        Returns:
+            writer (StorageWriter): The writer. Use it as a context manager, or close it when done.
+
+        """
+        return StorageWriter(self, path)
+
+    def append(self, df: pd.DataFrame, path: pathlib.Path) -> None:
+        """
+        Adds price data that is newer than the data in a file to the end of the file. Creates the file if needed.
+
+        The default implementation reads the whole file and writes it again. Formats that can append in place should
+        override this.
+
+        Args:
+            df (DataFrame): The price data to add, indexed by date.
+            path (Path): The file to add the data to.
+
+        Returns:
+            None
+
+        """
+        if pathlib.Path(path).exists():
+            df = pd.concat([self.read(path), df])
+        self.write(df, path)
+
+    def truncate(self, path: pathlib.Path, timestamp: pd.Timestamp) -> pd.DataFrame:
+        """
+        Removes the rows at and after a timestamp from the end of a file, e.g. to replace them with append.
+
+        The default implementation reads the whole file and writes it again. Formats that can remove rows from the
+        end in place should override this.
+
+        Args:
+            path (Path): The file.
+            timestamp (Timestamp): The timestamp of the first row to remove.
+
+        Returns:
+            removed (DataFrame): The rows that were removed, indexed by date.
+
+        """
+        df = self.read(path)
+        keep = df.index < timestamp
+        if not keep.all():
+            self.write(df[keep], path)
+        return df[~keep]
+
+    def last_timestamp(self, path: pathlib.Path) -> pd.Timestamp:
+        """
+        Returns the timestamp of the last row in a file.
+
+        The default implementation reads the whole file. Formats that can find the last row cheaply should override
+        this.
+
+        Args:
+            path (Path): The file.
+
+        Returns:
+            timestamp (Timestamp): The timestamp of the last row. None if the file has no rows.
+
+        """
+        df = self.read(path)
+        if df.empty:
+            return None
+        return df.index[-1]
+
+    @staticmethod
+    def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns a copy of the price data with float32 prices and integer volumes.
+        """
+        df = df.copy()
+        for col in ['open', 'high', 'low', 'close', 'dividend', 'split']:
+            if col in df.columns:
+                df[col] = df[col].astype('float32')
+        if 'volume' in df.columns:
+            df['volume'] = df['volume'].fillna(0).astype('int64')
+        return df
+
+
+class StorageWriter(object):
+    """
+    Writes price data to a file a piece at a time. The pieces must be written oldest first.
+
+    The file is complete once the writer is closed. If the with block that uses the writer raises, the writer is
+    aborted: the file is left as it was before the writer was created, and a partial file is never left in its place.
+
+    Args:
+        storage (BaseStorage): The storage the file is written with.
+        path (Path): The file to write.
+
+    """
+
+    def __init__(self, storage: BaseStorage, path: pathlib.Path):
+        self.storage = storage
+        self.path = path
+        self._dfs = []
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        Writes the next piece of price data, indexed by date.
+        """
+        self._dfs.append(df)
+
+    def close(self) -> None:
+        """
+        Finishes writing the file.
+        """
+        if self._dfs:
+            self.storage.write(pd.concat(self._dfs), self.path)
+        self._dfs = []
+
+    def abort(self) -> None:
+        """
+        Stops writing the file without finishing it, leaving the file as it was.
+        """
+        self._dfs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -1,19 +1,118 @@
+import json
 import logbook
+import os
+import pathlib
+from azul.atomic_file import atomic_write
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
 
 log = logbook.Logger('BaseSymbolFetcher')
 
+# How many days a fetched symbol universe is reused for, unless AZUL_SYMBOL_REFRESH_DAYS says otherwise.
+DEFAULT_REFRESH_DAYS = 1
+
+FORMAT_YMD = '%Y-%m-%d'
+
 
 class BaseSymbolFetcher(object):
+    """
+    Fetches a universe of ticker symbols.
+
+    Subclasses implement _fetch_symbols. The symbols it returns are saved to a file named for the day they were
+    fetched, in a directory for the fetcher under ``~/.azul/symbols``, and are reused until they are older than the
+    refresh interval. If fetching fails, the newest saved symbols are used instead.
+
+    Args:
+        cache_dir (str): The directory to save the symbols in. Defaults to the AZUL_SYMBOL_CACHE_DIR environment
+            variable, or ``~/.azul/symbols``.
+        refresh_interval (timedelta): How long saved symbols are reused. Defaults to the AZUL_SYMBOL_REFRESH_DAYS
+            environment variable, or a day. 0 always fetches them.
 
-    def __init__(self):
-        pass
+    """
 
-    def symbols(self):
+    def __init__(self, cache_dir: str = None, refresh_interval: timedelta = None):
+        if cache_dir is None:
+            cache_dir = os.getenv('AZUL_SYMBOL_CACHE_DIR', str(pathlib.Path.home() / '.azul' / 'symbols'))
+        if refresh_interval is None:
+            refresh_interval = timedelta(days=float(os.getenv('AZUL_SYMBOL_REFRESH_DAYS', DEFAULT_REFRESH_DAYS)))
+
+        self.cache_dir = pathlib.Path(cache_dir, type(self).__name__)
+        self.refresh_interval = refresh_interval
+
+    def symbols(self) -> List[str]:
         """
         Returns the list of symbols that were fetched.
 
         Returns:
             symbols (list): list of symbols that were fetched.
 
+        """
+        path = self._newest_cache_path()
+        if path is not None and datetime.now() - self._fetched_at(path) < self.refresh_interval:
+            log.info('Using the symbols fetched on {}'.format(path.stem))
+            return self._load(path)
+
+        try:
+            symbols = self._fetch_symbols()
+        except Exception as e:
+            if path is None:
+                raise
+            log.warning('Error fetching symbols: {}. Using the symbols fetched on {}'.format(e, path.stem))
+            return self._load(path)
+
+        self._save(symbols)
+        return symbols
+
+    def _fetch_symbols(self) -> List[str]:
+        """
+        Fetches the symbols from the source.
+
+        Returns:
+            symbols (List[str]): The ticker symbols.
+
         """
         raise NotImplementedError
+
+    def _fetch_pages(self, fetch_page: Callable[[int], List[str]], workers: int = 8) -> List[str]:
+        """
+        Fetches the pages of a paginated source, workers pages at a time, until a page comes back empty.
+
+        Args:
+            fetch_page (Callable): Returns the symbols on a page. Pages are numbered from 1.
+            workers (int): The number of pages to fetch at once.
+
+        Returns:
+            symbols (List[str]): The symbols on all the pages, in page order.
+
+        """
+        symbols = []
+        first_page = 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                pages = list(executor.map(fetch_page, range(first_page, first_page + workers)))
+                for page in pages:
+                    if not page:
+                        return symbols
+                    symbols.extend(page)
+                first_page += workers
+                log.info('Fetched {} pages of symbols'.format(first_page - 1))
+
+    def _newest_cache_path(self) -> Optional[pathlib.Path]:
+        paths = sorted(self.cache_dir.glob('*.json')) if self.cache_dir.exists() else []
+        return paths[-1] if paths else None
+
+    @staticmethod
+    def _fetched_at(path: pathlib.Path) -> datetime:
+        return datetime.fromtimestamp(path.stat().st_mtime)
+
+    @staticmethod
+    def _load(path: pathlib.Path) -> List[str]:
+        with open(str(path)) as f:
+            return json.load(f)
+
+    def _save(self, symbols: List[str]) -> None:
+        # A crash can't leave a partial file to be read next time.
+        path = self.cache_dir / (datetime.now().strftime(FORMAT_YMD) + '.json')
+        with atomic_write(path) as f:
+            json.dump(symbols, f)
@@ -0,0 +1,218 @@
+import logbook
+import numpy as np
+import os
+import pandas as pd
+import pathlib
+import threading
+from azul.atomic_file import atomic_write
+from datetime import datetime, timedelta
+
+log = logbook.Logger('CalendarIndex')
+
+NANOS_PER_MINUTE = 60 * 1000 * 1000 * 1000
+
+# Rebuild a persisted calendar index when it has fewer than this many days of sessions left after today.
+MIN_DAYS_OF_FUTURE_SESSIONS = 30
+
+
+class CalendarIndex(object):
+    """
+    The sessions and trading minutes of a trading calendar, precomputed once and shared by every price manager.
+
+    The sessions and their opens and closes are stored as sorted int64 arrays, and the minutes of every session are
+    computed once, the first time they are needed, with the position of each session's first minute. Finding the
+    sessions or minutes in a range is then a binary search and a slice, which shares the memory of the whole index
+    rather than copying it.
+
+    Use get_calendar_index instead of creating CalendarIndex objects directly.
+
+    Args:
+        calendar_name (str): The name of the zipline trading calendar.
+        cache_dir (str): A directory to persist the index to between runs. None doesn't persist it.
+
+    """
+
+    def __init__(self, calendar_name: str, cache_dir: str = None):
+        self.name = calendar_name
+        self._calendar = None
+        self._lock = threading.Lock()
+        self._minutes_index = None
+        self._minute_offsets = None
+
+        loaded = False
+        cache_path = pathlib.Path(cache_dir, calendar_name + '.npz') if cache_dir else None
+        if cache_path is not None and cache_path.exists():
+            loaded = self._load(cache_path)
+
+        if not loaded:
+            schedule = self.calendar.schedule
+            self._sessions = _to_nanos(schedule.index)
+            self._opens = _to_nanos(schedule['market_open'])
+            self._closes = _to_nanos(schedule['market_close'])
+            if cache_path is not None:
+                self._save(cache_path)
+
+        self._sessions_index = pd.DatetimeIndex(self._sessions).tz_localize('UTC')
+
+    @property
+    def calendar(self):
+        """
+        The zipline trading calendar. It's only created if it is needed.
+        """
+        if self._calendar is None:
+            import zipline as zl
+            self._calendar = zl.get_calendar(name=self.name)
+        return self._calendar
+
+    @property
+    def all_sessions(self) -> pd.DatetimeIndex:
+        return self._sessions_index
+
+    def sessions_in_range(self, start_date, end_date) -> pd.DatetimeIndex:
+        """
+        Returns the session labels (midnight UTC) from start_date to end_date, inclusive.
+        """
+        start = np.searchsorted(self._sessions, _to_nano(start_date), side='left')
+        end = np.searchsorted(self._sessions, _to_nano(end_date), side='right')
+        return self._sessions_index[start:end]
+
+    def minutes_for_session(self, session_label) -> pd.DatetimeIndex:
+        """
+        Returns the trading minutes (UTC) of a session.
+        """
+        return self.minutes_for_sessions_in_range(session_label, session_label)
+
+    def minutes_for_sessions_in_range(self, first_session_label, last_session_label) -> pd.DatetimeIndex:
+        """
+        Returns the trading minutes (UTC) of the sessions from first_session_label to last_session_label, inclusive.
+        """
+        start = np.searchsorted(self._sessions, _to_nano(first_session_label), side='left')
+        end = np.searchsorted(self._sessions, _to_nano(last_session_label), side='right')
+        minutes_index, minute_offsets = self._all_minutes()
+        return minutes_index[minute_offsets[start]:minute_offsets[max(start, end)]]
+
+    def minute_to_session_label(self, dt, direction: str = 'next') -> pd.Timestamp:
+        """
+        Returns the label of the session a minute is in.
+
+        Args:
+            dt: The minute.
+            direction (str): What to do if the minute isn't in a session. ``next`` returns the next session,
+                ``previous`` returns the previous session and ``none`` raises a ValueError.
+
+        Returns:
+            session_label (Timestamp): The session label (midnight UTC).
+
+        """
+        minute = _to_nano(dt)
+        # The first session that closes at or after the minute.
+        position = np.searchsorted(self._closes, minute, side='left')
+        in_session = position < len(self._sessions) and self._opens[position] <= minute
+
+        if not in_session:
+            if direction == 'previous':
+                position -= 1
+            elif direction != 'next':
+                raise ValueError('{} is not a trading minute of the {} calendar'.format(dt, self.name))
+
+        if position < 0 or position >= len(self._sessions):
+            raise ValueError('{} is outside of the {} calendar'.format(dt, self.name))
+        return self._sessions_index[position]
+
+    def session_close(self, session_label) -> pd.Timestamp:
+        """
+        Returns the last trading minute (UTC) of a session.
+        """
+        nano = _to_nano(session_label)
+        position = np.searchsorted(self._sessions, nano, side='left')
+        if position >= len(self._sessions) or self._sessions[position] != nano:
+            raise ValueError('{} is not a session of the {} calendar'.format(session_label, self.name))
+        return pd.Timestamp(self._closes[position], tz='UTC')
+
+    def previous_session_label(self, session_label) -> pd.Timestamp:
+        """
+        Returns the label of the session before a session.
+        """
+        position = np.searchsorted(self._sessions, _to_nano(session_label), side='left')
+        if position == 0:
+            raise ValueError('There is no session before {} in the {} calendar'.format(session_label, self.name))
+        return self._sessions_index[position - 1]
+
+    def _all_minutes(self):
+        # Returns the minutes of every session and the position of each session's first minute in them, with the
+        # position after the last minute at the end. They are built the first time they are needed.
+        with self._lock:
+            if self._minutes_index is None:
+                # Each session's minutes go from its open to its close, one minute apart. Build them for all the
+                # sessions at once by repeating each open once per minute and adding the minute's offset within its
+                # session.
+                counts = (self._closes - self._opens) // NANOS_PER_MINUTE + 1
+                minute_offsets = np.concatenate([[0], np.cumsum(counts)])
+                offsets = np.arange(minute_offsets[-1], dtype=np.int64) - np.repeat(minute_offsets[:-1], counts)
+                minutes = np.repeat(self._opens, counts) + offsets * NANOS_PER_MINUTE
+                self._minutes_index = pd.DatetimeIndex(minutes).tz_localize('UTC')
+                self._minute_offsets = minute_offsets
+            return self._minutes_index, self._minute_offsets
+
+    def _load(self, cache_path: pathlib.Path) -> bool:
+        try:
+            with np.load(str(cache_path)) as data:
+                sessions, opens, closes = data['sessions'], data['opens'], data['closes']
+        except Exception as e:
+            log.info('Could not read the calendar index {}: {}', cache_path, e)
+            return False
+
+        # Calendars are only computed a limited time into the future, so rebuild the index before it runs out.
+        min_last_session = _to_nano(datetime.today() + timedelta(days=MIN_DAYS_OF_FUTURE_SESSIONS))
+        if len(sessions) == 0 or sessions[-1] < min_last_session:
+            return False
+
+        self._sessions, self._opens, self._closes = sessions, opens, closes
+        return True
+
+    def _save(self, cache_path: pathlib.Path) -> None:
+        # A concurrent run never reads half a file.
+        with atomic_write(cache_path, 'wb') as f:
+            np.savez(f, sessions=self._sessions, opens=self._opens, closes=self._closes)
+
+
+_calendar_indexes = {}
+_calendar_indexes_lock = threading.Lock()
+
+
+def get_calendar_index(calendar_name: str = 'NYSE', cache_dir: str = None) -> CalendarIndex:
+    """
+    Returns the CalendarIndex for a trading calendar, creating it the first time it is needed.
+
+    Args:
+        calendar_name (str): The name of the zipline trading calendar.
+        cache_dir (str): A directory to persist the index to between runs. Defaults to the
+            AZUL_CALENDAR_CACHE_DIR environment variable. If neither is set, the index isn't persisted.
+
+    Returns:
+        calendar_index (CalendarIndex): The calendar index shared by everything using the calendar.
+
+    """
+    with _calendar_indexes_lock:
+        calendar_index = _calendar_indexes.get(calendar_name)
+        if calendar_index is None:
+            if cache_dir is None:
+                cache_dir = os.getenv('AZUL_CALENDAR_CACHE_DIR')
+            calendar_index = CalendarIndex(calendar_name, cache_dir)
+            _calendar_indexes[calendar_name] = calendar_index
+        return calendar_index
+
+
+def _to_nano(dt) -> int:
+    # Naive times are assumed to be UTC.
+    ts = pd.Timestamp(dt)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(None)
+    return ts.value
+
+
+def _to_nanos(values) -> np.ndarray:
+    index = pd.DatetimeIndex(values)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    return index.asi8.copy()
@@ -0,0 +1,123 @@
+import io
+import pandas as pd
+import pathlib
+from azul import storage_registry
+from azul.atomic_file import AtomicFile
+from azul.base_storage import BaseStorage, StorageWriter
+
+
+@storage_registry.register('csv')
+class CSVStorage(BaseStorage):
+    """
+    Stores price data as CSV files, the format read by zipline's csvdir bundle.
+
+    The files are not compressed and the dtypes are left as they are, so zipline can ingest them directly.
+    """
+
+    extension = '.csv'
+
+    def __init__(self, compression: str = None):
+        if compression is not None:
+            raise ValueError('CSV files are not compressed so that zipline can read them. '
+                             'Use the parquet or feather format for compression.')
+        super().__init__(compression)
+
+    def write(self, df: pd.DataFrame, path: pathlib.Path) -> None:
+        df.to_csv(path)
+
+    def read(self, path: pathlib.Path) -> pd.DataFrame:
+        return pd.read_csv(path, index_col=0, parse_dates=True)
+
+    def writer(self, path: pathlib.Path) -> StorageWriter:
+        return CSVStorageWriter(self, path)
+
+    def append(self, df: pd.DataFrame, path: pathlib.Path) -> None:
+        df.to_csv(path, mode='a', header=not pathlib.Path(path).exists())
+
+    def last_timestamp(self, path: pathlib.Path, block_size: int = 4096) -> pd.Timestamp:
+        # Read backwards from the end of the file until there is a complete line before the trailing newline.
+        with open(str(path), 'rb') as f:
+            f.seek(0, 2)
+            position = f.tell()
+            tail = b''
+            while position > 0 and tail.rstrip(b'\r\n').count(b'\n') < 1:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                tail = f.read(read_size) + tail
+
+        lines = tail.decode('utf-8').strip().splitlines()
+        if len(lines) == 0 or (position == 0 and len(lines) == 1):
+            # The file is empty or only has a header.
+            return None
+
+        return pd.Timestamp(lines[-1].split(',', 1)[0])
+
+    def truncate(self, path: pathlib.Path, timestamp: pd.Timestamp, block_size: int = 65536) -> pd.DataFrame:
+        # Read backwards from the end of the file until there is a complete row before timestamp, then cut the file
+        # after it. Only the rows that are removed, and the one before them, are read.
+        with open(str(path), 'rb+') as f:
+            header = f.readline()
+            first_row = f.tell()
+            f.seek(0, 2)
+            end = f.tell()
+            position = end
+            tail = b''
+            line_end = end
+            cut = None
+            while cut is None:
+                if position > first_row:
+                    read_size = min(block_size, position - first_row)
+                    position -= read_size
+                    f.seek(position)
+                    tail = f.read(read_size) + tail
+
+                # The first line of the tail is only known to be complete if it is the first row.
+                if position == first_row:
+                    complete_from = 0
+                else:
+                    newline = tail.find(b'\n')
+                    complete_from = len(tail) if newline < 0 else newline + 1
+
+                # Check the complete lines that haven't been checked yet, last first.
+                while cut is None and line_end - position > complete_from:
+                    relative_end = line_end - position
+                    line_start = max(tail.rfind(b'\n', complete_from, relative_end - 1) + 1, complete_from)
+                    line = tail[line_start:relative_end].strip()
+                    if line and pd.Timestamp(line.split(b',', 1)[0].decode('utf-8')) < timestamp:
+                        cut = line_end
+                    line_end = position + line_start
+                if cut is None and position == first_row:
+                    cut = first_row
+
+            f.seek(cut)
+            removed = f.read()
+            f.truncate(cut)
+
+        return pd.read_csv(io.BytesIO(header + removed), index_col=0, parse_dates=True)
+
+
+class CSVStorageWriter(StorageWriter):
+    """
+    Writes a CSV file a piece at a time. The file is the same as one written from all the pieces at once.
+
+    The pieces are written to a temporary file next to the file, which replaces the file when the writer is closed.
+    """
+
+    def __init__(self, storage: CSVStorage, path: pathlib.Path):
+        super().__init__(storage, path)
+        self._atomic_file = AtomicFile(path)
+        self._file = open(str(self._atomic_file.temp_path), 'w', newline='')
+        self._header = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        df.to_csv(self._file, header=self._header)
+        self._header = False
+
+    def close(self) -> None:
+        self._file.close()
+        self._atomic_file.commit()
+
+    def abort(self) -> None:
+        self._file.close()
+        self._atomic_file.discard()
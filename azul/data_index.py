@@ -0,0 +1,390 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+import logbook
+import pandas as pd
+from azul.atomic_file import atomic_write
+from typing import List, Optional
+
+log = logbook.Logger('DataIndex')
+
+INDEX_FILE_NAME = '.azul_index.json'
+
+INDEX_VERSION = 1
+
+FREQUENCIES = ['minute', 'daily']
+
+# The index is saved at most this often, in seconds, while files are being written. Saving it after every write would
+# rewrite the whole index once per file, which adds up for thousands of symbols. save() saves it straight away.
+SAVE_INTERVAL = 1.0
+
+# How much of a file is read at a time to compute its checksum.
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+# The state of a symbol's files compared with the index.
+OK = 'ok'
+CHANGED = 'changed'
+MISSING = 'missing'
+UNINDEXED = 'unindexed'
+
+
+class DataIndex(object):
+    """
+    An index of the minute and daily data files in an output directory, so what is stored can be found without
+    reading the files.
+
+    For each symbol's minute and daily file the index records the timestamps of the first and last bars, the number
+    of rows, the file's size, modification time and SHA-256 checksum and, for daily files, the number of missing
+    sessions: the sessions with no volume, which include the ones azul filled in because the provider had no bars for
+    them. An entry is current while the file's size and modification time are the ones recorded, so a file changed by
+    something other than azul is noticed with one stat.
+
+    Appending bars to a file doesn't read it, so the checksum of a file that was appended to is only computed the next
+    time the file is verified.
+
+    The index is written atomically, so it always describes whole files. It is saved at most every save_interval
+    seconds while files are being written, and whenever save is called.
+
+    Args:
+        output_dir (str): The directory the minute and daily directories are in. None keeps the index in memory, e.g.
+            to send it to another process.
+        save_interval (float): The least seconds between saves while recording.
+
+    """
+
+    def __init__(self, output_dir: Optional[str], save_interval: float = SAVE_INTERVAL):
+        self.output_dir = None if output_dir is None else pathlib.Path(output_dir)
+        self.path = None if output_dir is None else self.output_dir / INDEX_FILE_NAME
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._symbols = {}
+        self._dirty = False
+        self._last_saved = 0.0
+
+        if self.path is not None:
+            self._load()
+
+    def tickers(self) -> List[str]:
+        """
+        Returns the symbols in the index, sorted.
+        """
+        with self._lock:
+            return sorted(self._symbols)
+
+    def entry(self, ticker: str, frequency: str) -> Optional[dict]:
+        """
+        Returns what the index records about a symbol's minute or daily file.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            frequency (str): ``minute`` or ``daily``.
+
+        Returns:
+            entry (dict): The ``file`` name, the ``first`` and ``last`` timestamps as ISO 8601 strings, the number of
+                ``rows``, the file's ``size``, ``mtime_ns`` and ``checksum`` and, for daily files,
+                ``missing_sessions``. The checksum is None if bars were appended since it was computed. None if the
+                file isn't in the index.
+
+        """
+        with self._lock:
+            entry = self._symbols.get(ticker, {}).get(frequency)
+            return None if entry is None else dict(entry)
+
+    def is_current(self, ticker: str, frequency: str, path: pathlib.Path) -> bool:
+        """
+        Returns True if the file is in the index and hasn't changed since it was recorded.
+        """
+        entry = self.entry(ticker, frequency)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(str(path))
+        except FileNotFoundError:
+            return False
+        return stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']
+
+    def last_timestamp(self, ticker: str, frequency: str, path: pathlib.Path) -> Optional[pd.Timestamp]:
+        """
+        Returns the timestamp of the last bar in a file, if the file is current in the index.
+
+        Returns:
+            timestamp (Timestamp): The timestamp of the last bar. None if the file isn't current or has no bars.
+
+        """
+        if not self.is_current(ticker, frequency, path):
+            return None
+        last = self.entry(ticker, frequency)['last']
+        return None if last is None else pd.Timestamp(last)
+
+    def record(self, ticker: str, frequency: str, path: pathlib.Path, df: pd.DataFrame) -> None:
+        """
+        Records a file that was written from a DataFrame.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            frequency (str): ``minute`` or ``daily``.
+            path (Path): The file.
+            df (DataFrame): The bars in the file, sorted oldest first.
+
+        """
+        self.record_summary(ticker, frequency, path, summarize(df, frequency))
+
+    def record_summary(self, ticker: str, frequency: str, path: pathlib.Path, summary: dict) -> None:
+        """
+        Records a file from a summary of its bars, for files that were written a piece at a time.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            frequency (str): ``minute`` or ``daily``.
+            path (Path): The file.
+            summary (dict): The ``first`` and ``last`` timestamps, the number of ``rows`` and, optionally,
+                ``missing_sessions``, as returned by summarize.
+
+        """
+        entry = dict(summary, **_file_fields(path))
+        entry['checksum'] = _checksum(path)
+        self._set_entry(ticker, frequency, entry)
+
+    def record_append(self, ticker: str, frequency: str, path: pathlib.Path, df: pd.DataFrame) -> None:
+        """
+        Records bars that were appended to a file that was current in the index before they were appended. The file
+        isn't read, so its checksum is left to be computed when it is verified.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            frequency (str): ``minute`` or ``daily``.
+            path (Path): The file.
+            df (DataFrame): The bars that were appended, sorted oldest first.
+
+        """
+        entry = self.entry(ticker, frequency)
+        if entry is None:
+            raise ValueError('{} {} data is not in the index, so bars cannot be appended to it.'.format(
+                ticker, frequency))
+
+        appended = summarize(df, frequency)
+        if appended['rows'] > 0:
+            entry['first'] = entry['first'] or appended['first']
+            entry['last'] = appended['last']
+            entry['rows'] += appended['rows']
+            if 'missing_sessions' in appended:
+                entry['missing_sessions'] = entry.get('missing_sessions', 0) + appended['missing_sessions']
+        entry.update(_file_fields(path))
+        entry['checksum'] = None
+        self._set_entry(ticker, frequency, entry)
+
+    def record_truncate(self, ticker: str, frequency: str, path: pathlib.Path, df: pd.DataFrame) -> None:
+        """
+        Records bars that were removed from the end of a file that was current in the index before they were removed.
+
+        The last bar left isn't known without reading the file, so it is None until bars are appended again.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            frequency (str): ``minute`` or ``daily``.
+            path (Path): The file.
+            df (DataFrame): The bars that were removed.
+
+        """
+        entry = self.entry(ticker, frequency)
+        if entry is None:
+            raise ValueError('{} {} data is not in the index, so bars cannot be removed from it.'.format(
+                ticker, frequency))
+
+        removed = summarize(df, frequency)
+        if removed['rows'] > 0:
+            entry['rows'] -= removed['rows']
+            entry['last'] = None
+            if entry['rows'] == 0:
+                entry['first'] = None
+            if 'missing_sessions' in removed:
+                entry['missing_sessions'] = entry.get('missing_sessions', 0) - removed['missing_sessions']
+        entry.update(_file_fields(path))
+        entry['checksum'] = None
+        self._set_entry(ticker, frequency, entry)
+
+    def verify(self, ticker: str, frequency: str, path: pathlib.Path) -> str:
+        """
+        Checks a file against its checksum in the index. This reads the whole file.
+
+        A file whose checksum wasn't computed when bars were appended to it is OK if it is current. Its checksum is
+        computed and recorded then.
+
+        Returns:
+            state (str): OK if the file's checksum is the one recorded, CHANGED if it isn't, MISSING if the file is in
+                the index but doesn't exist and UNINDEXED if it exists but isn't in the index. None if the file neither
+                exists nor is in the index.
+
+        """
+        entry = self.entry(ticker, frequency)
+        if not pathlib.Path(path).exists():
+            return MISSING if entry is not None else None
+        if entry is None:
+            return UNINDEXED
+        if entry['checksum'] is None:
+            if not self.is_current(ticker, frequency, path):
+                return CHANGED
+            entry['checksum'] = _checksum(path)
+            self._set_entry(ticker, frequency, entry)
+            return OK
+        return OK if _checksum(path) == entry['checksum'] else CHANGED
+
+    def state(self, ticker: str, frequency: str, path: pathlib.Path) -> str:
+        """
+        Compares a file with the index by its size and modification time.
+
+        Returns:
+            state (str): OK, CHANGED, MISSING, UNINDEXED or None. See verify.
+
+        """
+        entry = self.entry(ticker, frequency)
+        if not pathlib.Path(path).exists():
+            return MISSING if entry is not None else None
+        if entry is None:
+            return UNINDEXED
+        return OK if self.is_current(ticker, frequency, path) else CHANGED
+
+    def remove(self, ticker: str, frequency: str = None) -> None:
+        """
+        Removes a symbol's minute or daily file, or both, from the index.
+        """
+        with self._lock:
+            symbol = self._symbols.get(ticker, {})
+            for key in FREQUENCIES if frequency is None else [frequency]:
+                symbol.pop(key, None)
+            if not symbol:
+                self._symbols.pop(ticker, None)
+            self._dirty = True
+        self._save_if_due()
+
+    def rebuild(self, storage) -> None:
+        """
+        Replaces the index with one built by reading every minute and daily file in the output directory, e.g. for
+        data that was downloaded before azul kept an index.
+
+        Args:
+            storage (BaseStorage): The storage the files were written with.
+
+        """
+        with self._lock:
+            self._symbols = {}
+            self._dirty = True
+        for frequency in FREQUENCIES:
+            dir_path = self.output_dir / frequency
+            for ticker in storage.tickers(dir_path):
+                path = storage.path(dir_path, ticker)
+                try:
+                    self.record(ticker, frequency, path, storage.read(path))
+                except Exception as e:
+                    # The file is left out of the index, so it shows up as unindexed.
+                    log.warning('Could not index {}: {}'.format(path, e))
+        self.save()
+
+    def merge(self, symbols: dict) -> None:
+        """
+        Adds the entries recorded by another index, e.g. in a worker process.
+
+        Args:
+            symbols (dict): The entries, as returned by to_dict.
+
+        """
+        with self._lock:
+            for ticker, entries in symbols.items():
+                self._symbols.setdefault(ticker, {}).update(entries)
+            self._dirty = True
+        self._save_if_due()
+
+    def to_dict(self) -> dict:
+        """
+        Returns the entries by symbol and frequency.
+        """
+        with self._lock:
+            return {ticker: {frequency: dict(entry) for frequency, entry in entries.items()}
+                    for ticker, entries in self._symbols.items()}
+
+    def save(self) -> None:
+        """
+        Saves the index if anything was recorded since it was last saved.
+        """
+        with self._lock:
+            if self._dirty and self.path is not None:
+                self._save()
+
+    def _set_entry(self, ticker: str, frequency: str, entry: dict) -> None:
+        with self._lock:
+            self._symbols.setdefault(ticker, {})[frequency] = entry
+            self._dirty = True
+        self._save_if_due()
+
+    def _save_if_due(self) -> None:
+        with self._lock:
+            if self._dirty and self.path is not None and time.monotonic() - self._last_saved >= self.save_interval:
+                self._save()
+
+    def _load(self) -> None:
+        try:
+            with self.path.open() as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            log.warning('Could not read the data index {}: {}. Starting a new one.'.format(self.path, e))
+            return
+
+        if index.get('version') != INDEX_VERSION:
+            log.warning('The data index {} has a different version. Starting a new one.'.format(self.path))
+            return
+        self._symbols = index.get('symbols', {})
+
+    def _save(self) -> None:
+        # Called with the lock held.
+        index = {'version': INDEX_VERSION, 'symbols': self._symbols}
+
+        # The index is never half written.
+        with atomic_write(self.path) as f:
+            json.dump(index, f, sort_keys=True)
+        self._dirty = False
+        self._last_saved = time.monotonic()
+
+
+def summarize(df: pd.DataFrame, frequency: str) -> dict:
+    """
+    Returns what the index records about a DataFrame of bars.
+
+    Args:
+        df (DataFrame): The bars, sorted oldest first.
+        frequency (str): ``minute`` or ``daily``.
+
+    Returns:
+        summary (dict): The ``first`` and ``last`` timestamps as ISO 8601 strings (None if there are no bars), the
+            number of ``rows`` and, for daily bars, the number of ``missing_sessions``.
+
+    """
+    summary = {
+        'first': df.index[0].isoformat() if len(df) > 0 else None,
+        'last': df.index[-1].isoformat() if len(df) > 0 else None,
+        'rows': len(df)
+    }
+    if frequency == 'daily':
+        summary['missing_sessions'] = int((df['volume'] == 0).sum()) if 'volume' in df.columns else 0
+    return summary
+
+
+def _file_fields(path: pathlib.Path) -> dict:
+    stat = os.stat(str(path))
+    return {
+        'file': pathlib.Path(path).name,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+def _checksum(path: pathlib.Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(str(path), 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return 'sha256:' + sha256.hexdigest()
@@ -1,4 +1,5 @@
-from azul import symbol_fetcher_registry, BaseSymbolFetcher
+from azul import symbol_fetcher_registry
+from azul.base_symbol_fetcher import BaseSymbolFetcher
 
 
 @symbol_fetcher_registry.register('faang')
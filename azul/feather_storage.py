@@ -0,0 +1,79 @@
+import pandas as pd
+import pathlib
+from azul import storage_registry
+from azul.atomic_file import AtomicFile
+from azul.base_storage import BaseStorage, StorageWriter
+
+
+@storage_registry.register('feather')
+class FeatherStorage(BaseStorage):
+    """
+    Stores price data as Feather (Arrow IPC) files with float32 prices and integer volumes.
+
+    Requires pyarrow. Supported compressions are lz4 and zstd.
+    """
+
+    extension = '.feather'
+
+    def __init__(self, compression: str = None):
+        super().__init__(compression)
+        try:
+            import pyarrow
+            import pyarrow.feather
+        except ImportError:
+            raise ImportError('The feather format requires pyarrow. Install it with: pip install pyarrow')
+        self._pa = pyarrow
+        self._feather = pyarrow.feather
+
+    def write(self, df: pd.DataFrame, path: pathlib.Path) -> None:
+        table = self._pa.Table.from_pandas(self._compact_dtypes(df))
+        self._feather.write_feather(table, str(path), compression=self.compression or 'uncompressed')
+
+    def read(self, path: pathlib.Path) -> pd.DataFrame:
+        return self._feather.read_table(str(path)).to_pandas()
+
+    def writer(self, path: pathlib.Path) -> StorageWriter:
+        return FeatherStorageWriter(self, path)
+
+
+class FeatherStorageWriter(StorageWriter):
+    """
+    Writes a Feather file a piece at a time, one record batch per piece. Feather files are Arrow IPC files, so the
+    batches can be written as they arrive. They are written to a temporary file next to the file, which replaces the
+    file when the writer is closed.
+    """
+
+    def __init__(self, storage: FeatherStorage, path: pathlib.Path):
+        super().__init__(storage, path)
+        self._atomic_file = AtomicFile(path)
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        pa = self.storage._pa
+        df = self.storage._compact_dtypes(df)
+        if self._writer is None:
+            table = pa.Table.from_pandas(df)
+            self._schema = table.schema
+            options = pa.ipc.IpcWriteOptions(compression=self.storage.compression)
+            self._writer = pa.ipc.new_file(str(self._atomic_file.temp_path), self._schema, options=options)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is None:
+            # Nothing was written, so the file is left as it was.
+            self._atomic_file.discard()
+            return
+        self._writer.close()
+        self._writer = None
+        self._atomic_file.commit()
+
+    def abort(self) -> None:
+        # Closing the writer would write a footer that makes the partial file look complete, so the file it was
+        # writing is deleted instead.
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._atomic_file.discard()
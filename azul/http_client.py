@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+import logbook
+from typing import Optional, Tuple, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    import requests
+
+log = logbook.Logger('HttpClient')
+
+# Responses with these status codes are retried. 429 means the provider is throttling us and 5xx are server errors.
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class HttpClient(object):
+    """
+    A pooled HTTP client that retries throttled and failed requests with jittered exponential backoff.
+
+    Connections are kept alive and reused between requests, so a price manager making thousands of requests only
+    pays for a handful of TCP/TLS handshakes. The client can be shared by several threads. requests is only imported
+    when the first request is sent, so creating a client is cheap for the price managers that don't use it.
+
+    Args:
+        pool_size (int): The most connections to keep open to each host.
+        timeout (float or Tuple[float, float]): The connect and read timeouts in seconds.
+        max_retries (int): The most times to retry a request.
+        backoff_factor (float): The base delay in seconds. Retry n waits a random time up to backoff_factor * 2 ** n.
+        max_backoff (float): The longest time in seconds to wait before retrying.
+
+    """
+
+    def __init__(
+            self,
+            pool_size: int = 10,
+            timeout: Union[float, Tuple[float, float]] = (5.0, 30.0),
+            max_retries: int = 5,
+            backoff_factor: float = 0.5,
+            max_backoff: float = 60.0
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def get(self, url: str, params: dict = None, rate_limiter=None, **kwargs) -> 'requests.Response':
+        """
+        Sends a GET request, retrying connection errors, timeouts and RETRY_STATUS_CODES responses.
+
+        Args:
+            url (str): The URL to get.
+            params (dict): The query string parameters.
+            rate_limiter (TokenBucketRateLimiter): Each retry takes a token from it, the same as the caller did before
+                the first attempt. None doesn't limit the retries.
+            **kwargs: Passed to requests.Session.get.
+
+        Returns:
+            response (Response): The first successful response, or the last response if every retry failed. Its
+                num_retries is the number of times the request was retried, and num_throttled the number of 429
+                responses received.
+
+        Raises:
+            requests.ConnectionError, requests.Timeout: If the last retry could not connect or timed out.
+
+        """
+        import requests
+
+        kwargs.setdefault('timeout', self.timeout)
+        session = self._get_session()
+
+        num_throttled = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0 and rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                response = session.get(url, params=params, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                log.info('Error getting {}: {}. Retrying in {:.2f} seconds.', url, e, delay)
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 429:
+                num_throttled += 1
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                break
+
+            delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+            log.info('Response status code {} for {}. Retrying in {:.2f} seconds.', response.status_code, url, delay)
+
+            # Read the body so the connection goes back to the pool instead of being closed.
+            response.content
+            time.sleep(delay)
+
+        response.num_retries = attempt
+        response.num_throttled = num_throttled
+        return response
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        if self._session is not None:
+            self._session.close()
+
+    def _get_session(self) -> 'requests.Session':
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def _backoff(self, attempt: int) -> float:
+        # Use "full jitter" so that many workers that were throttled at the same time don't retry at the same time.
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        # Wait as long as the Retry-After header of the failed response asks, if it has one, otherwise back off.
+        if retry_after is not None:
+            try:
+                return min(self.max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                # Retry-After can also be an HTTP date. Fall back to the backoff in that case.
+                pass
+        return self._backoff(attempt)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    Returns the HttpClient shared by all the price managers, creating it the first time it is needed.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
+
+
+def configure_http_client(**kwargs) -> HttpClient:
+    """
+    Replaces the shared HttpClient with one created with the given arguments.
+
+    Args:
+        **kwargs: Passed to HttpClient. For example pool_size, timeout and max_retries.
+
+    Returns:
+        http_client (HttpClient): The new shared client.
+
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = HttpClient(**kwargs)
+        return _http_client
@@ -1,20 +1,46 @@
-from azul import price_manager_registry, BasePriceManager
-import pyEX
+from azul import price_manager_registry
+from azul.base_price_manager import BasePriceManager
+from azul.http_client import get_http_client
+import json
+import numpy as np
 import pandas as pd
-import pytz
 from datetime import datetime, timedelta
-from typing import Tuple
+from typing import List, Optional, Tuple
 import logbook
 
 
 log = logbook.Logger('IEXPriceManager')
 
+# The most symbols IEX returns charts for with one batch request.
+IEX_MAX_SYMBOLS_PER_BATCH = 100
+
+# The fields of a chart the minute bars are made from.
+IEX_MARKET_COLUMNS = [
+    ('open', 'marketOpen'),
+    ('high', 'marketHigh'),
+    ('low', 'marketLow'),
+    ('close', 'marketClose'),
+    ('volume', 'marketVolume')
+]
+
+NANOS_PER_MINUTE = 60 * 1000 * 1000 * 1000
+NANOS_PER_DAY = 24 * 60 * NANOS_PER_MINUTE
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
 
 @price_manager_registry.register('iex')
 class IEXPriceManager(BasePriceManager):
 
     def __init__(self):
         super().__init__()
+        self._base_url = 'https://api.iextrading.com/1.0'
+        self._http_client = get_http_client()
+
+        # Get the charts of up to this many symbols at a time from the batch endpoint.
+        self.MAX_SYMBOLS_PER_REQUEST = IEX_MAX_SYMBOLS_PER_BATCH
+
+        # The charts the last _prefetch got, by ticker and session, when there isn't a response cache to keep them in.
+        self._prefetched = {}
 
     def _validated_start_and_end_dates(
             self,
@@ -61,42 +87,204 @@ class IEXPriceManager(BasePriceManager):
 
         return start_date, end_date
 
+    def _prefetch(self, symbols: List[str], start_date: datetime, end_date: datetime) -> None:
+        """
+        Gets the minute bars of up to MAX_SYMBOLS_PER_REQUEST symbols for each session with one batch request.
+
+        The charts are kept in the response cache, or in memory if there isn't one, for _minute_dataframe_for_date to
+        use. Sessions that a batch request fails for, and symbols missing from a batch response, are fetched one symbol
+        at a time instead.
+
+        Args:
+            symbols (List[str]): The ticker symbols to get data for.
+            start_date (datetime): Date to start pulling data.
+            end_date (datetime): Date to stop pulling data.
+
+        Returns:
+            None
+
+        """
+        self._prefetched.clear()
+        if len(symbols) < 2:
+            return
+
+        start_date, end_date = self._validated_start_and_end_dates(start_date, end_date)
+        provider = type(self).__name__
+        for session in reversed(self._calendar.sessions_in_range(start_date, end_date)):
+            uncached_symbols = [ticker for ticker in symbols if not self._sessions_are_cached(ticker, [session])]
+            if not uncached_symbols:
+                continue
+
+            self._wait_for_rate_limit()
+            charts = self._batch_charts(uncached_symbols, session)
+            if charts is None:
+                continue
+
+            for ticker in uncached_symbols:
+                # A symbol missing from the response isn't known to have no bars. Caching it as empty would hide the
+                # session's bars for good once the session is final, so it is left to be fetched on its own.
+                chart = charts.get(ticker)
+                if not isinstance(chart, dict) or 'chart' not in chart:
+                    continue
+                data = json.dumps(chart['chart']).encode('utf-8')
+                if self.response_cache is not None:
+                    self.response_cache.put(provider, ticker, session, data)
+                else:
+                    self._prefetched[(ticker, session)] = data
+
+    def _batch_charts(self, symbols: List[str], session: pd.Timestamp) -> Optional[dict]:
+        """
+        Gets the minute charts of several symbols for one session from the batch endpoint.
+
+        Args:
+            symbols (List[str]): The ticker symbols.
+            session (Timestamp): The session.
+
+        Returns:
+            charts (dict): The response, by symbol, or None if the request failed.
+
+        """
+        params = {
+            'symbols': ','.join(symbols),
+            'types': 'chart',
+            'range': 'date',
+            'exactDate': session.strftime('%Y%m%d'),
+            'chartByDay': 'false'
+        }
+        with self._timed('http'):
+            response = self._http_client.get(self._url('/stock/market/batch'), params=params,
+                                             rate_limiter=self.rate_limiter)
+        self._count_response(None, response)
+        if response.status_code != 200:
+            log.error('Error getting a batch of {} charts from IEX for: {}'.format(len(symbols), session.date()))
+            log.error('Response status code: {}', response.status_code)
+            return None
+
+        try:
+            with self._timed('decode'):
+                charts = json.loads(response.content.decode('utf-8'))
+        except ValueError as e:
+            log.info('Could not read a batch of charts from IEX for: {}: {}'.format(session.date(), e))
+            return None
+
+        return charts if isinstance(charts, dict) else None
+
+    def _url(self, path):
+        return self._base_url + path
+
+    def _sessions_are_cached(self, ticker: str, session_dates: pd.DatetimeIndex) -> bool:
+        if all((ticker, session) in self._prefetched for session in session_dates):
+            return True
+        return super()._sessions_are_cached(ticker, session_dates)
+
     def _minute_dataframe_for_date(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
-        ret_df = pd.DataFrame()
+        # Cache the raw chart rather than the DataFrame so the same response can be reused however it's processed.
+        data = self._prefetched.pop((ticker, start_timestamp), None)
+        if data is None:
+            data = self._cached_response(ticker, start_timestamp, lambda: self._chart_response(ticker, start_timestamp))
 
-        df = pyEX.chartDF(ticker, timeframe='1d', date=start_timestamp)
+        with self._timed('decode', ticker):
+            return self._minute_dataframe_from_chart(json.loads(data.decode('utf-8')), ticker, start_timestamp)
 
-        if df.empty:
-            return ret_df
+    def _chart_response(self, ticker: str, start_timestamp: pd.Timestamp) -> bytes:
+        """
+        Gets the minute chart of one symbol for one session from IEX, encoded as JSON.
+        """
+        # pyEX is slow to import and only used here, so it isn't imported unless a chart has to be fetched on its own.
+        import pyEX
+
+        with self._timed('http', ticker):
+            data = json.dumps(pyEX.chart(ticker, timeframe='1d', date=start_timestamp)).encode('utf-8')
+        self._count('requests', ticker)
+        self._count('bytes_received', ticker, len(data))
+        return data
+
+    def _minute_dataframe_from_chart(
+            self,
+            chart: List[dict],
+            ticker: str,
+            start_timestamp: pd.Timestamp
+    ) -> pd.DataFrame:
+        """
+        Creates the minute bars from an IEX minute chart.
+
+        Args:
+            chart (List[dict]): The chart. One dict per minute.
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The session of the chart.
+
+        Returns:
+            df (DataFrame): The minute bars, indexed by (timezone naive) UTC time. Empty if there weren't any.
+
+        """
+        if not chart:
+            return pd.DataFrame()
+
+        keys = set().union(*chart)
+        if not keys.issuperset(['marketClose', 'marketHigh', 'marketLow', 'marketOpen']):
+            log.info("Skipping {0} for {1}, not all columns ({2}) received".format(
+                ticker, start_timestamp.date(), sorted(keys)))
+            return pd.DataFrame()
 
-        df = df.reset_index()
-        df['volume'] = df['volume'].astype('int')
-        df['date'] = df['date'].astype('str')
-        df['minute'] = df['minute'].astype('str')
-        df['datet'] = df['date'] + ' ' + df['minute']
+        # Use the prices from all markets rather than the ones from IEX only. The columns are read straight from the
+        # chart, rather than creating a DataFrame with every field of the chart first.
+        index = self._minute_index([row.get('date') for row in chart], [row.get('minute') for row in chart])
+        df = pd.DataFrame({
+            col: [row.get(key) for row in chart] for col, key in IEX_MARKET_COLUMNS
+        }, index=index)
+        df = df[index.notnull()]
         df['dividend'] = 0.0
         df['split'] = 1.0
-        df.drop(['date', 'minute', 'average', 'changeOverTime', 'close', 'high', 'label', 'low', 'marketAverage',
-                 'marketChangeOverTime', 'marketNotional', 'marketNumberOfTrades', 'notional', 'numberOfTrades',
-                 'open', 'volume'], axis=1, level=None, inplace=True, errors='ignore')
-        df.rename(columns={'datet': 'date', 'marketClose': 'close', 'marketHigh': 'high', 'marketLow': 'low',
-                           'marketOpen': 'open', 'marketVolume': 'volume'}, inplace=True)
-        df.date = pd.to_datetime(df.date, errors='coerce', utc=False, infer_datetime_format=True)
-        df = df[~df.date.isnull()]
-        df.set_index('date', drop=True, append=False, inplace=True, verify_integrity=True)
-
-        utc = pytz.utc
-        nytz = pytz.timezone('US/Eastern')
-        df = df.tz_localize(nytz, axis=0, level=None, copy=False, ambiguous='raise')
-        df.index = df.index.tz_convert(utc)
-        if not (pd.Series(['close', 'high', 'low', 'open']).isin(df.columns).all()):
-            log.info("Skipping {0} for {1}, not all columns ({2}) received".format(
-                ticker, start_timestamp.date(), str(df.columns)))
-            return ret_df
+        if not df.index.is_unique:
+            raise ValueError('Index has duplicate keys: {}'.format(df.index[df.index.duplicated()].unique()))
+
+        return self._fixna(df, ticker)
+
+    @staticmethod
+    def _minute_index(dates: List[str], minutes: List[str]) -> pd.DatetimeIndex:
+        """
+        Parses the dates and minutes of a chart into (timezone naive) UTC times.
+
+        A chart only has a few distinct dates and minutes, so each distinct one is parsed once with a fixed format,
+        and the times are added up as integers. Nothing is inferred for each row.
+
+        Args:
+            dates (List[str]): The dates, YYYYMMDD or YYYY-MM-DD.
+            minutes (List[str]): The minutes in New York time, HH:MM.
+
+        Returns:
+            index (DatetimeIndex): The times, named date. NaT where a date or minute couldn't be parsed.
+
+        """
+        day_nanos = {date: _parse_date_nanos(date) for date in set(dates)}
+        minute_nanos = {minute: _parse_minute_nanos(minute) for minute in set(minutes)}
+        days = [day_nanos[date] for date in dates]
+        times = [minute_nanos[minute] for minute in minutes]
+
+        # Unparsed dates and minutes are None. They are added up as 0 and then set to NaT.
+        valid = np.array([day is not None and time is not None for day, time in zip(days, times)], dtype=bool)
+        values = np.array([day or 0 for day in days], dtype='int64')
+        values += np.array([time or 0 for time in times], dtype='int64')
+        values[~valid] = np.iinfo(np.int64).min
+        index = pd.DatetimeIndex(values.view('datetime64[ns]'))
+        index = index.tz_localize('US/Eastern', ambiguous='raise').tz_convert(None)
+        index.name = 'date'
+        return index
+
+
+def _parse_date_nanos(date) -> Optional[int]:
+    # The nanoseconds since the epoch of a YYYYMMDD or YYYY-MM-DD date, or None if it can't be parsed.
+    date = str(date)
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d' if len(date) == 10 else '%Y%m%d')
+    except ValueError:
+        return None
+    return (day.toordinal() - EPOCH_ORDINAL) * NANOS_PER_DAY
 
-        df = self._fixna(df, ticker)
-        df.index = df.index.tz_convert(None)
 
-        # Re-arrange them
-        ret_df = df[self._cols]
-        return ret_df
+def _parse_minute_nanos(minute) -> Optional[int]:
+    # The nanoseconds since midnight of an HH:MM minute, or None if it can't be parsed.
+    minute = str(minute)
+    if len(minute) != 5 or minute[2] != ':' or not (minute[:2] + minute[3:]).isdigit():
+        return None
+    return (int(minute[:2]) * 60 + int(minute[3:])) * NANOS_PER_MINUTE
@@ -0,0 +1,24 @@
+from azul import symbol_fetcher_registry
+from azul.base_symbol_fetcher import BaseSymbolFetcher
+from azul.http_client import get_http_client
+from typing import List
+
+
+@symbol_fetcher_registry.register('iex')
+class IEXSymbolFetcher(BaseSymbolFetcher):
+    """
+    Fetches the symbols that IEX supports and has enabled for trading.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._base_url = 'https://api.iextrading.com/1.0'
+        self._http_client = get_http_client()
+
+    def _fetch_symbols(self) -> List[str]:
+        response = self._http_client.get(self._base_url + '/ref-data/symbols')
+        if response.status_code != 200:
+            raise RuntimeError('Error getting the symbols from IEX. Response status code: {}'.format(
+                response.status_code))
+
+        return [symbol_object['symbol'] for symbol_object in response.json() if symbol_object.get('isEnabled', True)]
@@ -0,0 +1,212 @@
+import json
+import pathlib
+import shutil
+import threading
+import logbook
+import pandas as pd
+from azul.atomic_file import atomic_write
+from typing import List, Optional
+
+log = logbook.Logger('JobManifest')
+
+MANIFEST_FILE_NAME = '.azul_manifest.json'
+
+# The sessions fetched for symbols that aren't finished yet are kept here until the symbol's files are written.
+SPOOL_DIR_NAME = '.azul_job'
+
+MANIFEST_VERSION = 1
+
+# The status of a symbol or session in the manifest.
+COMPLETE = 'complete'
+IN_PROGRESS = 'in_progress'
+SESSION_DATA = 'data'
+SESSION_EMPTY = 'empty'
+
+
+class JobManifest(object):
+    """
+    Records the progress of a download job in its output directory so that an interrupted job can be resumed. Jobs
+    are only recorded when they are run with resume, so downloads that won't be resumed don't spool their sessions.
+
+    The manifest records which symbols are complete and, for the symbols that aren't, which sessions have been
+    fetched. The minute bars of those sessions are kept in a spool directory next to the manifest, so a resumed job
+    only asks the provider for the sessions it doesn't have yet. The manifest is written atomically after every
+    request, so it always describes files that exist.
+
+    Args:
+        output_dir (str): The output directory of the job.
+        params (dict): The parameters of the job. A job is only resumed if its parameters are the same.
+        resume (bool): Whether to resume the job recorded in output_dir. If False any recorded job is discarded.
+
+    """
+
+    def __init__(self, output_dir: str, params: dict = None, resume: bool = False):
+        self.output_dir = pathlib.Path(output_dir)
+        self.path = self.output_dir / MANIFEST_FILE_NAME
+        self.spool_dir = self.output_dir / SPOOL_DIR_NAME
+        self.params = params or {}
+        self._lock = threading.Lock()
+        self._symbols = {}
+
+        if resume:
+            self._load()
+        else:
+            self._discard()
+
+    def is_symbol_complete(self, ticker: str) -> bool:
+        """
+        Returns True if the symbol's files were written by the job.
+        """
+        with self._lock:
+            return self._symbols.get(ticker, {}).get('status') == COMPLETE
+
+    def mark_symbol_complete(self, ticker: str) -> None:
+        """
+        Records that the symbol's files have been written and removes its spooled sessions.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+
+        """
+        with self._lock:
+            self._symbols[ticker] = {'status': COMPLETE}
+            self._save()
+        shutil.rmtree(str(self.spool_dir / ticker), ignore_errors=True)
+
+    def sessions(self, ticker: str, session_dates: pd.DatetimeIndex) -> Optional[List[pd.DataFrame]]:
+        """
+        Gets the minute bars the job has already fetched for some sessions.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session_dates (DatetimeIndex): The sessions.
+
+        Returns:
+            dfs (List[DataFrame]): The minute bars for each session, or None if any of the sessions haven't been
+                fetched.
+
+        """
+        with self._lock:
+            recorded = self._symbols.get(ticker, {}).get('sessions', {})
+            statuses = [recorded.get(self._session_key(timestamp)) for timestamp in session_dates]
+        if any(status is None for status in statuses):
+            return None
+
+        dfs = []
+        for timestamp, status in zip(session_dates, statuses):
+            if status == SESSION_EMPTY:
+                dfs.append(pd.DataFrame())
+            else:
+                dfs.append(pd.read_pickle(str(self._spool_path(ticker, timestamp))))
+        return dfs
+
+    def spooled_path(self, ticker: str, timestamp: pd.Timestamp) -> Optional[pathlib.Path]:
+        """
+        Returns the spooled file of a session's minute bars, so they can be read again without spooling them twice.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            timestamp (Timestamp): The session.
+
+        Returns:
+            path (Path): The file, or None if the session wasn't spooled.
+
+        """
+        with self._lock:
+            status = self._symbols.get(ticker, {}).get('sessions', {}).get(self._session_key(timestamp))
+        return self._spool_path(ticker, timestamp) if status == SESSION_DATA else None
+
+    def record_sessions(self, ticker: str, session_dates: pd.DatetimeIndex, dfs: List[pd.DataFrame]) -> None:
+        """
+        Spools the minute bars fetched for some sessions and records them in the manifest.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session_dates (DatetimeIndex): The sessions.
+            dfs (List[DataFrame]): The minute bars for each session.
+
+        """
+        statuses = {}
+        for timestamp, df in zip(session_dates, dfs):
+            key = self._session_key(timestamp)
+            if df.empty:
+                statuses[key] = SESSION_EMPTY
+            else:
+                path = self._spool_path(ticker, timestamp)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                df.to_pickle(str(path))
+                statuses[key] = SESSION_DATA
+
+        # The spooled files are written before the manifest refers to them.
+        with self._lock:
+            symbol = self._symbols.setdefault(ticker, {'status': IN_PROGRESS, 'sessions': {}})
+            symbol.setdefault('sessions', {}).update(statuses)
+            self._save()
+
+    def finish(self) -> None:
+        """
+        Removes the spool directory once every symbol is complete. The manifest is kept so resuming a finished job
+        does nothing.
+        """
+        with self._lock:
+            if any(symbol.get('status') != COMPLETE for symbol in self._symbols.values()):
+                return
+        shutil.rmtree(str(self.spool_dir), ignore_errors=True)
+
+    def _load(self) -> None:
+        try:
+            with self.path.open() as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            log.notice('No job to resume in: {}. Starting a new one.'.format(self.output_dir))
+            self._discard()
+            return
+        except ValueError as e:
+            log.warning('Could not read the job manifest {}: {}. Starting a new job.'.format(self.path, e))
+            self._discard()
+            return
+
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('params') != self.params:
+            log.warning('The job in {} was started with different parameters. Starting a new job.'.format(
+                self.output_dir))
+            self._discard()
+            return
+
+        self._symbols = manifest.get('symbols', {})
+        num_complete = sum(1 for symbol in self._symbols.values() if symbol.get('status') == COMPLETE)
+        log.notice('Resuming the job in {}. {} symbols are complete.'.format(self.output_dir, num_complete))
+
+    def _discard(self) -> None:
+        shutil.rmtree(str(self.spool_dir), ignore_errors=True)
+        self._symbols = {}
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        manifest = {'version': MANIFEST_VERSION, 'params': self.params, 'symbols': self._symbols}
+        # The manifest is never half written.
+        with atomic_write(self.path) as f:
+            json.dump(manifest, f, sort_keys=True)
+
+    def _spool_path(self, ticker: str, timestamp: pd.Timestamp) -> pathlib.Path:
+        return self.spool_dir / ticker / '{}.pkl'.format(self._session_key(timestamp))
+
+    @staticmethod
+    def _session_key(timestamp: pd.Timestamp) -> str:
+        return timestamp.strftime('%Y-%m-%d')
+
+
+def discard_job(output_dir: str) -> None:
+    """
+    Removes the job recorded in an output directory, if there is one, so a later resume doesn't pick it up.
+
+    Args:
+        output_dir (str): The output directory of the job.
+
+    """
+    output_dir = pathlib.Path(output_dir)
+    shutil.rmtree(str(output_dir / SPOOL_DIR_NAME), ignore_errors=True)
+    try:
+        (output_dir / MANIFEST_FILE_NAME).unlink()
+    except FileNotFoundError:
+        pass
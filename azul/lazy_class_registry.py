@@ -0,0 +1,61 @@
+import importlib
+from class_registry import ClassRegistry
+from typing import Iterator, Tuple
+
+
+class LazyClassRegistry(ClassRegistry):
+    """
+    A ClassRegistry whose classes can be registered by the module they are defined in, which is only imported the
+    first time one of its keys is looked up.
+
+    The modules register their classes with the ``register`` decorator as usual when they are imported. This lets
+    ``import azul`` list every price manager, storage and symbol fetcher without importing pandas, zipline, requests
+    and pyEX, which only the classes that are used need.
+
+    """
+
+    def __init__(self, attr_name: str = None, unique: bool = False):
+        super().__init__(attr_name, unique)
+
+        # The modules that register each key that hasn't been looked up yet.
+        self._modules = {}
+
+    def register_module(self, key: str, module_name: str) -> None:
+        """
+        Registers the module that registers the class for key, so it can be imported when key is looked up.
+
+        Args:
+            key (str): The registry key, e.g. ``polygon``.
+            module_name (str): The absolute name of the module, e.g. ``azul.polygon_price_manager``.
+
+        """
+        self._modules[key] = module_name
+
+    def get_class(self, key):
+        """
+        Returns the class associated with the specified key, importing the module that registers it if needed.
+        """
+        lookup_key = self.gen_lookup_key(key)
+        if lookup_key not in self._registry and lookup_key in self._modules:
+            importlib.import_module(self._modules[lookup_key])
+        return super().get_class(key)
+
+    def keys(self) -> Iterator[str]:
+        """
+        Iterates over the registered keys, including the ones whose modules haven't been imported.
+        """
+        for key in self._registry:
+            yield key
+        for key in self._modules:
+            if key not in self._registry:
+                yield key
+
+    def items(self) -> Iterator[Tuple[str, type]]:
+        """
+        Iterates over the registered keys and classes. This imports every registered module.
+        """
+        for key in list(self.keys()):
+            yield key, self.get_class(key)
+
+    def __len__(self) -> int:
+        return len(list(self.keys()))
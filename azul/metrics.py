@@ -0,0 +1,284 @@
+import json
+import threading
+import time
+from azul.atomic_file import atomic_write
+from typing import Dict, Optional
+
+# The stages of a download, in the order they happen. Stages that aren't listed are shown after them.
+STAGES = ['rate_limit', 'http', 'decode', 'fixna', 'check_sessions', 'resample', 'write', 'index']
+
+# The counters, in the order they are shown.
+COUNTERS = ['requests', 'cached_responses', 'bytes_received', 'http_errors', 'retries', 'throttled', 'rows_written']
+
+# The CPU time of the calling thread. process_time is the closest there is before Python 3.7.
+_thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+class RunMetrics(object):
+    """
+    Per-stage timers and counters for a download, kept per symbol and for the whole run.
+
+    Each stage records its wall time, the CPU time of the thread it ran on and the number of times it ran. Stages can
+    be nested. A stage's times don't include the time spent in the stages nested in it, so no time is counted twice
+    and the stages of a symbol add up to the time spent on it. Stages and counters recorded without a ticker only
+    count towards the run.
+
+    The metrics can be shared by the threads of a download.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = time.perf_counter()
+        self._elapsed = None
+
+        # [count, wall seconds, cpu seconds] by stage, and values by counter, for the run and for each ticker.
+        self._stages = {}
+        self._counters = {}
+        self._symbol_stages = {}
+        self._symbol_counters = {}
+
+    def time(self, stage: str, ticker: str = None) -> '_StageTimer':
+        """
+        Returns a context manager that adds the time spent in it to a stage.
+
+        Args:
+            stage (str): The stage, e.g. ``http`` or ``write``.
+            ticker (str): The symbol the time was spent on.
+
+        Returns:
+            timer: The context manager.
+
+        """
+        return _StageTimer(self, stage, ticker)
+
+    def add_time(self, stage: str, ticker: str = None, wall: float = 0.0, cpu: float = 0.0, count: int = 1) -> None:
+        """
+        Adds time that was measured some other way to a stage.
+        """
+        with self._lock:
+            _add_stage(self._stages, stage, count, wall, cpu)
+            if ticker is not None:
+                _add_stage(self._symbol_stages.setdefault(ticker, {}), stage, count, wall, cpu)
+
+    def count(self, name: str, ticker: str = None, value: int = 1) -> None:
+        """
+        Adds value to a counter, e.g. ``requests`` or ``rows_written``.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            if ticker is not None:
+                symbol_counters = self._symbol_counters.setdefault(ticker, {})
+                symbol_counters[name] = symbol_counters.get(name, 0) + value
+
+    def merge(self, other: dict) -> None:
+        """
+        Adds the stages and counters of metrics recorded elsewhere, e.g. in a worker process.
+
+        Args:
+            other (dict): The metrics, as returned by to_dict.
+
+        """
+        for stage, totals in other['stages'].items():
+            self.add_time(stage, wall=totals['wall'], cpu=totals['cpu'], count=totals['count'])
+        for name, value in other['counters'].items():
+            self.count(name, value=value)
+        for ticker, symbol in other['symbols'].items():
+            with self._lock:
+                for stage, totals in symbol['stages'].items():
+                    _add_stage(self._symbol_stages.setdefault(ticker, {}), stage, totals['count'], totals['wall'],
+                               totals['cpu'])
+                symbol_counters = self._symbol_counters.setdefault(ticker, {})
+                for name, value in symbol['counters'].items():
+                    symbol_counters[name] = symbol_counters.get(name, 0) + value
+
+    def finish(self) -> None:
+        """
+        Records the end of the run.
+        """
+        self._elapsed = time.perf_counter() - self._started
+
+    @property
+    def elapsed(self) -> float:
+        """
+        The wall time of the run in seconds, up to when finish was called.
+        """
+        return self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+
+    def to_dict(self) -> dict:
+        """
+        Returns the metrics as a dict that can be saved as JSON.
+
+        Returns:
+            metrics (dict): The run's ``elapsed`` seconds, its ``stages`` and ``counters``, and the stages and
+                counters of each of the ``symbols``.
+
+        """
+        with self._lock:
+            return {
+                'elapsed': self.elapsed,
+                'stages': _stages_dict(self._stages),
+                'counters': dict(self._counters),
+                'symbols': {
+                    ticker: {
+                        'stages': _stages_dict(self._symbol_stages.get(ticker, {})),
+                        'counters': dict(self._symbol_counters.get(ticker, {}))
+                    } for ticker in sorted(set(self._symbol_stages) | set(self._symbol_counters))
+                }
+            }
+
+    def summary(self, num_symbols: int = 5) -> str:
+        """
+        Returns a table of the time spent in each stage and the counters, followed by the slowest symbols.
+
+        Args:
+            num_symbols (int): The number of slowest symbols to show.
+
+        Returns:
+            summary (str): The table.
+
+        """
+        metrics = self.to_dict()
+        lines = ['{:<16} {:>10} {:>12} {:>12}'.format('stage', 'calls', 'wall s', 'cpu s')]
+        for stage, totals in _ordered(metrics['stages'], STAGES):
+            lines.append('{:<16} {:>10} {:>12.3f} {:>12.3f}'.format(
+                stage, totals['count'], totals['wall'], totals['cpu']))
+        lines.append('{:<16} {:>10} {:>12.3f}'.format('run', '', metrics['elapsed']))
+
+        if metrics['counters']:
+            lines.append('')
+            for name, value in _ordered(metrics['counters'], COUNTERS):
+                lines.append('{:<16} {:>10}'.format(name, value))
+
+        symbol_walls = sorted(
+            ((sum(totals['wall'] for totals in symbol['stages'].values()), ticker)
+             for ticker, symbol in metrics['symbols'].items()),
+            reverse=True)
+        if symbol_walls:
+            lines.append('')
+            lines.append('{:<16} {:>10}'.format('slowest symbols', 'wall s'))
+            for wall, ticker in symbol_walls[:num_symbols]:
+                lines.append('{:<16} {:>10.3f}'.format(ticker, wall))
+
+        return '\n'.join(lines)
+
+    def write_json(self, path: str) -> None:
+        """
+        Writes the metrics returned by to_dict to a JSON file.
+        """
+        _write_atomically(path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path: str, labels: Dict[str, str] = None) -> None:
+        """
+        Writes the run's metrics in the Prometheus text format, for node_exporter's textfile collector.
+
+        Only the run totals are written. A label per symbol would create thousands of series.
+
+        Args:
+            path (str): The file to write. The textfile collector reads files ending in ``.prom``.
+            labels (Dict[str, str]): Labels to add to every sample, e.g. the data source.
+
+        """
+        metrics = self.to_dict()
+        labels = labels or {}
+        lines = []
+
+        def add(name, help_text, samples):
+            lines.append('# HELP azul_{} {}'.format(name, help_text))
+            lines.append('# TYPE azul_{} {}'.format(name, 'gauge' if name == 'run_seconds' else 'counter'))
+            for sample_labels, value in samples:
+                lines.append('azul_{}{} {}'.format(name, _prometheus_labels(dict(labels, **sample_labels)), value))
+
+        stages = _ordered(metrics['stages'], STAGES)
+        add('stage_seconds_total', 'Wall time spent in each stage of the download.',
+            [({'stage': stage}, totals['wall']) for stage, totals in stages])
+        add('stage_cpu_seconds_total', 'CPU time spent in each stage of the download.',
+            [({'stage': stage}, totals['cpu']) for stage, totals in stages])
+        add('stage_calls_total', 'The number of times each stage of the download ran.',
+            [({'stage': stage}, totals['count']) for stage, totals in stages])
+        for name, value in _ordered(metrics['counters'], COUNTERS):
+            add(name + '_total', 'The {} of the download.'.format(name.replace('_', ' ')), [({}, value)])
+        add('run_seconds', 'The wall time of the download.', [({}, metrics['elapsed'])])
+
+        _write_atomically(path, '\n'.join(lines) + '\n')
+
+
+class _StageTimer(object):
+    # Times a stage. The timers running on a thread are kept on a stack, so a stage can take the time of the stages
+    # nested in it out of its own.
+
+    def __init__(self, metrics: RunMetrics, stage: str, ticker: Optional[str]):
+        self._metrics = metrics
+        self._stage = stage
+        self._ticker = ticker
+        self.nested_wall = 0.0
+        self.nested_cpu = 0.0
+
+    def __enter__(self):
+        stack = self._stack()
+        stack.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = _thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self._wall
+        cpu = _thread_time() - self._cpu
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1].nested_wall += wall
+            stack[-1].nested_cpu += cpu
+        self._metrics.add_time(self._stage, self._ticker, wall - self.nested_wall, cpu - self.nested_cpu)
+        return False
+
+    def _stack(self):
+        local = self._metrics._local
+        if not hasattr(local, 'stack'):
+            local.stack = []
+        return local.stack
+
+
+class _NullTimer(object):
+    # Used instead of a _StageTimer when there are no metrics to record.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+def _add_stage(stages: dict, stage: str, count: int, wall: float, cpu: float) -> None:
+    totals = stages.setdefault(stage, [0, 0.0, 0.0])
+    totals[0] += count
+    totals[1] += wall
+    totals[2] += cpu
+
+
+def _stages_dict(stages: dict) -> dict:
+    return {stage: {'count': count, 'wall': wall, 'cpu': cpu} for stage, (count, wall, cpu) in stages.items()}
+
+
+def _ordered(values: dict, order: list) -> list:
+    # The items of values with the known keys first, in order, and then the others by name.
+    known = [(key, values[key]) for key in order if key in values]
+    return known + sorted((key, value) for key, value in values.items() if key not in order)
+
+
+def _prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    escaped = ('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for key, value in sorted(labels.items()))
+    return '{' + ','.join(escaped) + '}'
+
+
+def _write_atomically(path: str, text: str) -> None:
+    # Whatever reads the file never sees half of it.
+    with atomic_write(path) as f:
+        f.write(text)
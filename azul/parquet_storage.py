@@ -0,0 +1,99 @@
+import pandas as pd
+import pathlib
+from azul import storage_registry
+from azul.atomic_file import AtomicFile
+from azul.base_storage import BaseStorage, StorageWriter
+
+
+@storage_registry.register('parquet')
+class ParquetStorage(BaseStorage):
+    """
+    Stores price data as Parquet files with float32 prices and integer volumes.
+
+    Requires pyarrow. Supported compressions are snappy, gzip, brotli, lz4 and zstd.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, compression: str = None):
+        super().__init__(compression)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('The parquet format requires pyarrow. Install it with: pip install pyarrow')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+
+    def write(self, df: pd.DataFrame, path: pathlib.Path) -> None:
+        table = self._pa.Table.from_pandas(self._compact_dtypes(df))
+        self._pq.write_table(table, str(path), compression=self.compression or 'NONE')
+
+    def read(self, path: pathlib.Path) -> pd.DataFrame:
+        return self._pq.read_table(str(path)).to_pandas()
+
+    def writer(self, path: pathlib.Path) -> StorageWriter:
+        return ParquetStorageWriter(self, path)
+
+    def last_timestamp(self, path: pathlib.Path) -> pd.Timestamp:
+        # The rows are sorted, so the last timestamp is the maximum of the index column in the last row group.
+        # Read it from the row group statistics if they were written.
+        parquet_file = self._pq.ParquetFile(str(path))
+        metadata = parquet_file.metadata
+        if metadata.num_rows == 0:
+            return None
+
+        index_columns = parquet_file.schema_arrow.pandas_metadata['index_columns']
+        if not index_columns or not isinstance(index_columns[0], str):
+            return super().last_timestamp(path)
+
+        index_name = index_columns[0]
+        row_group = metadata.row_group(metadata.num_row_groups - 1)
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            if column.path_in_schema == index_name and column.statistics is not None \
+                    and column.statistics.has_min_max:
+                return pd.Timestamp(column.statistics.max)
+
+        return super().last_timestamp(path)
+
+
+class ParquetStorageWriter(StorageWriter):
+    """
+    Writes a Parquet file a piece at a time, one row group per piece. The pieces are written to a temporary file
+    next to the file, which replaces the file when the writer is closed.
+    """
+
+    def __init__(self, storage: ParquetStorage, path: pathlib.Path):
+        super().__init__(storage, path)
+        self._atomic_file = AtomicFile(path)
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        df = self.storage._compact_dtypes(df)
+        if self._writer is None:
+            table = self.storage._pa.Table.from_pandas(df)
+            self._schema = table.schema
+            self._writer = self.storage._pq.ParquetWriter(
+                str(self._atomic_file.temp_path), self._schema, compression=self.storage.compression or 'NONE')
+        else:
+            table = self.storage._pa.Table.from_pandas(df, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is None:
+            # Nothing was written, so the file is left as it was.
+            self._atomic_file.discard()
+            return
+        self._writer.close()
+        self._writer = None
+        self._atomic_file.commit()
+
+    def abort(self) -> None:
+        # Closing the writer would write a footer that makes the partial file look complete, so the file it was
+        # writing is deleted instead.
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._atomic_file.discard()
@@ -0,0 +1,63 @@
+from azul import symbol_fetcher_registry
+from azul.base_symbol_fetcher import BaseSymbolFetcher
+from azul.http_client import get_http_client
+import logbook
+import os
+from typing import List
+
+log = logbook.Logger('PolygonCommonStockSymbolFetcher')
+
+# The number of symbols on each page of polygon's symbols endpoint.
+POLYGON_SYMBOLS_PER_PAGE = 50
+
+
+@symbol_fetcher_registry.register('polygon_cs')
+class PolygonCommonStockSymbolFetcher(BaseSymbolFetcher):
+    """
+    Fetches the symbols of the common stocks that polygon has data for, not including OTC stocks.
+
+    The symbols come 50 to a page, so the pages are fetched several at a time.
+
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        api_key = os.getenv('AZUL_POLYGON_API_KEY')
+        if not api_key or not isinstance(api_key, str):
+            raise ValueError('The Polygon API key must be provided '
+                             'through the environment variable '
+                             'AZUL_POLYGON_API_KEY')
+        self._api_key = api_key
+        self._base_url = 'https://api.polygon.io'
+        self._http_client = get_http_client()
+
+        # The number of pages to fetch at once.
+        self.workers = 8
+
+    def _fetch_symbols(self) -> List[str]:
+        return self._fetch_pages(self._fetch_page, self.workers)
+
+    def _fetch_page(self, page: int) -> List[str]:
+        """
+        Fetches one page of symbols.
+
+        Args:
+            page (int): The page, numbered from 1.
+
+        Returns:
+            symbols (List[str]): The symbols on the page. Empty if the page is past the last one.
+
+        """
+        params = {
+            'apikey': self._api_key,
+            'type': 'cs',
+            'perpage': POLYGON_SYMBOLS_PER_PAGE,
+            'page': page,
+            'isOTC': 'false'
+        }
+        response = self._http_client.get(self._base_url + '/v1/meta/symbols', params=params)
+        if response.status_code != 200:
+            raise RuntimeError('Error getting page {} of the symbols from polygon. Response status code: {}'.format(
+                page, response.status_code))
+
+        return [symbol_object['symbol'] for symbol_object in response.json().get('symbols') or []]
@@ -1,15 +1,31 @@
-import requests
 import pandas as pd
 import numpy as np
-import pathlib
-import zipline as zl
 import logbook
-import datetime
 import os
-from azul import price_manager_registry, BasePriceManager
+import json
+import operator
+from typing import List, Optional
+from azul import price_manager_registry
+from azul.base_price_manager import BasePriceManager
+from azul.http_client import get_http_client
 
 log = logbook.Logger('PolygonPriceManager')
 
+# Use a faster JSON decoder for the responses if one is installed.
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    try:
+        from ujson import loads as _json_loads
+    except ImportError:
+        from json import loads as _json_loads
+
+# The most minute bars polygon will return for one historic agg request.
+POLYGON_MAX_ROWS_PER_REQUEST = 50000
+
+# The most minute bars polygon has in one session (pre-market, regular and after hours trading from 4am to 8pm ET).
+POLYGON_MAX_MINUTES_PER_SESSION = 16 * 60
+
 
 @price_manager_registry.register('polygon')
 class PolygonPriceManager(BasePriceManager):
@@ -22,9 +38,14 @@ class PolygonPriceManager(BasePriceManager):
                              'through the environment variable '
                              'AZUL_POLYGON_API_KEY')
         self._api_key = api_key
+        self._base_url = 'https://api.polygon.io'
+        self._http_client = get_http_client()
+
+        # Ask for as many sessions at a time as will fit in one response.
+        self.MAX_SESSIONS_PER_REQUEST = POLYGON_MAX_ROWS_PER_REQUEST // POLYGON_MAX_MINUTES_PER_SESSION
 
     def _url(self, path):
-        return 'https://api.polygon.io' + path
+        return self._base_url + path
 
     # def get_stock_symbols(self, start_page=1, otc=False):
     #
@@ -43,7 +64,7 @@ class PolygonPriceManager(BasePriceManager):
     #             'isOTC': isOTC
     #         }
     #         url = self._url('/v1/meta/symbols')
-    #         response = requests.get(url, params=params)
+    #         response = self._http_client.get(url, params=params)
     #
     #         if response.status_code in[401, 404, 409]:
     #             log.error('Error getting symbols. Response code: {}'.format(response.status_code))
@@ -107,72 +128,268 @@ class PolygonPriceManager(BasePriceManager):
         # https://api.polygon.io/v1/historic/agg/minute/{symbol}?from=2000-01-03&to=2000-01-04&apikey=xxx
 
         end_timestamp = start_timestamp.replace(hour=23, minute=59)
-        df = pd.DataFrame()
+        data = self._cached_response(
+            ticker,
+            start_timestamp,
+            lambda: self._historic_agg_response(ticker, start_timestamp, end_timestamp)
+        )
+        return self._session_minute_dataframe(data, ticker, start_timestamp, end_timestamp)
+
+    def _session_minute_dataframe(
+            self,
+            data: Optional[bytes],
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> pd.DataFrame:
+        """
+        Creates the minute bars for one session from a historic agg response and repairs their missing values.
+
+        Args:
+            data (bytes): The body of the response.
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The time the minute bars were requested from.
+            end_timestamp (Timestamp): The time the minute bars were requested to.
+
+        Returns:
+            df (DataFrame): The minute bars. Empty if there weren't any.
+
+        """
+        with self._timed('decode', ticker):
+            payload = self._historic_agg_payload(data, ticker, start_timestamp, end_timestamp)
+            if payload is None:
+                return pd.DataFrame()
+
+            df = self._minute_dataframe_from_payload(payload)
+        if df.empty:
+            return df
+
+        return self._fixna(df, ticker)
+
+    def _minute_dataframe_for_date_range(
+            self,
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> pd.DataFrame:
+
+        end_timestamp = end_timestamp.replace(hour=23, minute=59)
+        session_dates = self._calendar.sessions_in_range(start_timestamp, end_timestamp)
+
+        # Use the cached sessions and only ask polygon for the range of sessions that aren't cached.
+        payloads = []
+        uncached_dates = session_dates
+        if self.response_cache is not None:
+            provider = type(self).__name__
+            uncached_dates = []
+            for timestamp in session_dates:
+                data = self.response_cache.get(provider, ticker, timestamp)
+                payload = None
+                if data is not None:
+                    with self._timed('decode', ticker):
+                        payload = self._historic_agg_payload(data, ticker, timestamp, timestamp)
+                if payload is None:
+                    uncached_dates.append(timestamp)
+                else:
+                    self._count('cached_responses', ticker)
+                    payloads.append(payload)
+
+        dfs = []
+        if len(uncached_dates):
+            if len(uncached_dates) < len(session_dates):
+                start_timestamp = uncached_dates[0]
+                end_timestamp = uncached_dates[-1].replace(hour=23, minute=59)
+
+            data = self._historic_agg_response(ticker, start_timestamp, end_timestamp)
+            with self._timed('decode', ticker):
+                payload = self._historic_agg_payload(data, ticker, start_timestamp, end_timestamp)
+
+            if payload is not None and len(payload['ticks']) >= POLYGON_MAX_ROWS_PER_REQUEST:
+                # The response was truncated so fall back to asking for each session on its own.
+                log.info('Too many minute bars for {} from: {} to: {}. Getting one session at a time.',
+                         ticker, start_timestamp.date(), end_timestamp.date())
+                for timestamp in uncached_dates:
+                    self._wait_for_rate_limit()
+                    dfs.append(self._minute_dataframe_for_date(ticker, timestamp))
+            elif payload is not None:
+                payloads.extend(self._split_payload_by_session(ticker, uncached_dates, payload))
+
+        if payloads:
+            with self._timed('decode', ticker):
+                payload = dict(payloads[0], ticks=[tick for p in payloads for tick in p['ticks']])
+                df = self._minute_dataframe_from_payload(payload)
+            if not df.empty:
+                # Fix the missing values one session at a time, the same as when the sessions are fetched one at a
+                # time.
+                dfs.append(df.groupby(df.index.normalize(), group_keys=False).apply(
+                    lambda day_df: self._fixna(day_df, ticker)))
+
+        dfs = [df for df in dfs if not df.empty]
+        if not dfs:
+            return pd.DataFrame()
+        if len(dfs) == 1:
+            return dfs[0]
+        return pd.concat(dfs).sort_index()
+
+    def _split_payload_by_session(self, ticker: str, session_dates, payload: dict) -> List[dict]:
+        """
+        Splits a historic agg response for several sessions into one response per session and caches them.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session_dates (DatetimeIndex): The sessions the response is for.
+            payload (dict): The response.
+
+        Returns:
+            payloads (List[dict]): The response for each session.
+
+        """
+        ms_per_day = 24 * 60 * 60 * 1000
+        ticks_by_day = {}
+        for tick in payload['ticks']:
+            ticks_by_day.setdefault(tick['t'] // ms_per_day, []).append(tick)
 
+        provider = type(self).__name__
+        payloads = []
+        for timestamp in session_dates:
+            day = pd.Timestamp(timestamp).value // (ms_per_day * 1000000)
+            session_payload = dict(payload, ticks=ticks_by_day.get(day, []))
+            payloads.append(session_payload)
+            if self.response_cache is not None:
+                self.response_cache.put(provider, ticker, timestamp, json.dumps(session_payload).encode('utf-8'))
+        return payloads
+
+    def _historic_agg_response(
+            self,
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> Optional[bytes]:
+        """
+        Gets the raw minute aggregates response for a ticker between two times.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The time to get minute bars from.
+            end_timestamp (Timestamp): The time to get minute bars to.
+
+        Returns:
+            data (bytes): The body of the response, or None if there was an error.
+
+        """
+        url, params = self._historic_agg_request(ticker, start_timestamp, end_timestamp)
+        with self._timed('http', ticker):
+            response = self._http_client.get(url, params=params, rate_limiter=self.rate_limiter)
+        self._count_response(ticker, response)
+
+        if response.status_code != 200:
+            self._log_historic_agg_error(ticker, start_timestamp, end_timestamp, response.status_code)
+            return None
+
+        return response.content
+
+    def _historic_agg_request(self, ticker: str, start_timestamp: pd.Timestamp, end_timestamp: pd.Timestamp):
+        """
+        Returns the URL and the query string parameters of a historic agg request.
+        """
         params = {
             'apikey': self._api_key,
             # Pass in the time in ET
             #from': '2018-11-28 09:30:00',
             'from': start_timestamp,
-            #'limit': 1440
+            'limit': POLYGON_MAX_ROWS_PER_REQUEST,
             'to': end_timestamp
         }
         size = 'minute'
         url = self._url('/v1/historic/agg/{}/{}'.format(size, ticker))
+        return url, params
 
-        response = requests.get(url, params=params)
+    def _log_historic_agg_error(self, ticker, start_timestamp, end_timestamp, status_code):
+        log.error('Error getting historic agg {} data from polygon for: {} from: {} to: {}'.format(
+            'minute', ticker, start_timestamp, end_timestamp))
+        log.error('Response status code: {}', status_code)
 
-        if response.status_code != 200:
-            log.error('Error getting historic agg {} data from polygon for: {} from: {} to: {}'.format(
-                size, ticker, start_timestamp, end_timestamp))
-            log.error('Response status code: {}', response.status_code)
-            return df
+    def _historic_agg_payload(
+            self,
+            data: Optional[bytes],
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> Optional[dict]:
+        """
+        Reads a historic agg response.
+
+        Args:
+            data (bytes): The body of the response.
+            ticker (str): Ticker symbol for the stock.
+            start_timestamp (Timestamp): The time the minute bars were requested from.
+            end_timestamp (Timestamp): The time the minute bars were requested to.
+
+        Returns:
+            payload (dict): The response, or None if it couldn't be read.
+
+        """
+        if data is None:
+            return None
 
         try:
-            json_dict = response.json()
+            json_dict = _json_loads(data)
         except Exception as e:
             log.info('Could not read json data from historic agg response for: {} from: {} to: {}',
                      ticker, start_timestamp, end_timestamp)
             log.info('Exception: {}', e)
-            log.info('Response code: {}', response.status_code)
-            return df
+            return None
 
-        try:
-            ticks = json_dict['ticks']
-        except Exception as e:
+        if not isinstance(json_dict, dict) or 'ticks' not in json_dict:
             log.info('Could not read ticks data from historic agg response for: {} from: {} to: {}'.format(
                 ticker, start_timestamp, end_timestamp))
-            return df
+            return None
 
-        # polygon doesn't return in ascending order
-        # Do not rely on df.sort_values() as this library
-        # may be used with older
-        df = pd.DataFrame(
-            sorted(ticks, key=lambda t: t['t']),
-            columns=('o', 'h', 'l', 'c', 'v', 't'),
-        )
+        return json_dict
 
-        # Give the colunms the names from the map.
-        df.columns = [json_dict['map'][c] for c in df.columns]
-        df.rename(columns={'timestamp': 'date'}, inplace=True)
+    def _minute_dataframe_from_payload(self, json_dict: dict) -> pd.DataFrame:
+        """
+        Creates the minute bars from a historic agg response.
 
-        # Converting the index to a date
-        size = json_dict['aggType']
-        if size[0] == 'm':
-            df.set_index('date', inplace=True)
-            # astype is necessary to deal with empty result
-            df.index = pd.to_datetime(
-                df.index.astype('int64') * 1000000,
-                utc=True,
-                )
+        The ticks are read into one array per column in a single pass, and are only sorted if polygon returned them
+        out of order.
+
+        Args:
+            json_dict (dict): The response.
+
+        Returns:
+            df (DataFrame): The minute bars, sorted oldest first, before missing values are fixed.
+
+        """
+        ticks = json_dict['ticks']
+        keys = ('o', 'h', 'l', 'c', 'v', 't')
+
+        # Give the columns the names from the map.
+        names = [json_dict['map'][key] for key in keys]
+        names[names.index('timestamp')] = 'date'
+
+        try:
+            columns = list(zip(*map(operator.itemgetter(*keys), ticks)))
+        except KeyError:
+            # Some ticks are missing values, so let pandas fill them in with NaN.
+            df = pd.DataFrame(ticks, columns=keys)
+            columns = [df[key].values for key in keys]
+        if not columns:
+            columns = [()] * len(keys)
+        arrays = dict(zip(names, [np.asarray(column) for column in columns]))
 
-        df.sort_index(inplace=True)
+        timestamps = arrays.pop('date').astype('int64')
+        # polygon doesn't return the ticks in ascending order. Sort them, keeping ticks with the same timestamp in
+        # the order they were returned.
+        if len(timestamps) > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind='mergesort')
+            timestamps = timestamps[order]
+            arrays = {name: values[order] for name, values in arrays.items()}
 
-        df = self._fixna(df, ticker)
-        df.index = df.index.tz_convert(None)
+        index = pd.DatetimeIndex(timestamps.astype('datetime64[ms]').astype('datetime64[ns]'), name='date')
 
         # Add (required?) columns for the CSVDIR bundle and re-arrange them
-        df['dividend'] = 0.0
-        df['split'] = 1.0
-        df = df[self._cols]
+        arrays['dividend'] = np.zeros(len(timestamps))
+        arrays['split'] = np.ones(len(timestamps))
+        df = pd.DataFrame({col: arrays[col] for col in self._cols}, index=index)
         return df
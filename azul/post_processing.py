@@ -0,0 +1,137 @@
+import logbook
+import multiprocessing
+import pathlib
+import pickle
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+from .data_index import DataIndex
+from .metrics import RunMetrics
+
+log = logbook.Logger('PostProcessing')
+
+# Send DataFrames to the worker processes as Arrow IPC streams if pyarrow is installed.
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARROW_IPC = 'arrow_ipc'
+PICKLE = 'pickle'
+
+# The price managers used by this worker process, by calendar name and storage.
+_price_managers = {}
+
+
+def create_process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Creates a pool of processes to check, resample and write the symbols' data on.
+
+    The processes are spawned rather than forked, because the process creating them is also running the threads that
+    download the data.
+
+    Args:
+        processes (int): The number of processes.
+
+    Returns:
+        pool (ProcessPoolExecutor): The pool.
+
+    """
+    if processes < 1:
+        raise ValueError('processes must be at least 1, got: {}'.format(processes))
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+
+
+def encode_dataframe(df: pd.DataFrame) -> Tuple[str, object]:
+    """
+    Serializes a DataFrame to send to another process.
+
+    With pyarrow, the DataFrame is written as an Arrow IPC stream. Each column is one contiguous buffer, so the
+    stream is sent without pickling each block and read back without parsing. Without pyarrow it is pickled.
+
+    Args:
+        df (DataFrame): The DataFrame.
+
+    Returns:
+        encoding (str): ARROW_IPC or PICKLE.
+        data (Buffer or bytes): The serialized DataFrame.
+
+    """
+    if pa is None:
+        return PICKLE, pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    writer.write_table(table)
+    writer.close()
+    return ARROW_IPC, sink.getvalue()
+
+
+def decode_dataframe(encoding: str, data) -> pd.DataFrame:
+    """
+    Reads a DataFrame serialized by encode_dataframe.
+
+    Args:
+        encoding (str): ARROW_IPC or PICKLE.
+        data (Buffer or bytes): The serialized DataFrame.
+
+    Returns:
+        df (DataFrame): The DataFrame.
+
+    """
+    if encoding == ARROW_IPC:
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+    return pickle.loads(data)
+
+
+def process_and_write_data(
+        calendar_name: str,
+        storage_class: type,
+        compression: str,
+        ticker: str,
+        encoding: str,
+        data,
+        minute_dir_path: pathlib.Path,
+        daily_dir_path: pathlib.Path,
+        record_metrics: bool = False,
+        record_index: bool = False
+) -> dict:
+    """
+    Runs BasePriceManager._process_and_write_data in a worker process.
+
+    The storage is passed as its class and compression, because some storages hold modules, which can't be pickled.
+
+    Args:
+        calendar_name (str): The name of the price manager's trading calendar.
+        storage_class (type): The class of the price manager's storage.
+        compression (str): The compression of the price manager's storage.
+        ticker (str): Ticker symbol for the stock.
+        encoding (str): How the minute bars were serialized. See encode_dataframe.
+        data (Buffer or bytes): The minute bars, sorted oldest first.
+        minute_dir_path (Path): The directory to write the minute data to.
+        daily_dir_path (Path): The directory to write the daily data to.
+        record_metrics (bool): Whether to record the time spent in each stage and the rows written.
+        record_index (bool): Whether to record the files written for the data index.
+
+    Returns:
+        recorded (dict): The ``metrics`` recorded, as returned by RunMetrics.to_dict, and the ``index`` entries of
+            the files written, as returned by DataIndex.to_dict. Each is None if it wasn't recorded.
+
+    """
+    key = (calendar_name, storage_class, compression)
+    price_manager = _price_managers.get(key)
+    if price_manager is None:
+        from .base_price_manager import BasePriceManager
+        price_manager = BasePriceManager(calendar_name)
+        price_manager.storage = storage_class(compression)
+        _price_managers[key] = price_manager
+
+    price_manager.metrics = RunMetrics() if record_metrics else None
+    price_manager.data_index = DataIndex(None) if record_index else None
+    df = decode_dataframe(encoding, data)
+    price_manager._process_and_write_data(ticker, df, minute_dir_path, daily_dir_path)
+    return {
+        'metrics': price_manager.metrics.to_dict() if record_metrics else None,
+        'index': price_manager.data_index.to_dict() if record_index else None
+    }
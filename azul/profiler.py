@@ -0,0 +1,240 @@
+import cProfile
+import logbook
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, List, Tuple
+
+log = logbook.Logger('Profiler')
+
+# How often the sampler looks at the threads' stacks, in seconds.
+SAMPLING_INTERVAL = 0.005
+
+# The profilers a Profiler can run. cprofile records every call, sampling looks at the stacks every
+# SAMPLING_INTERVAL seconds and has much less overhead.
+MODES = ['cprofile', 'sampling']
+
+# The files of the functions that wait for other threads. The work they wait for is profiled on those threads, so
+# the time spent waiting isn't counted towards the functions that wait.
+WAITING_FILES = ('threading.py', 'concurrent/futures/_base.py')
+
+# A function in a profile, the same as the keys of pstats: (file name, line number, function name).
+FunctionKey = Tuple[str, int, str]
+
+
+class Profiler(object):
+    """
+    Profiles everything that runs in this process, on every thread, while it is started.
+
+    The stacks of all the threads are sampled every interval seconds in either mode. The samples are written as
+    collapsed stacks, the input of flamegraph.pl, speedscope and similar tools. In ``cprofile`` mode each thread
+    also runs a cProfile profiler, and the profiles of all the threads are combined into one .pstats file. In
+    ``sampling`` mode the .pstats file is built from the samples, with the times estimated from the time between the
+    samples each function was in.
+
+    Work done in other processes, e.g. by ``--processes``, isn't profiled. Python 3.12 and later only allow one
+    cProfile profiler at a time, so ``cprofile`` mode falls back to ``sampling`` on them.
+
+    Args:
+        mode (str): ``cprofile`` or ``sampling``.
+        interval (float): The seconds between samples.
+
+    """
+
+    def __init__(self, mode: str = 'cprofile', interval: float = SAMPLING_INTERVAL):
+        if mode not in MODES:
+            raise ValueError('The profile mode must be one of {}, got: {}'.format(MODES, mode))
+        self.mode = mode
+        self.interval = interval
+
+        self._profiles = []
+        self._profiles_lock = threading.Lock()
+        # The number of times each stack was sampled, and the seconds it was sampled for. The stacks are tuples of
+        # FunctionKey, starting at the thread.
+        self._samples = Counter()
+        self._sample_seconds = Counter()
+        self._sampler = None
+        self._stopping = threading.Event()
+        self._stats = None
+
+    def start(self) -> None:
+        """
+        Starts profiling the calling thread and any threads started after it.
+        """
+        if self.mode == 'cprofile' and sys.version_info >= (3, 12):
+            # Only the calling thread could be profiled, so the time spent on the download workers would be missing.
+            log.warning('Python 3.12 and later can only run cProfile on one thread at a time. Sampling the threads '
+                        'instead.')
+            self.mode = 'sampling'
+
+        # Start the sampler first so it doesn't profile itself.
+        self._sampler = threading.Thread(target=self._sample, name='azul-profiler', daemon=True)
+        self._sampler.start()
+
+        if self.mode == 'cprofile':
+            self._enable_profile()
+            threading.setprofile(self._profile_thread)
+
+    def stop(self) -> None:
+        """
+        Stops profiling.
+
+        Call it once the threads started while profiling have finished. A thread's cProfile profiler can only be
+        disabled by the thread itself, so the profile of a thread that is still running is read while it is being
+        added to.
+        """
+        if self.mode == 'cprofile':
+            threading.setprofile(None)
+            # The calling thread's profiler is the first. Disable it before reading the others, so they can be read.
+            self._profiles[0].disable()
+            stats = pstats.Stats(self._profiles[0])
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            self._stats = stats.stats
+
+        self._stopping.set()
+        self._sampler.join()
+        if self.mode == 'sampling':
+            self._stats = self._stats_from_samples()
+
+    def write_pstats(self, path: str) -> None:
+        """
+        Writes the profile as a .pstats file, which can be read with pstats, snakeviz and similar tools.
+        """
+        with open(path, 'wb') as f:
+            marshal.dump(self._stats, f)
+
+    def write_collapsed_stacks(self, path: str) -> None:
+        """
+        Writes the sampled stacks in the collapsed format: one line per stack, with the frames from the root of the
+        thread separated by semicolons, followed by the number of samples of the stack.
+        """
+        with open(path, 'w') as f:
+            lines = sorted(';'.join(_format_function(key) for key in stack) + ' ' + str(count)
+                           for stack, count in self._samples.items())
+            for line in lines:
+                f.write(line + '\n')
+
+    def hot_functions(self, include: Callable[[str], bool], num_functions: int = 10) -> List[tuple]:
+        """
+        Returns the functions with the most time spent in them and in the code they call, other than the other
+        included functions.
+
+        A function's own time is its cumulative time less the cumulative time of the included functions it calls, and
+        of waiting for other threads. So time spent in pandas or numpy on behalf of a price manager method is counted
+        towards that method, but the time the main thread spends waiting for the download workers isn't.
+
+        Args:
+            include (Callable[[str], bool]): Whether to include the functions in a file.
+            num_functions (int): The number of functions to return.
+
+        Returns:
+            functions (List[tuple]): (own seconds, cumulative seconds, calls, function) for each function, hottest
+                first. function is formatted as ``file:line(name)``.
+
+        """
+        included = {key for key in self._stats if include(key[0])}
+        own_times = {key: self._stats[key][3] for key in included}
+        waiting = {key for key in self._stats if key[0].replace(os.sep, '/').endswith(WAITING_FILES)}
+        for key in included | waiting:
+            for caller, caller_stats in self._stats[key][4].items():
+                if caller in own_times and caller != key:
+                    own_times[caller] -= caller_stats[3]
+
+        hottest = sorted(included, key=lambda key: own_times[key], reverse=True)[:num_functions]
+        return [(max(own_times[key], 0.0), self._stats[key][3], self._stats[key][1], _format_function(key))
+                for key in hottest]
+
+    def _profile_thread(self, frame, event, arg) -> None:
+        # Called by each thread started while profiling, in place of a profile function, the first time it runs.
+        self._enable_profile()
+
+    def _enable_profile(self) -> None:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Python 3.12 only allows one cProfile profiler to be enabled at a time. Stop calling _profile_thread, which
+            # would otherwise stay the thread's profile function and be called on every call and return.
+            sys.setprofile(None)
+            log.warning('Could not profile thread {}: {}'.format(threading.current_thread().name, e))
+            return
+        with self._profiles_lock:
+            self._profiles.append(profile)
+
+    def _sample(self) -> None:
+        sampler_id = threading.get_ident()
+        last_sampled = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            # While other threads hold the GIL, samples are further apart than the interval. Weigh each sample by
+            # the time since the last one so the times aren't underestimated.
+            now = time.perf_counter()
+            seconds = now - last_sampled
+            last_sampled = now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_function_key(frame.f_code))
+                    frame = frame.f_back
+                # The root of each stack is the thread it was sampled on.
+                stack.append(('', 0, names.get(thread_id, 'thread-{}'.format(thread_id))))
+                stack.reverse()
+                stack = tuple(stack)
+                self._samples[stack] += 1
+                self._sample_seconds[stack] += seconds
+
+    def _stats_from_samples(self) -> dict:
+        # Builds the stats pstats reads from the samples: {function: (calls, calls, own time, cumulative time,
+        # callers)}, where callers is {caller: (calls, calls, own time, cumulative time)}. The number of samples a
+        # function was in stands in for its number of calls.
+        stats = {}
+        for stack, count in self._samples.items():
+            seconds = self._sample_seconds[stack]
+            functions = stack[1:]
+            seen = set()
+            for i, key in enumerate(functions):
+                function_stats = stats.setdefault(key, [0, 0.0, 0.0, {}])
+                is_leaf = i == len(functions) - 1
+                if is_leaf:
+                    function_stats[1] += seconds
+                # A recursive function's cumulative time only counts each sample once.
+                if key not in seen:
+                    seen.add(key)
+                    function_stats[0] += count
+                    function_stats[2] += seconds
+                if i > 0:
+                    caller_stats = function_stats[3].setdefault(functions[i - 1], [0, 0.0, 0.0])
+                    caller_stats[0] += count
+                    caller_stats[2] += seconds
+                    if is_leaf:
+                        caller_stats[1] += seconds
+
+        return {
+            key: (calls, calls, own, cumulative, {
+                caller: (caller_calls, caller_calls, caller_own, caller_cumulative)
+                for caller, (caller_calls, caller_own, caller_cumulative) in callers.items()
+            }) for key, (calls, own, cumulative, callers) in stats.items()
+        }
+
+
+def _function_key(code) -> FunctionKey:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _format_function(key: FunctionKey) -> str:
+    filename, line, name = key
+    if not filename:
+        return name
+    return '{}:{}({})'.format(_short_filename(filename), line, name)
+
+
+def _short_filename(filename: str) -> str:
+    # The file's directory and name, e.g. azul/base_price_manager.py, so the stacks stay readable.
+    return '/'.join(filename.replace(os.sep, '/').split('/')[-2:])
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import threading
+import time
+import logbook
+from typing import Dict
+
+log = logbook.Logger('RateLimiter')
+
+_UNIT_SECONDS = {
+    's': 1.0,
+    'sec': 1.0,
+    'm': 60.0,
+    'min': 60.0,
+    'h': 3600.0,
+    'hr': 3600.0,
+}
+
+
+class TokenBucketRateLimiter(object):
+    """
+    Limits how often requests are made using a token bucket.
+
+    The bucket holds up to capacity tokens and refills at rate tokens per second. Each request takes a token, and if
+    the bucket is empty the request waits for the next one. Tokens are reserved while holding a lock and the waiting
+    is done outside of it, so the limiter can be shared by threads and by asyncio tasks.
+
+    Args:
+        rate (float): The number of requests allowed per second.
+        capacity (float): The most requests that can be made in a burst. Defaults to one second's worth.
+
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError('The rate must be greater than 0, got: {}'.format(rate))
+
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+        # Counters for tuning throughput against the quota.
+        self.num_requests = 0
+        self.num_waits = 0
+        self.wait_time = 0.0
+
+    def acquire(self) -> float:
+        """
+        Blocks the calling thread until a request can be made.
+
+        Returns:
+            delay (float): The number of seconds waited.
+
+        """
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self) -> float:
+        """
+        Waits, without blocking the event loop, until a request can be made.
+
+        Returns:
+            delay (float): The number of seconds waited.
+
+        """
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the counters.
+
+        Returns:
+            stats (dict): The number of requests, how many of them had to wait and the total seconds spent waiting.
+
+        """
+        with self._lock:
+            return {
+                'num_requests': self.num_requests,
+                'num_waits': self.num_waits,
+                'wait_time': self.wait_time
+            }
+
+    def _reserve(self) -> float:
+        # Take a token, letting the bucket go negative, and return how long until that token would have been added.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1.0
+
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.num_requests += 1
+            if delay > 0:
+                self.num_waits += 1
+                self.wait_time += delay
+            return delay
+
+
+def parse_rate(rate_str: str) -> float:
+    """
+    Parses a rate like ``5/s``, ``300/min`` or ``1000/h``.
+
+    Args:
+        rate_str (str): The number of requests, a slash and the time unit.
+
+    Returns:
+        rate (float): The number of requests per second.
+
+    """
+    try:
+        count, unit = rate_str.strip().split('/')
+        return float(count) / _UNIT_SECONDS[unit.strip().lower()]
+    except (ValueError, KeyError):
+        raise ValueError('Invalid rate limit: {}. Expected something like 5/s, 300/min or 1000/h.'.format(rate_str))
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+_env_var_loaded = False
+
+
+def set_rate_limit(key: str, rate_str: str) -> TokenBucketRateLimiter:
+    """
+    Sets the rate limit shared by all the price managers registered with a key.
+
+    Args:
+        key (str): The price manager registry key. For example ``polygon``.
+        rate_str (str): The rate. See parse_rate.
+
+    Returns:
+        rate_limiter (TokenBucketRateLimiter): The rate limiter for the key.
+
+    """
+    # Read the environment variable first, so the rates set here override it rather than the other way around.
+    _load_env_var()
+    rate_limiter = TokenBucketRateLimiter(parse_rate(rate_str))
+    with _rate_limiters_lock:
+        _rate_limiters[key] = rate_limiter
+    log.info('Limiting {} to {}'.format(key, rate_str))
+    return rate_limiter
+
+
+def configure_rate_limits(rate_limits: str) -> None:
+    """
+    Sets several rate limits from a string like ``polygon=5/s,iex=100/s``.
+
+    Args:
+        rate_limits (str): Comma separated key=rate pairs.
+
+    Returns:
+        None
+
+    """
+    for rate_limit in rate_limits.split(','):
+        if not rate_limit.strip():
+            continue
+        try:
+            key, rate_str = rate_limit.split('=')
+        except ValueError:
+            raise ValueError('Invalid rate limit: {}. Expected something like polygon=5/s.'.format(rate_limit))
+        set_rate_limit(key.strip(), rate_str)
+
+
+def get_rate_limiter(key: str) -> TokenBucketRateLimiter:
+    """
+    Returns the rate limiter for a price manager registry key.
+
+    Rate limits can also be set with the AZUL_RATE_LIMITS environment variable, for example
+    ``AZUL_RATE_LIMITS=polygon=5/s,iex=100/s``. Rates set with set_rate_limit or configure_rate_limits, e.g. from
+    the command line, take precedence over it.
+
+    Args:
+        key (str): The price manager registry key.
+
+    Returns:
+        rate_limiter (TokenBucketRateLimiter): The rate limiter, or None if the key isn't rate limited.
+
+    """
+    _load_env_var()
+    with _rate_limiters_lock:
+        return _rate_limiters.get(key)
+
+
+def _load_env_var() -> None:
+    # Sets the rate limits in AZUL_RATE_LIMITS, once, before any others are set.
+    global _env_var_loaded
+    with _rate_limiters_lock:
+        if _env_var_loaded:
+            return
+        _env_var_loaded = True
+    configure_rate_limits(os.getenv('AZUL_RATE_LIMITS', ''))
@@ -0,0 +1,230 @@
+import hashlib
+import os
+import pathlib
+import threading
+import time
+import logbook
+import pandas as pd
+from collections import OrderedDict
+from azul.atomic_file import atomic_write, TEMP_SUFFIX
+from datetime import datetime, timedelta
+from typing import Optional
+
+log = logbook.Logger('ResponseCache')
+
+# Keep at most 2 GiB of responses by default.
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# When the cache grows larger than its size limit, remove entries until it is this fraction of the limit, so it
+# doesn't need evicting again on the next put.
+LOW_WATER_FRACTION = 0.9
+
+# Responses for a session that is still trading are only reused for 15 minutes by default.
+DEFAULT_TTL = 15 * 60
+
+# A session can't change once its after hours trading is over. That ends at 8pm ET, which is at most 1am UTC the
+# next day, so wait a little longer than that before treating a session as final.
+SESSION_FINALIZED_AFTER = timedelta(days=1, hours=6)
+
+
+class ResponseCache(object):
+    """
+    An on-disk cache of the raw responses price managers get from their providers, one entry per provider, ticker
+    and session.
+
+    Responses for sessions that are over never expire, so a session is only ever downloaded once. Responses for a
+    session that is still trading expire after ``ttl`` seconds. When the cache grows larger than ``max_bytes``
+    the least recently used entries are removed until it is back down to ``LOW_WATER_FRACTION`` of it.
+
+    Args:
+        cache_dir (str): The directory to store the responses in. Defaults to ~/.azul/cache.
+        max_bytes (int): The most bytes of responses to keep.
+        ttl (float): The number of seconds to reuse the response for a session that isn't over yet.
+
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        if cache_dir is None:
+            cache_dir = str(pathlib.Path.home() / '.azul' / 'cache')
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # The size of each entry, least recently used first, and their total size. They are read from the disk the
+        # first time something is added, in the order of the entries' access times, and kept up to date after that.
+        self._entry_sizes = None
+        self._size = None
+
+    def get(self, provider: str, ticker: str, session: pd.Timestamp) -> Optional[bytes]:
+        """
+        Gets the cached response for a session.
+
+        Args:
+            provider (str): The name of the provider the response came from.
+            ticker (str): Ticker symbol for the stock.
+            session (Timestamp): The session the response is for.
+
+        Returns:
+            data (bytes): The response, or None if it isn't cached or has expired.
+
+        """
+        path = self._path(provider, ticker, session)
+        try:
+            stat = path.stat()
+            if self._expired(session, stat.st_mtime):
+                return None
+            data = path.read_bytes()
+            # Record when the entry was last used in its access time. The modified time is when it was written.
+            os.utime(str(path), (time.time(), stat.st_mtime))
+        except OSError:
+            return None
+
+        with self._lock:
+            if self._entry_sizes is not None and path in self._entry_sizes:
+                self._entry_sizes.move_to_end(path)
+        return data
+
+    def contains(self, provider: str, ticker: str, session: pd.Timestamp) -> bool:
+        """
+        Returns True if there is a response for the session that hasn't expired.
+        """
+        try:
+            mtime = self._path(provider, ticker, session).stat().st_mtime
+        except OSError:
+            return False
+        return not self._expired(session, mtime)
+
+    def put(self, provider: str, ticker: str, session: pd.Timestamp, data: bytes) -> None:
+        """
+        Adds the response for a session to the cache, replacing any earlier response.
+
+        Args:
+            provider (str): The name of the provider the response came from.
+            ticker (str): Ticker symbol for the stock.
+            session (Timestamp): The session the response is for.
+            data (bytes): The response.
+
+        """
+        path = self._path(provider, ticker, session)
+
+        # Readers never see part of a response.
+        try:
+            with atomic_write(path, 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            log.warning('Could not cache the response for {} on {}: {}', ticker, session.date(), e)
+            return
+
+        with self._lock:
+            if self._entry_sizes is None:
+                self._load_entry_sizes()
+            self._size += len(data) - self._entry_sizes.pop(path, 0)
+            self._entry_sizes[path] = len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def size(self) -> int:
+        """
+        Returns the total size in bytes of the cached responses.
+        """
+        with self._lock:
+            self._load_entry_sizes()
+            return self._size
+
+    def clear(self) -> None:
+        """
+        Removes every cached response.
+        """
+        with self._lock:
+            for path in self._entries():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._entry_sizes = OrderedDict()
+            self._size = 0
+
+    def _path(self, provider: str, ticker: str, session: pd.Timestamp) -> pathlib.Path:
+        key = '{}/{}/{}'.format(provider, ticker, session.strftime('%Y-%m-%d'))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / digest[:2] / digest
+
+    def _expired(self, session: pd.Timestamp, mtime: float) -> bool:
+        written = datetime.utcfromtimestamp(mtime)
+        session_start = datetime(session.year, session.month, session.day)
+        if written >= session_start + SESSION_FINALIZED_AFTER:
+            # The response was written after the session was over so it can't change.
+            return False
+        return time.time() - mtime > self.ttl
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        return [path for path in self.cache_dir.glob('*/*') if not path.name.endswith(TEMP_SUFFIX)]
+
+    def _load_entry_sizes(self) -> None:
+        # Read the entries from the disk, ordered by when they were last used.
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, path, stat.st_size))
+        entries.sort(key=lambda entry: entry[0])
+        self._entry_sizes = OrderedDict((path, size) for _, path, size in entries)
+        self._size = sum(self._entry_sizes.values())
+
+    def _evict(self) -> None:
+        # Remove the least recently used entries until the cache is back down to its low water mark.
+        low_water_mark = self.max_bytes * LOW_WATER_FRACTION
+        num_evicted = 0
+        while self._size > low_water_mark and self._entry_sizes:
+            path, entry_size = self._entry_sizes.popitem(last=False)
+            try:
+                path.unlink()
+            except OSError:
+                # The entry was already removed, e.g. by another process sharing the cache.
+                pass
+            self._size -= entry_size
+            num_evicted += 1
+
+        log.debug('Evicted {} responses from the cache.', num_evicted)
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the ResponseCache shared by all the price managers, creating it the first time it is needed.
+
+    The cache can be set up with the environment variables ``AZUL_CACHE_DIR``, ``AZUL_CACHE_MAX_BYTES`` and
+    ``AZUL_CACHE_TTL`` (in seconds).
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                cache_dir=os.getenv('AZUL_CACHE_DIR'),
+                max_bytes=int(os.getenv('AZUL_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+                ttl=float(os.getenv('AZUL_CACHE_TTL', DEFAULT_TTL))
+            )
+        return _response_cache
+
+
+def configure_response_cache(**kwargs) -> ResponseCache:
+    """
+    Replaces the shared ResponseCache with one created with the given arguments.
+
+    Args:
+        **kwargs: Passed to ResponseCache. For example cache_dir, max_bytes and ttl.
+
+    Returns:
+        response_cache (ResponseCache): The new shared cache.
+
+    """
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = ResponseCache(**kwargs)
+        return _response_cache
@@ -12,11 +12,37 @@
 
 import click
 import azul
+import json
 import logbook
+import os
+from azul import rate_limiter
+from azul.profiler import MODES as PROFILE_MODES, Profiler
 
 
 @click.group()
-def cli():
+@click.option(
+    '--profile',
+    is_flag=True,
+    default=False,
+    help='Profile the command. Writes <profile-output>.pstats and <profile-output>.collapsed (collapsed stacks for '
+         'flame graphs) and shows the hottest price manager functions.',
+)
+@click.option(
+    '--profile-mode',
+    type=click.Choice(PROFILE_MODES),
+    default='cprofile',
+    show_default=True,
+    help='cprofile records every call. sampling samples the stacks, which slows the command down much less.',
+)
+@click.option(
+    '--profile-output',
+    type=click.Path(dir_okay=False),
+    default='azul-profile',
+    show_default=True,
+    help='The path of the profile files, without the extension.',
+)
+@click.pass_context
+def cli(ctx, profile, profile_mode, profile_output):
     """azul is a command line tool for downloading historical price data that can be used in a zipline bundle."""
 
     # install a logbook handler before performing any other operations
@@ -24,6 +50,30 @@ def cli():
     global log
     log = logbook.Logger('AzulCli')
 
+    if profile:
+        profiler = Profiler(profile_mode)
+        profiler.start()
+        # The context is closed once the sub command has finished, whether or not it succeeded.
+        ctx.call_on_close(lambda: _finish_profile(profiler, profile_output))
+
+
+def _finish_profile(profiler: Profiler, profile_output: str) -> None:
+    profiler.stop()
+    pstats_path = profile_output + '.pstats'
+    collapsed_path = profile_output + '.collapsed'
+    profiler.write_pstats(pstats_path)
+    profiler.write_collapsed_stacks(collapsed_path)
+    log.notice('Wrote the profile to: {} and {}'.format(pstats_path, collapsed_path))
+
+    # BasePriceManager and the price manager that was used are the only price managers with calls in the profile.
+    functions = profiler.hot_functions(lambda filename: os.path.basename(filename).endswith('price_manager.py'))
+    if functions:
+        lines = ['Hottest price manager functions:', '{:>10} {:>10} {:>10}  {}'.format('own s', 'cum s', 'calls',
+                                                                                         'function')]
+        for own, cumulative, calls, function in functions:
+            lines.append('{:>10.3f} {:>10.3f} {:>10}  {}'.format(own, cumulative, calls, function))
+        log.notice('\n'.join(lines))
+
 
 @click.command()
 @click.option(
@@ -36,7 +86,7 @@ def cli():
 @click.option(
     '--data-source',
     type=click.STRING,
-    metavar="['polygon', 'iex']",
+    metavar="['polygon', 'polygon_async', 'iex', 'synthetic']",
     default='iex',
     help='The source to get data from.'
 )
@@ -63,19 +113,290 @@ def cli():
     default=None,
     help='The date to end downloading data from.',
 )
-def download(symbol_source, data_source, output_dir, start, end):
+@click.option(
+    '-w',
+    '--workers',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help='The number of symbols to download concurrently.',
+)
+@click.option(
+    '--rate-limit',
+    type=click.STRING,
+    multiple=True,
+    metavar='KEY=RATE',
+    help='Limit the requests to a data source, e.g. polygon=5/s. Can be repeated.',
+)
+@click.option(
+    '-f',
+    '--format',
+    'file_format',
+    type=click.Choice(['csv', 'parquet', 'feather']),
+    default='csv',
+    show_default=True,
+    help='The format of the data files.',
+)
+@click.option(
+    '--compression',
+    type=click.STRING,
+    default=None,
+    help='The compression to use for parquet or feather files, e.g. snappy, zstd or lz4.',
+)
+@click.option(
+    '--cache/--no-cache',
+    default=True,
+    show_default=True,
+    help='Reuse the responses from the data source saved in ~/.azul/cache instead of downloading them again.',
+)
+@click.option(
+    '--resume',
+    is_flag=True,
+    default=False,
+    help='Record the progress of the download in the output directory, and resume the interrupted download '
+         'recorded there, skipping what it already downloaded.',
+)
+@click.option(
+    '--streaming',
+    is_flag=True,
+    default=False,
+    help='Process and write one session at a time to limit the memory used by long downloads.',
+)
+@click.option(
+    '-p',
+    '--processes',
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help='The number of processes to check, resample and write the data on. 0 uses the download workers.',
+)
+@click.option(
+    '--refresh-symbols',
+    is_flag=True,
+    default=False,
+    help='Fetch the symbols again instead of reusing the ones saved in ~/.azul/symbols.',
+)
+@click.option(
+    '--metrics-json',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help='Write the time spent in each stage and the request, byte and row counts, per symbol and in total, to a '
+         'JSON file.',
+)
+@click.option(
+    '--metrics-prom',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Write the run's metrics to a Prometheus textfile, e.g. for node_exporter's textfile collector.",
+)
+def download(symbol_source, data_source, output_dir, start, end, workers, rate_limit, file_format, compression,
+             cache, resume, streaming, processes, refresh_symbols, metrics_json, metrics_prom):
     """Download historical price data."""
     try:
-        azul.get_price_data(symbol_source, data_source, output_dir, start, end)
+        rate_limiter.configure_rate_limits(','.join(rate_limit))
+        failed = azul.get_price_data(symbol_source, data_source, output_dir, start, end, workers=workers,
+                                     file_format=file_format, compression=compression, cache=cache, resume=resume,
+                                     streaming=streaming, processes=processes, refresh_symbols=refresh_symbols,
+                                     metrics_json=metrics_json, metrics_prometheus=metrics_prom)
     except Exception as e:
         log.error(e)
         raise
+    _exit_if_any_failed(failed)
 
 
 @click.command()
-def update():
+@click.option(
+    '--data-source',
+    type=click.STRING,
+    metavar="['polygon', 'polygon_async', 'iex', 'synthetic']",
+    default='iex',
+    help='The source to get data from.'
+)
+@click.option(
+    '-o',
+    '--output-dir',
+    type=click.Path(file_okay=False),
+    default=None,
+    metavar='[~/.azul/<data-source>]',
+    show_default=False,
+    help="The directory containing the data to update."
+)
+@click.option(
+    '-e',
+    '--end',
+    type=click.DateTime(formats=['%Y-%m-%d']),
+    default=None,
+    help='The date to end downloading data from.',
+)
+@click.option(
+    '-w',
+    '--workers',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help='The number of symbols to update concurrently.',
+)
+@click.option(
+    '--rate-limit',
+    type=click.STRING,
+    multiple=True,
+    metavar='KEY=RATE',
+    help='Limit the requests to a data source, e.g. polygon=5/s. Can be repeated.',
+)
+@click.option(
+    '-f',
+    '--format',
+    'file_format',
+    type=click.Choice(['csv', 'parquet', 'feather']),
+    default='csv',
+    show_default=True,
+    help='The format of the data files.',
+)
+@click.option(
+    '--cache/--no-cache',
+    default=True,
+    show_default=True,
+    help='Reuse the responses from the data source saved in ~/.azul/cache instead of downloading them again.',
+)
+def update(data_source, output_dir, end, workers, rate_limit, file_format, cache):
     """Update symbols with any new data."""
-    pass
+    try:
+        rate_limiter.configure_rate_limits(','.join(rate_limit))
+        failed = azul.update_price_data(data_source, output_dir, end, workers=workers, file_format=file_format,
+                                        cache=cache)
+    except Exception as e:
+        log.error(e)
+        raise
+    _exit_if_any_failed(failed)
+
+
+def _exit_if_any_failed(failed) -> None:
+    # The failed symbols were already logged. Exit with an error so cron jobs and CI can tell the run failed.
+    if failed:
+        click.get_current_context().exit(1)
+
+
+@click.command()
+@click.option(
+    '-i',
+    '--input-dir',
+    type=click.Path(exists=True, file_okay=False),
+    required=True,
+    help='The directory containing the minute and daily data to convert.'
+)
+@click.option(
+    '--input-format',
+    type=click.Choice(['csv', 'parquet', 'feather']),
+    required=True,
+    help='The format of the data to convert.',
+)
+@click.option(
+    '-o',
+    '--output-dir',
+    type=click.Path(file_okay=False),
+    required=True,
+    help='The directory to write the converted data to.'
+)
+@click.option(
+    '--output-format',
+    type=click.Choice(['csv', 'parquet', 'feather']),
+    default='csv',
+    show_default=True,
+    help='The format to convert the data to. csv creates the layout zipline\'s csvdir bundle expects.',
+)
+@click.option(
+    '--compression',
+    type=click.STRING,
+    default=None,
+    help='The compression to use for parquet or feather files, e.g. snappy, zstd or lz4.',
+)
+def convert(input_dir, input_format, output_dir, output_format, compression):
+    """Convert downloaded data to another file format."""
+    try:
+        azul.convert_price_data(input_dir, output_dir, input_format, output_format, compression)
+    except Exception as e:
+        log.error(e)
+        raise
+
+
+@click.command()
+@click.option(
+    '--data-source',
+    type=click.STRING,
+    metavar="['polygon', 'polygon_async', 'iex', 'synthetic']",
+    default='iex',
+    help='The source the data was downloaded from.'
+)
+@click.option(
+    '-o',
+    '--output-dir',
+    type=click.Path(file_okay=False),
+    default=None,
+    metavar='[~/.azul/<data-source>]',
+    show_default=False,
+    help="The directory containing the data."
+)
+@click.option(
+    '-f',
+    '--format',
+    'file_format',
+    type=click.Choice(['csv', 'parquet', 'feather']),
+    default='csv',
+    show_default=True,
+    help='The format of the data files.',
+)
+@click.option(
+    '--verify',
+    is_flag=True,
+    default=False,
+    help='Check every file against its checksum in the index. This reads every file.',
+)
+@click.option(
+    '--rebuild',
+    is_flag=True,
+    default=False,
+    help='Rebuild the index by reading every file, e.g. for data downloaded before azul kept an index.',
+)
+@click.option(
+    '--json',
+    'as_json',
+    is_flag=True,
+    default=False,
+    help='Print the status of each symbol as JSON.',
+)
+@click.argument('symbols', nargs=-1)
+def status(data_source, output_dir, file_format, verify, rebuild, as_json, symbols):
+    """Show the data stored for each symbol."""
+    if output_dir is None:
+        output_dir = os.path.join(os.path.expanduser('~'), '.azul', data_source)
+    try:
+        rows = azul.get_price_data_status(output_dir, file_format, symbols=list(symbols) or None, verify=verify,
+                                          rebuild=rebuild)
+    except Exception as e:
+        log.error(e)
+        raise
+
+    if as_json:
+        click.echo(json.dumps(rows, indent=2))
+        return
+
+    click.echo('{:<10} {:<20} {:<20} {:>12} {:>10} {:>8}  {}'.format(
+        'symbol', 'first', 'last', 'minute rows', 'daily rows', 'missing', 'state'))
+    for row in rows:
+        click.echo('{:<10} {:<20} {:<20} {:>12} {:>10} {:>8}  {}'.format(
+            row['symbol'], _or_dash(row['first']), _or_dash(row['last']), _or_dash(row['minute_rows']),
+            _or_dash(row['daily_rows']), _or_dash(row['missing_sessions']), row['state']))
+
+    not_ok = [row['symbol'] for row in rows if row['state'] != 'ok']
+    click.echo('{} symbols, {} not ok.'.format(len(rows), len(not_ok)))
+
+
+def _or_dash(value) -> str:
+    # The values that aren't in the index are shown as a dash.
+    return '-' if value is None else str(value)
+
 
 cli.add_command(download)
 cli.add_command(update)
+cli.add_command(convert)
+cli.add_command(status)
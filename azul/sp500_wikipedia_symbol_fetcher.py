@@ -1,25 +1,94 @@
-from azul import symbol_fetcher_registry, BaseSymbolFetcher
-import pandas as pd
+from azul import symbol_fetcher_registry
+from azul.base_symbol_fetcher import BaseSymbolFetcher
+from azul.http_client import get_http_client
+from html.parser import HTMLParser
 from typing import List
 
+SP500_WIKIPEDIA_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+
+
 @symbol_fetcher_registry.register('sp500_wikipedia')
 class SP500WikipediaSymbolFetcher(BaseSymbolFetcher):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
-    def symbols(self) -> List[str]:
+    def _fetch_symbols(self) -> List[str]:
         """
 
         Returns:
             symbols (List[str]): A list containing all the ticker symbols of the S&P500 stocks
 
         """
-        data = pd.read_html('https://en.wikipedia.org/wiki/List_of_S%26P_500_companies')
-        table = data[0]
-        sliced_table = table[1:]
-        header = table.iloc[0]
-        df = sliced_table.rename(columns=header)
-        symbols = df['Symbol'].tolist()
+        response = get_http_client().get(SP500_WIKIPEDIA_URL)
+        if response.status_code != 200:
+            raise RuntimeError('Error getting the S&P 500 companies from wikipedia. Response status code: {}'.format(
+                response.status_code))
+        return self._symbols_from_html(response.text)
+
+    @staticmethod
+    def _symbols_from_html(html: str) -> List[str]:
+        """
+        Reads the symbols from the first column of the first table on the page.
+
+        Only the cells of that column are looked at, so this is much faster than parsing every table on the page into
+        DataFrames.
+
+        Args:
+            html (str): The page.
+
+        Returns:
+            symbols (List[str]): The symbols.
+
+        """
+        parser = _FirstColumnParser()
+        parser.feed(html)
+        parser.close()
+        symbols = parser.cells[1:] if parser.cells and parser.cells[0].lower() == 'symbol' else parser.cells
+        if not symbols:
+            raise ValueError('Could not find the S&P 500 companies table on the wikipedia page.')
         return symbols
 
+
+class _FirstColumnParser(HTMLParser):
+    # Collects the text of the first cell of each row of the first table.
+
+    def __init__(self):
+        super().__init__()
+        self.cells = []
+        self._table_depth = 0
+        self._tables_seen = 0
+        self._cell_index = -1
+        self._in_first_cell = False
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self._table_depth += 1
+            if self._table_depth == 1:
+                self._tables_seen += 1
+        elif not self._in_first_table():
+            return
+        elif tag == 'tr':
+            self._cell_index = -1
+        elif tag in ('td', 'th'):
+            self._cell_index += 1
+            if self._cell_index == 0:
+                self._in_first_cell = True
+                self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            self._table_depth -= 1
+        elif self._in_first_cell and tag in ('td', 'th'):
+            self._in_first_cell = False
+            text = ''.join(self._text).strip()
+            if text:
+                self.cells.append(text)
+
+    def handle_data(self, data):
+        if self._in_first_cell:
+            self._text.append(data)
+
+    def _in_first_table(self):
+        return self._table_depth == 1 and self._tables_seen == 1
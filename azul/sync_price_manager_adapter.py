@@ -0,0 +1,72 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from .base_async_price_manager import BaseAsyncPriceManager, get_running_loop
+from .base_price_manager import BasePriceManager
+
+
+def _wrapped_attribute(name: str) -> property:
+    # An attribute that is read from and written to the wrapped price manager, so settings made on either one after
+    # the adapter is created are seen by both. The defaults BasePriceManager.__init__ sets before there is a wrapped
+    # price manager are ignored.
+    def get(self):
+        return getattr(self.price_manager, name)
+
+    def set(self, value):
+        if 'price_manager' in self.__dict__:
+            setattr(self.price_manager, name, value)
+
+    return property(get, set)
+
+
+class SyncPriceManagerAdapter(BaseAsyncPriceManager):
+    """
+    Lets a synchronous price manager be used through the async price manager API.
+
+    The wrapped price manager's _minute_dataframe_for_date is run on a pool of threads, one fetch per thread, so up to
+    max_workers of its sessions are fetched at once.
+
+    Args:
+        price_manager (BasePriceManager): The synchronous price manager.
+        max_workers (int): The most sessions to fetch at once.
+
+    """
+
+    # Use the wrapped price manager's calendar, settings and state.
+    _calendar = _wrapped_attribute('_calendar')
+    _cols = _wrapped_attribute('_cols')
+    MISSING_DATE_THRESHOLD = _wrapped_attribute('MISSING_DATE_THRESHOLD')
+    rate_limiter = _wrapped_attribute('rate_limiter')
+    storage = _wrapped_attribute('storage')
+    response_cache = _wrapped_attribute('response_cache')
+    job_manifest = _wrapped_attribute('job_manifest')
+    streaming = _wrapped_attribute('streaming')
+    processes = _wrapped_attribute('processes')
+    metrics = _wrapped_attribute('metrics')
+    data_index = _wrapped_attribute('data_index')
+
+    def __init__(self, price_manager: BasePriceManager, max_workers: int = 32):
+        super().__init__()
+        self.price_manager = price_manager
+        self.MAX_CONCURRENT_REQUESTS = max_workers
+        self._executor = None
+
+    def _validated_start_and_end_dates(self, start_date, end_date):
+        return self.price_manager._validated_start_and_end_dates(start_date, end_date)
+
+    def _sessions_are_cached(self, ticker, session_dates):
+        return self.price_manager._sessions_are_cached(ticker, session_dates)
+
+    def _minute_dataframe_for_date(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
+        return self.price_manager._minute_dataframe_for_date(ticker, start_timestamp)
+
+    async def _minute_dataframe_for_date_async(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
+        loop = get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.price_manager._minute_dataframe_for_date, ticker, start_timestamp)
+
+    async def _open_async(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS)
+
+    async def _close_async(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._executor = None
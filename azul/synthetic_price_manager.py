@@ -0,0 +1,132 @@
+import logbook
+import numpy as np
+import pandas as pd
+import time
+import zlib
+from azul import price_manager_registry
+from azul.base_price_manager import BasePriceManager
+
+log = logbook.Logger('SyntheticPriceManager')
+
+NANOS_PER_DAY = 24 * 60 * 60 * 1000 * 1000 * 1000
+
+# The prices providers use for missing prices, which _fixna repairs.
+BAD_PRICES = np.array([np.nan, 0.0, -1.0])
+
+
+@price_manager_registry.register('synthetic')
+class SyntheticPriceManager(BasePriceManager):
+    """
+    Generates minute bars instead of downloading them, for benchmarks and tests.
+
+    Each session's closes are a random walk seeded by the seed, the ticker and the session, so the same bars are
+    generated however many workers there are and in whatever order the symbols and sessions are asked for. Gaps, bad
+    ticks and the latency of a real provider can be added to exercise the code that handles them.
+
+    Args:
+        seed (int): Seeds the random walks. Different seeds generate different bars.
+        volatility (float): The standard deviation of the log return of each minute.
+        gap_probability (float): The probability that a minute has no bar.
+        missing_session_probability (float): The probability that a session has no bars at all.
+        bad_tick_probability (float): The probability that a price is missing, 0 or -1, like providers send for
+            missing prices.
+        latency (float): The seconds each request takes.
+        sessions_per_request (int): The number of sessions each request returns. More than 1 exercises
+            _minute_dataframe_for_date_range.
+
+    """
+
+    def __init__(
+            self,
+            seed: int = 0,
+            volatility: float = 0.001,
+            gap_probability: float = 0.0,
+            missing_session_probability: float = 0.0,
+            bad_tick_probability: float = 0.0,
+            latency: float = 0.0,
+            sessions_per_request: int = 1
+    ):
+        super().__init__()
+        self.seed = seed
+        self.volatility = volatility
+        self.gap_probability = gap_probability
+        self.missing_session_probability = missing_session_probability
+        self.bad_tick_probability = bad_tick_probability
+        self.latency = latency
+        self.MAX_SESSIONS_PER_REQUEST = sessions_per_request
+
+        # The number of requests made, which benchmarks report.
+        self.num_requests = 0
+
+    def _minute_dataframe_for_date(self, ticker: str, start_timestamp: pd.Timestamp) -> pd.DataFrame:
+        self._request()
+        return self._session_minute_dataframe(ticker, start_timestamp)
+
+    def _minute_dataframe_for_date_range(
+            self,
+            ticker: str,
+            start_timestamp: pd.Timestamp,
+            end_timestamp: pd.Timestamp
+    ) -> pd.DataFrame:
+        self._request()
+        dfs = [self._session_minute_dataframe(ticker, session)
+               for session in self._calendar.sessions_in_range(start_timestamp, end_timestamp)]
+        dfs = [df for df in dfs if not df.empty]
+        return pd.concat(dfs) if dfs else pd.DataFrame()
+
+    def _request(self) -> None:
+        self.num_requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _session_minute_dataframe(self, ticker: str, session: pd.Timestamp) -> pd.DataFrame:
+        """
+        Generates the minute bars for a session.
+
+        Args:
+            ticker (str): Ticker symbol for the stock.
+            session (Timestamp): The session.
+
+        Returns:
+            df (DataFrame): The minute bars, indexed by (timezone naive) UTC time. Empty if the session is missing.
+
+        """
+        rng = self._random_state(ticker, session)
+        if rng.random_sample() < self.missing_session_probability:
+            return pd.DataFrame()
+
+        minutes = self._calendar.minutes_for_session(session).tz_convert(None)
+        num_minutes = len(minutes)
+
+        # Each ticker trades around its own price, and each session opens somewhere around it.
+        base_price = 10.0 + zlib.crc32(ticker.encode('utf-8')) % 490
+        first_price = base_price * np.exp(rng.normal(0.0, 0.02))
+        closes = first_price * np.exp(np.cumsum(rng.normal(0.0, self.volatility, num_minutes)))
+        opens = np.concatenate(([first_price], closes[:-1]))
+        spread = np.abs(rng.normal(0.0, self.volatility / 2, num_minutes))
+        highs = np.maximum(opens, closes) * (1 + spread)
+        lows = np.minimum(opens, closes) * (1 - spread)
+        prices = np.round(np.column_stack([opens, highs, lows, closes]), 2)
+
+        if self.bad_tick_probability > 0:
+            bad = rng.random_sample(prices.shape) < self.bad_tick_probability
+            prices[bad] = BAD_PRICES[rng.randint(len(BAD_PRICES), size=int(bad.sum()))]
+
+        df = pd.DataFrame({
+            'open': prices[:, 0],
+            'high': prices[:, 1],
+            'low': prices[:, 2],
+            'close': prices[:, 3],
+            'volume': rng.randint(100, 10000, num_minutes),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.Index(minutes, name='date'))
+
+        if self.gap_probability > 0:
+            df = df[rng.random_sample(num_minutes) >= self.gap_probability]
+
+        return self._fixna(df[self._cols], ticker)
+
+    def _random_state(self, ticker: str, session: pd.Timestamp) -> np.random.RandomState:
+        day = pd.Timestamp(session).value // NANOS_PER_DAY
+        return np.random.RandomState([self.seed, zlib.crc32(ticker.encode('utf-8')), day])
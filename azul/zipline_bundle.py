@@ -0,0 +1,168 @@
+"""
+Zipline bundles that ingest price data straight from a price manager, skipping the CSV files.
+
+To make the bundles available to zipline, add this to ``~/.zipline/extension.py``::
+
+    from azul.zipline_bundle import register_azul_bundles
+    register_azul_bundles()
+
+Then ingest them like any other bundle::
+
+    $ zipline ingest -b azul-polygon
+"""
+import logbook
+import os
+import pandas as pd
+from datetime import datetime
+from zipline.data import bundles
+import azul
+from azul import rate_limiter
+
+log = logbook.Logger('ZiplineBundle')
+
+# The data sources that get a bundle named azul-<data source> from register_azul_bundles.
+AZUL_BUNDLE_DATA_SOURCES = ['polygon', 'iex']
+
+
+def azul_bundle(symbol_source: str, data_source: str, symbols=None):
+    """
+    Creates a zipline ingest function that gets symbols and price data like get_price_data, but writes the minute and
+    daily bars directly to zipline's bcolz writers and the assets to its asset database.
+
+    The minute bars are written one symbol at a time as soon as they are downloaded. Only the (much smaller) daily bars
+    are kept until all the symbols have been downloaded.
+
+    Args:
+        symbol_source (str): The source of the symbols. See get_price_data.
+        data_source (str): The source of the price data. See get_price_data.
+        symbols (List[str]): The symbols to ingest. If given, symbol_source isn't used.
+
+    Returns:
+        ingest (callable): The ingest function to pass to zipline.data.bundles.register.
+
+    """
+
+    def ingest(environ, asset_db_writer, minute_bar_writer, daily_bar_writer, adjustment_writer, calendar,
+               start_session, end_session, cache, show_progress, output_dir):
+        if symbols is None:
+            log.notice('Fetching ticker symbols...')
+            bundle_symbols = azul.symbol_fetcher_registry.get(symbol_source).symbols()
+            log.notice('Fetched {} ticker symbols.'.format(len(bundle_symbols)))
+        else:
+            bundle_symbols = symbols
+
+        price_manager = azul.price_manager_registry.get(data_source)
+        price_manager.rate_limiter = rate_limiter.get_rate_limiter(data_source)
+        start_date = _to_datetime(start_session)
+        end_date = _to_datetime(end_session)
+
+        daily_bars = []
+        assets = []
+
+        def minute_bars():
+            for ticker in bundle_symbols:
+                try:
+                    df = price_manager._minute_dataframe_for_dates(ticker, start_date, end_date)
+                    if df.empty:
+                        continue
+
+                    df = price_manager._check_sessions(df, ticker, frequency='minute')
+                    daily_df = price_manager._resample_minute_data_to_daily_data(df)
+                    daily_df = price_manager._check_sessions(daily_df, ticker, frequency='daily')
+                except Exception as e:
+                    log.error('Error retrieving {}: {}'.format(ticker, e))
+                    continue
+
+                # zipline expects the assets' sids to count up from 0.
+                sid = len(assets)
+                assets.append((ticker, daily_df.index[0], daily_df.index[-1]))
+                daily_bars.append((sid, daily_df))
+                log.notice('Retrieved: {}'.format(ticker))
+                yield sid, df
+
+        minute_bar_writer.write(minute_bars(), show_progress=show_progress)
+        daily_bar_writer.write(daily_bars, show_progress=show_progress)
+
+        equities = pd.DataFrame(assets, columns=['symbol', 'start_date', 'end_date'])
+        equities['start_date'] = _to_utc_index(equities['start_date'])
+        equities['end_date'] = _to_utc_index(equities['end_date'])
+        equities['first_traded'] = equities['start_date']
+        equities['auto_close_date'] = equities['end_date'] + pd.Timedelta(days=1)
+        equities['asset_name'] = equities['symbol']
+        equities['exchange'] = 'AZUL'
+        asset_db_writer.write(equities=equities)
+
+        # The price managers don't provide splits or dividends.
+        adjustment_writer.write()
+
+    return ingest
+
+
+def register_azul_bundle(
+        name: str,
+        symbol_source: str,
+        data_source: str,
+        start: datetime = None,
+        end: datetime = None,
+        calendar_name: str = 'NYSE',
+        symbols=None
+) -> None:
+    """
+    Registers a zipline bundle that is ingested directly from a price manager.
+
+    Args:
+        name (str): The name of the bundle.
+        symbol_source (str): The source of the symbols. See get_price_data.
+        data_source (str): The source of the price data. See get_price_data.
+        start (datetime): The first date to ingest. Defaults to as far back as the price manager has data.
+        end (datetime): The last date to ingest. Defaults to today.
+        calendar_name (str): The trading calendar of the bundle.
+        symbols (List[str]): The symbols to ingest. If given, symbol_source isn't used.
+
+    Returns:
+        None
+
+    """
+    start_session = pd.Timestamp(start, tz='UTC').normalize() if start is not None else None
+    end_session = pd.Timestamp(end, tz='UTC').normalize() if end is not None else None
+    bundles.register(
+        name,
+        azul_bundle(symbol_source, data_source, symbols=symbols),
+        calendar_name=calendar_name,
+        start_session=start_session,
+        end_session=end_session,
+        minutes_per_day=390
+    )
+
+
+def register_azul_bundles() -> None:
+    """
+    Registers an ``azul-<data source>`` bundle for each data source in AZUL_BUNDLE_DATA_SOURCES.
+
+    The symbols come from the symbol source in the AZUL_BUNDLE_SYMBOL_SOURCE environment variable
+    (``sp500_wikipedia`` by default) and the first date to ingest can be set with AZUL_BUNDLE_START (YYYY-MM-DD).
+    """
+    symbol_source = os.getenv('AZUL_BUNDLE_SYMBOL_SOURCE', 'sp500_wikipedia')
+    start = os.getenv('AZUL_BUNDLE_START')
+    if start is not None:
+        start = datetime.strptime(start, azul.FORMAT_YMD)
+
+    for data_source in AZUL_BUNDLE_DATA_SOURCES:
+        register_azul_bundle('azul-' + data_source, symbol_source, data_source, start=start)
+
+
+def _to_datetime(session: pd.Timestamp) -> datetime:
+    # The price managers work with naive datetimes.
+    if session is None:
+        return None
+    session = pd.Timestamp(session)
+    if session.tzinfo is not None:
+        session = session.tz_convert(None)
+    return session.to_pydatetime()
+
+
+def _to_utc_index(dates: pd.Series) -> pd.Series:
+    dates = pd.to_datetime(dates)
+    if dates.dt.tz is None:
+        return dates.dt.tz_localize('UTC')
+    return dates.dt.tz_convert('UTC')
@@ -0,0 +1,85 @@
+"""
+Compares ingesting a synthetic dataset into zipline through CSV files (azul download followed by the csvdir bundle)
+with ingesting it directly through the azul bundle.
+
+Both paths use the same in-memory price manager, so the difference is the time spent writing and re-parsing the
+CSV files.
+
+Usage:
+    $ python benchmarks/bench_bundle_ingest.py [--symbols 20] [--days 60]
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from zipline.data import bundles
+from zipline.data.bundles.csvdir import csvdir_equities
+
+from azul import price_manager_registry, BasePriceManager
+from azul.zipline_bundle import register_azul_bundle
+
+
+@price_manager_registry.register('bench_in_memory')
+class InMemoryPriceManager(BasePriceManager):
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        session_minutes = self._calendar.minutes_for_session(start_timestamp)
+        rng = np.random.RandomState(abs(hash((ticker, start_timestamp.value))) % 2 ** 32)
+        close = 100.0 + np.cumsum(rng.normal(0, 0.05, len(session_minutes)))
+        df = pd.DataFrame({
+            'open': close,
+            'high': close + 0.05,
+            'low': close - 0.05,
+            'close': close,
+            'volume': rng.randint(100, 10000, len(session_minutes)),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.Index(session_minutes.tz_convert(None), name='date'))
+        return df[self._cols]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--days', type=int, default=60)
+    args = parser.parse_args()
+
+    symbols = ['SYM{}'.format(i) for i in range(args.symbols)]
+    end = datetime(2018, 12, 31)
+    start = end - timedelta(days=args.days)
+    start_session = pd.Timestamp(start, tz='UTC')
+    end_session = pd.Timestamp(end, tz='UTC')
+
+    with tempfile.TemporaryDirectory() as csv_dir, tempfile.TemporaryDirectory() as zipline_root:
+        environ = {'ZIPLINE_ROOT': zipline_root}
+
+        # The csvdir path: write the CSV files, then have zipline parse them.
+        pm = price_manager_registry.get('bench_in_memory')
+        begin = time.perf_counter()
+        pm.get_price_data(symbols, csv_dir, start, end)
+        download_seconds = time.perf_counter() - begin
+
+        bundles.register('bench-csvdir', csvdir_equities(['minute', 'daily'], csv_dir), calendar_name='NYSE',
+                         start_session=start_session, end_session=end_session, minutes_per_day=390)
+        begin = time.perf_counter()
+        bundles.ingest('bench-csvdir', environ=environ, show_progress=False)
+        csvdir_ingest_seconds = time.perf_counter() - begin
+
+        # The direct path.
+        register_azul_bundle('bench-azul', None, 'bench_in_memory', start=start, end=end, symbols=symbols)
+        begin = time.perf_counter()
+        bundles.ingest('bench-azul', environ=environ, show_progress=False)
+        azul_ingest_seconds = time.perf_counter() - begin
+
+    print('symbols: {}, calendar days: {}'.format(args.symbols, args.days))
+    print('csv download:            {:8.2f}s'.format(download_seconds))
+    print('csvdir ingest:           {:8.2f}s'.format(csvdir_ingest_seconds))
+    print('csv download + ingest:   {:8.2f}s'.format(download_seconds + csvdir_ingest_seconds))
+    print('azul bundle ingest:      {:8.2f}s'.format(azul_ingest_seconds))
+
+
+if __name__ == '__main__':
+    main()
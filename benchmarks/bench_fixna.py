@@ -0,0 +1,88 @@
+"""
+Benchmarks BasePriceManager._fixna against the pandas implementation it replaced.
+
+Each frame is one session of 390 minute bars. A few of the prices in each session are bad ticks: zeros, -1s or
+missing values, the way providers report them.
+
+Usage:
+    $ python benchmarks/bench_fixna.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from azul import BasePriceManager
+
+
+def fixna_with_replace(df):
+    # The implementation _fixna replaced.
+    cols = ['close', 'high', 'low', 'open']
+    df[cols] = df[cols].replace({0: np.nan})
+    df[cols] = df[cols].replace({-1.0: np.nan})
+    if df.isnull().sum().sum() > 0:
+        df['open'] = df['open'].bfill().ffill()
+        df['close'] = df['close'].bfill().ffill()
+        df.loc[df['low'].isnull(), 'low'] = df['open']
+        df.loc[df['high'].isnull(), 'high'] = df['open']
+        df.loc[df['close'].isnull(), 'close'] = df['open']
+    return df
+
+
+def session_dataframes(num_sessions, bad_tick_rate, seed=0):
+    rng = np.random.RandomState(seed)
+    dfs = []
+    for _ in range(num_sessions):
+        close = 100 + np.cumsum(rng.normal(0, 0.05, 390))
+        df = pd.DataFrame({
+            'open': close + rng.normal(0, 0.01, 390),
+            'high': close + 0.05,
+            'low': close - 0.05,
+            'close': close,
+            'volume': rng.randint(100, 10000, 390),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.date_range('2019-01-02 14:31', periods=390, freq='min', name='date'))
+        for col in ['open', 'high', 'low', 'close']:
+            bad = rng.rand(390) < bad_tick_rate
+            df.loc[bad, col] = rng.choice([0.0, -1.0, np.nan], bad.sum())
+        dfs.append(df)
+    return dfs
+
+
+def best_time(func, dfs, repeat=3):
+    times = []
+    for _ in range(repeat):
+        copies = [df.copy() for df in dfs]
+        start = time.perf_counter()
+        for df in copies:
+            func(df)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    pm = BasePriceManager()
+    num_sessions = 500
+
+    print('{:>14} {:>16} {:>16} {:>10} {:>12}'.format(
+        'bad tick rate', 'replace us/sess', 'kernel us/sess', 'speedup', 'repaired'))
+    for bad_tick_rate in [0.0, 0.001, 0.01]:
+        dfs = session_dataframes(num_sessions, bad_tick_rate)
+
+        num_repaired = 0
+        for df in dfs:
+            expected = fixna_with_replace(df.copy())
+            actual, count = pm._fixna_with_count(df.copy(), 'BENCH')
+            pd.testing.assert_frame_equal(expected, actual)
+            num_repaired += count
+
+        replace_time = best_time(fixna_with_replace, dfs)
+        kernel_time = best_time(lambda df: pm._fixna_with_count(df, 'BENCH'), dfs)
+        print('{:>14} {:>16.1f} {:>16.1f} {:>10.1f} {:>12}'.format(
+            bad_tick_rate, replace_time / num_sessions * 1e6, kernel_time / num_sessions * 1e6,
+            replace_time / kernel_time, num_repaired))
+
+
+if __name__ == '__main__':
+    main()
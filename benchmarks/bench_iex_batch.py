@@ -0,0 +1,98 @@
+"""
+Benchmarks IEX chart parsing and counts the requests of a batched download against one request per symbol and session.
+
+The charts are generated, and the batch endpoint is answered by a fake HTTP client, so the benchmark doesn't need the
+network. The old parser is kept here for comparison.
+
+Usage:
+    $ python benchmarks/bench_iex_batch.py
+"""
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pandas as pd
+import pytz
+
+import azul
+
+
+def chart(session):
+    minutes = pd.date_range(session.strftime('%Y-%m-%d') + ' 09:30', periods=390, freq='min')
+    return [{
+        'date': minute.strftime('%Y%m%d'),
+        'minute': minute.strftime('%H:%M'),
+        'label': minute.strftime('%I:%M %p'),
+        'high': 10.5, 'low': 9.5, 'open': 10.0, 'close': 10.25, 'volume': 100,
+        'marketHigh': 10.5, 'marketLow': 9.5, 'marketOpen': 10.0, 'marketClose': 10.25, 'marketVolume': 1000,
+        'marketAverage': 10.1, 'marketNotional': 10100.0, 'marketNumberOfTrades': 10
+    } for minute in minutes]
+
+
+def parse_with_inference(pm, data, ticker):
+    # The implementation _minute_dataframe_from_chart replaced.
+    df = pd.DataFrame(data).reset_index()
+    df['date'] = df['date'].astype('str')
+    df['minute'] = df['minute'].astype('str')
+    df['datet'] = df['date'] + ' ' + df['minute']
+    df['dividend'] = 0.0
+    df['split'] = 1.0
+    df.drop(['date', 'minute', 'average', 'changeOverTime', 'close', 'high', 'label', 'low', 'marketAverage',
+             'marketChangeOverTime', 'marketNotional', 'marketNumberOfTrades', 'notional', 'numberOfTrades',
+             'open', 'volume'], axis=1, inplace=True, errors='ignore')
+    df.rename(columns={'datet': 'date', 'marketClose': 'close', 'marketHigh': 'high', 'marketLow': 'low',
+                       'marketOpen': 'open', 'marketVolume': 'volume'}, inplace=True)
+    df.date = pd.to_datetime(df.date, errors='coerce')
+    df = df[~df.date.isnull()].set_index('date')
+    df = df.tz_localize(pytz.timezone('US/Eastern'))
+    df.index = df.index.tz_convert(pytz.utc)
+    df = pm._fixna(df, ticker)
+    df.index = df.index.tz_convert(None)
+    return df[pm._cols]
+
+
+class FakeResponse(object):
+
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+
+
+def main():
+    pm = azul.price_manager_registry.get('iex')
+
+    charts = [chart(session) for session in pd.bdate_range('2019-03-01', periods=50)]
+    for name, func in [('inference', lambda data: parse_with_inference(pm, data, 'BENCH')),
+                       ('fixed format', lambda data: pm._minute_dataframe_from_chart(data, 'BENCH', None))]:
+        start = time.perf_counter()
+        for data in charts:
+            func(data)
+        print('{:>14} parser: {:.2f} ms/chart'.format(name, (time.perf_counter() - start) / len(charts) * 1e3))
+
+    requests = []
+
+    def get(url, params=None, **kwargs):
+        requests.append(url)
+        session = pd.Timestamp(params['exactDate'])
+        body = {ticker: {'chart': chart(session)} for ticker in params['symbols'].split(',')}
+        return FakeResponse(json.dumps(body).encode('utf-8'))
+
+    pm._http_client = mock.Mock(get=get)
+    symbols = ['SYM{}'.format(i) for i in range(500)]
+    end_date = datetime.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=29)
+    num_sessions = len(pm._calendar.sessions_in_range(start_date, end_date))
+    with tempfile.TemporaryDirectory() as dir_name:
+        start = time.perf_counter()
+        pm.get_price_data(symbols, dir_name, start_date, end_date, workers=8)
+        elapsed = time.perf_counter() - start
+
+    print('{} symbols x {} sessions in {:.1f} s'.format(len(symbols), num_sessions, elapsed))
+    print('requests, one per symbol and session: {}'.format(len(symbols) * num_sessions))
+    print('requests, batched: {}'.format(len(requests)))
+
+
+if __name__ == '__main__':
+    main()
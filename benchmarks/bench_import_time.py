@@ -0,0 +1,76 @@
+"""
+Benchmarks how long it takes to start azul.
+
+Each command is run in a new interpreter several times, and the fastest and median wall times are printed. The
+commands import azul, show the CLI's help and look up each price manager, so a regression in startup time can be
+traced to what was imported. Pass --importtime to also print the modules that took the longest to import, from
+python -X importtime.
+
+Usage:
+    $ python benchmarks/bench_import_time.py
+    $ python benchmarks/bench_import_time.py --importtime
+"""
+import argparse
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = str(pathlib.Path(__file__).resolve().parent.parent)
+
+HELP = 'from azul.scripts.azul import cli\ntry:\n    cli({})\nexcept SystemExit:\n    pass'
+
+COMMANDS = [
+    ('python', 'pass'),
+    ('import azul', 'import azul'),
+    ('azul --help', HELP.format(['--help'])),
+    ('azul download --help', HELP.format(['download', '--help'])),
+    ('get synthetic', 'import azul\nazul.price_manager_registry.get_class("synthetic")'),
+    ('get polygon', 'import azul\nazul.price_manager_registry.get_class("polygon")'),
+    ('get iex', 'import azul\nazul.price_manager_registry.get_class("iex")')
+]
+
+
+def run(code, extra_args=()):
+    python_path = [REPO_DIR] + ([os.environ['PYTHONPATH']] if os.environ.get('PYTHONPATH') else [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable] + list(extra_args) + ['-c', code], cwd=REPO_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    return time.perf_counter() - start, completed.stderr.decode('utf-8')
+
+
+def slowest_imports(code, num_modules):
+    # Returns (cumulative microseconds, module) for the top level imports that took the longest.
+    _, stderr = run(code, ['-X', 'importtime'])
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Only the top level imports, not the ones nested in them.
+        if not module.startswith('  '):
+            imports.append((int(cumulative), module.strip()))
+    return sorted(imports, reverse=True)[:num_modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks how long it takes to start azul.')
+    parser.add_argument('--repeat', type=int, default=10, help='The number of times to run each command.')
+    parser.add_argument('--importtime', action='store_true', help='Print the slowest imports of each command.')
+    parser.add_argument('--modules', type=int, default=5, help='The number of slowest imports to print.')
+    args = parser.parse_args()
+
+    print('{:<24} {:>10} {:>10}'.format('command', 'min s', 'median s'))
+    for name, code in COMMANDS:
+        times = [run(code)[0] for _ in range(args.repeat)]
+        print('{:<24} {:>10.3f} {:>10.3f}'.format(name, min(times), statistics.median(times)))
+        if args.importtime:
+            for cumulative, module in slowest_imports(code, args.modules):
+                print('    {:<40} {:>10.3f}'.format(module, cumulative / 1e6))
+
+
+if __name__ == '__main__':
+    main()
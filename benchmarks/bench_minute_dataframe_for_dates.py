@@ -0,0 +1,60 @@
+"""
+Benchmarks how BasePriceManager._minute_dataframe_for_dates scales with the number of sessions.
+
+The price manager used here builds each session's minute bars in memory, so the timings only measure how the
+sessions are accumulated into one DataFrame. The time per session should stay roughly flat as the number of sessions
+grows.
+
+Usage:
+    $ python benchmarks/bench_minute_dataframe_for_dates.py
+"""
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from azul import BasePriceManager
+
+
+class InMemoryPriceManager(BasePriceManager):
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        session_minutes = pd.date_range(start_timestamp.replace(hour=14, minute=30), periods=390, freq='min')
+        prices = np.full(len(session_minutes), 10.0)
+        df = pd.DataFrame({
+            'open': prices,
+            'high': prices,
+            'low': prices,
+            'close': prices,
+            'volume': np.full(len(session_minutes), 100),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.Index(session_minutes, name='date'))
+        return df[self._cols]
+
+
+def main():
+    pm = InMemoryPriceManager()
+    end_date = datetime(2018, 12, 31)
+
+    print('{:>10} {:>10} {:>14} {:>16} {:>14}'.format('sessions', 'seconds', 'us/session', 'peak MB', 'result MB'))
+    for years in [1, 2, 4, 8]:
+        start_date = end_date.replace(year=end_date.year - years)
+        num_sessions = len(pm._calendar.sessions_in_range(start_date, end_date))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = pm._minute_dataframe_for_dates('BENCH', start_date, end_date)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result_size = df.memory_usage(index=True).sum()
+        print('{:>10} {:>10.3f} {:>14.1f} {:>16.1f} {:>14.1f}'.format(
+            num_sessions, elapsed, elapsed / num_sessions * 1e6, peak / 1e6, result_size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmarks decoding polygon historic agg responses into minute bars.
+
+Each payload is a full trading day of minute ticks, from 4am to 8pm ET, shuffled the way polygon returns them. The
+payloads are generated rather than recorded so the benchmark doesn't need an API key. They have the same shape as
+the responses the PolygonPriceManager caches.
+
+Usage:
+    $ python benchmarks/bench_polygon_decoding.py
+"""
+import json
+import os
+import random
+import time
+
+import pandas as pd
+
+os.environ.setdefault('AZUL_POLYGON_API_KEY', 'benchmark')
+
+from azul import price_manager_registry  # noqa: E402
+from azul import polygon_price_manager  # noqa: E402
+
+
+def full_day_payload(day, rng):
+    start = pd.Timestamp(day + ' 09:00').value // 1000000
+    ticks = []
+    price = 100.0
+    for i in range(16 * 60):
+        price += rng.gauss(0, 0.05)
+        ticks.append({
+            'o': round(price, 4),
+            'h': round(price + 0.05, 4),
+            'l': round(price - 0.05, 4),
+            'c': round(price + 0.01, 4),
+            'v': rng.randint(100, 10000),
+            't': start + 60000 * i
+        })
+    rng.shuffle(ticks)
+    return json.dumps({
+        'ticks': ticks,
+        'map': {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 't': 'timestamp'},
+        'aggType': 'min',
+        'symbol': 'BENCH'
+    }).encode('utf-8')
+
+
+def decode_with_dicts(data, cols):
+    # The implementation the column decoder replaced.
+    json_dict = json.loads(data.decode('utf-8'))
+    ticks = json_dict['ticks']
+    df = pd.DataFrame(sorted(ticks, key=lambda t: t['t']), columns=('o', 'h', 'l', 'c', 'v', 't'))
+    df.columns = [json_dict['map'][c] for c in df.columns]
+    df.rename(columns={'timestamp': 'date'}, inplace=True)
+    df.set_index('date', inplace=True)
+    df.index = pd.to_datetime(df.index.astype('int64') * 1000000, utc=True)
+    df.sort_index(inplace=True)
+    df.index = df.index.tz_convert(None)
+    df['dividend'] = 0.0
+    df['split'] = 1.0
+    return df[cols]
+
+
+def best_time(func, payloads, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in payloads:
+            func(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    pm = price_manager_registry.get('polygon')
+    rng = random.Random(0)
+    days = pd.bdate_range('2019-01-02', periods=100).strftime('%Y-%m-%d')
+    payloads = [full_day_payload(day, rng) for day in days]
+
+    def decode_with_columns(data):
+        return pm._minute_dataframe_from_payload(polygon_price_manager._json_loads(data))
+
+    def decode_with_columns_and_json(data):
+        return pm._minute_dataframe_from_payload(json.loads(data))
+
+    for data in payloads[:5]:
+        pd.testing.assert_frame_equal(decode_with_dicts(data, pm._cols), decode_with_columns(data))
+
+    print('{} payloads of {} ticks, JSON decoder: {}'.format(
+        len(payloads), 16 * 60, polygon_price_manager._json_loads.__module__))
+    print('{:>28} {:>12}'.format('decoder', 'ms/payload'))
+    for name, func in [('dicts + json', lambda data: decode_with_dicts(data, pm._cols)),
+                       ('columns + json', decode_with_columns_and_json),
+                       ('columns + fastest json', decode_with_columns)]:
+        print('{:>28} {:>12.3f}'.format(name, best_time(func, payloads) / len(payloads) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmarks processing and writing the symbols' data on the download threads against handing it to a process pool.
+
+The price manager returns synthetic minute bars without any latency, so the time measured is the CPU bound work of
+checking the sessions, resampling and writing the CSV files. On the threads that work is serialized by the GIL, so
+it should only scale with cores when it is done by processes.
+
+Usage:
+    $ python benchmarks/bench_post_processing.py
+"""
+import multiprocessing
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from azul import BasePriceManager
+
+
+class InMemoryPriceManager(BasePriceManager):
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        session_minutes = pd.date_range(start_timestamp.replace(hour=14, minute=31), periods=390, freq='min')
+        prices = np.linspace(10.0, 11.0, len(session_minutes))
+        df = pd.DataFrame({
+            'open': prices,
+            'high': prices,
+            'low': prices,
+            'close': prices,
+            'volume': np.full(len(session_minutes), 100),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.Index(session_minutes, name='date'))
+        return df[self._cols]
+
+
+def main():
+    symbols = ['SYM{}'.format(i) for i in range(16)]
+    start_date = datetime(2018, 7, 1)
+    end_date = datetime(2018, 12, 31)
+    workers = 8
+    cpu_count = multiprocessing.cpu_count()
+
+    print('{} symbols, {} to {}, {} workers, {} cpus'.format(
+        len(symbols), start_date.date(), end_date.date(), workers, cpu_count))
+    print('{:>10} {:>10} {:>10}'.format('processes', 'seconds', 'speedup'))
+    baseline = None
+    for processes in sorted({0, 2, cpu_count}):
+        pm = InMemoryPriceManager()
+        pm.processes = processes
+        with tempfile.TemporaryDirectory() as dir_name:
+            start = time.perf_counter()
+            pm.get_price_data(symbols, dir_name, start_date, end_date, workers=workers)
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print('{:>10} {:>10.2f} {:>10.1f}'.format(processes, elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmarks aggregating minute bars into daily bars with NumPy against resampling them with pandas.
+
+The minute series is five years of synthetic bars, one for each trading minute of the calendar.
+
+Usage:
+    $ python benchmarks/bench_resample_minute_to_daily.py
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from azul import BasePriceManager
+
+
+def synthetic_minute_dataframe(pm, start_date, end_date):
+    sessions = pm._calendar.sessions_in_range(start_date, end_date)
+    minutes = pm._calendar.minutes_for_sessions_in_range(sessions[0], sessions[-1]).tz_convert(None)
+    rng = np.random.RandomState(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.05, len(minutes)))
+    return pd.DataFrame({
+        'open': close + rng.normal(0, 0.01, len(minutes)),
+        'high': close + 0.05,
+        'low': close - 0.05,
+        'close': close,
+        'volume': rng.randint(100, 10000, len(minutes)),
+        'dividend': 0.0,
+        'split': 1.0
+    }, index=pd.Index(minutes, name='date'))
+
+
+def best_time(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    pm = BasePriceManager()
+    df = synthetic_minute_dataframe(pm, datetime(2019, 1, 1), datetime(2023, 12, 31))
+
+    expected = pm._resample_minute_data_to_daily_data_with_pandas(df)
+    actual = pm._resample_minute_data_to_daily_data(df)
+    pd.testing.assert_frame_equal(expected.reset_index(), actual.reset_index())
+
+    pandas_time = best_time(lambda: pm._resample_minute_data_to_daily_data_with_pandas(df))
+    numpy_time = best_time(lambda: pm._resample_minute_data_to_daily_data(df))
+
+    print('{} minute bars, {} daily bars'.format(len(df), len(actual)))
+    print('{:>10} {:>12}'.format('kernel', 'ms'))
+    print('{:>10} {:>12.2f}'.format('pandas', pandas_time * 1e3))
+    print('{:>10} {:>12.2f}'.format('numpy', numpy_time * 1e3))
+    print('speedup: {:.1f}x'.format(pandas_time / numpy_time))
+
+
+if __name__ == '__main__':
+    main()
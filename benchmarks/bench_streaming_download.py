@@ -0,0 +1,65 @@
+"""
+Benchmarks the peak memory used to download and write one symbol, with and without streaming.
+
+Without streaming the whole minute history is held in memory, so the peak grows with the number of sessions. With
+streaming only about one session is held at a time, so the peak should stay roughly flat.
+
+Usage:
+    $ python benchmarks/bench_streaming_download.py
+"""
+import pathlib
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from azul import BasePriceManager
+
+
+class InMemoryPriceManager(BasePriceManager):
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        session_minutes = pd.date_range(start_timestamp.replace(hour=14, minute=31), periods=390, freq='min')
+        prices = np.linspace(10.0, 11.0, len(session_minutes))
+        df = pd.DataFrame({
+            'open': prices,
+            'high': prices,
+            'low': prices,
+            'close': prices,
+            'volume': np.full(len(session_minutes), 100),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.Index(session_minutes, name='date'))
+        return df[self._cols]
+
+
+def main():
+    end_date = datetime(2018, 12, 31)
+
+    print('{:>10} {:>10} {:>10} {:>12}'.format('sessions', 'streaming', 'seconds', 'peak MB'))
+    for years in [1, 2, 4]:
+        start_date = end_date.replace(year=end_date.year - years)
+        for streaming in [False, True]:
+            pm = InMemoryPriceManager()
+            pm.streaming = streaming
+            num_sessions = len(pm._calendar.sessions_in_range(start_date, end_date))
+
+            with tempfile.TemporaryDirectory() as dir_name:
+                minute_dir_path = pathlib.Path(dir_name, 'minute')
+                daily_dir_path = pathlib.Path(dir_name, 'daily')
+
+                tracemalloc.start()
+                start = time.perf_counter()
+                pm._download_and_process_data('BENCH', start_date, end_date, minute_dir_path, daily_dir_path)
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            print('{:>10} {:>10} {:>10.3f} {:>12.1f}'.format(num_sessions, str(streaming), elapsed, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Runs the benchmark suite on the synthetic price manager and saves the results as JSON.
+
+get_price_data is timed for every combination of the numbers of symbols, sessions and workers. _fixna,
+_check_sessions, resampling to daily bars and writing the files are also timed on their own for each number of
+sessions, so a regression can be traced to a stage. Each benchmark is run several times and the fastest run is kept.
+
+The synthetic bars are seeded, so every run and every commit processes the same data. Pass the results saved at
+another commit with --compare to print the change in each benchmark. The exit status is 1 if any benchmark is slower
+than the threshold.
+
+Usage:
+    $ python benchmarks/bench_suite.py --output baseline.json
+    $ python benchmarks/bench_suite.py --output results.json --compare baseline.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import logbook
+import numpy as np
+import pandas as pd
+
+import azul
+
+# The sweeps of the full suite and of the --quick suite.
+SCENARIOS = {
+    'full': {'symbols': [10, 40], 'sessions': [20, 60], 'workers': [1, 4, 16]},
+    'quick': {'symbols': [4], 'sessions': [10], 'workers': [1, 4]}
+}
+
+# The last session of the data, so the sessions are the same whenever the suite is run.
+END_DATE = datetime(2019, 12, 31)
+
+FORMATS = ['csv', 'parquet', 'feather']
+
+
+def start_date_for(pm, num_sessions):
+    sessions = pm._calendar.sessions_in_range(datetime(2000, 1, 1), END_DATE)
+    return sessions[-num_sessions].tz_convert(None).to_pydatetime()
+
+
+def run_times(repeat, func):
+    # Returns the time of every run. func does its own setup and returns the time of the part being measured.
+    return [func() for _ in range(repeat)]
+
+
+def bench_get_price_data(num_symbols, num_sessions, workers, latency):
+    pm = azul.price_manager_registry.get('synthetic', latency=latency)
+    symbols = ['SYM{}'.format(i) for i in range(num_symbols)]
+    with tempfile.TemporaryDirectory() as dir_name:
+        start = time.perf_counter()
+        pm.get_price_data(symbols, dir_name, start_date_for(pm, num_sessions), END_DATE, workers=workers)
+        return time.perf_counter() - start
+
+
+def stage_benchmarks(num_sessions):
+    # Returns (name, rows, func) for each stage, where func times the stage on one symbol's bars.
+    pm = azul.price_manager_registry.get('synthetic', bad_tick_probability=0.01, gap_probability=0.01)
+    sessions = pm._calendar.sessions_in_range(start_date_for(pm, num_sessions), END_DATE)
+    raw_df = pd.concat([pm._session_minute_dataframe('BENCH', session) for session in sessions])
+    minute_df = pm._check_sessions(raw_df, 'BENCH', 'minute')
+    daily_df = pm._resample_minute_data_to_daily_data(minute_df)
+
+    # The bars with one in a hundred prices set to 0 again, for _fixna to repair.
+    prices = raw_df.copy()
+    rng = np.random.RandomState(0)
+    for col in ['open', 'high', 'low', 'close']:
+        prices.loc[rng.random_sample(len(prices)) < 0.01, col] = 0.0
+
+    def timed(func, *args):
+        def run():
+            copies = [arg.copy() if isinstance(arg, pd.DataFrame) else arg for arg in args]
+            start = time.perf_counter()
+            func(*copies)
+            return time.perf_counter() - start
+        return run
+
+    stages = [
+        ('fixna', len(prices), timed(pm._fixna, prices, 'BENCH')),
+        ('check_sessions_minute', len(raw_df), timed(pm._check_sessions, raw_df, 'BENCH', 'minute')),
+        ('resample_minute_to_daily', len(minute_df), timed(pm._resample_minute_data_to_daily_data, minute_df)),
+        ('check_sessions_daily', len(daily_df), timed(pm._check_sessions, daily_df, 'BENCH'))
+    ]
+
+    for file_format in FORMATS:
+        try:
+            storage = azul.storage_registry.get(file_format)
+        except ImportError:
+            continue
+
+        def write(storage=storage):
+            with tempfile.TemporaryDirectory() as dir_name:
+                path = storage.path(pathlib.Path(dir_name), 'BENCH')
+                start = time.perf_counter()
+                storage.write(minute_df, path)
+                return time.perf_counter() - start
+
+        stages.append(('write_minute_' + file_format, len(minute_df), write))
+    return stages
+
+
+def run_suite(scenario, repeat, latency):
+    results = []
+
+    def record(name, params, rows, times):
+        seconds = min(times)
+        results.append({
+            'name': name,
+            'params': params,
+            'rows': rows,
+            'seconds': seconds,
+            'runs': times,
+            'rows_per_second': rows / seconds if seconds > 0 else None
+        })
+        print('{:<26} {:<40} {:>10.4f} s'.format(name, format_params(params), seconds))
+
+    for num_sessions in scenario['sessions']:
+        for name, rows, func in stage_benchmarks(num_sessions):
+            record(name, {'sessions': num_sessions}, rows, run_times(repeat, func))
+
+    for num_symbols, num_sessions, workers in itertools.product(
+            scenario['symbols'], scenario['sessions'], scenario['workers']):
+        params = {'symbols': num_symbols, 'sessions': num_sessions, 'workers': workers}
+        times = run_times(repeat, lambda: bench_get_price_data(num_symbols, num_sessions, workers, latency))
+        record('get_price_data', params, num_symbols * num_sessions * 390, times)
+
+    return results
+
+
+def format_params(params):
+    return ' '.join('{}={}'.format(key, value) for key, value in sorted(params.items()))
+
+
+def result_key(result):
+    return result['name'], format_params(result['params'])
+
+
+def compare(results, baseline, threshold):
+    # Prints the change in each benchmark and returns the number that are slower than the threshold.
+    baseline_seconds = {result_key(result): result['seconds'] for result in baseline['results']}
+    print()
+    print('Compared with {} ({})'.format(baseline.get('commit') or 'unknown commit', baseline.get('created')))
+    print('{:<26} {:<40} {:>10} {:>10} {:>8}'.format('benchmark', 'params', 'before', 'after', 'change'))
+
+    num_regressions = 0
+    for result in results:
+        before = baseline_seconds.get(result_key(result))
+        if before is None:
+            continue
+        change = result['seconds'] / before - 1
+        flag = ''
+        if change > threshold:
+            num_regressions += 1
+            flag = ' SLOWER'
+        print('{:<26} {:<40} {:>10.4f} {:>10.4f} {:>+7.0%}{}'.format(
+            result['name'], format_params(result['params']), before, result['seconds'], change, flag))
+    return num_regressions
+
+
+def git_commit():
+    repo_dir = str(pathlib.Path(__file__).resolve().parent.parent)
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=repo_dir,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir,
+                                        stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the azul benchmark suite.')
+    parser.add_argument('--output', help='The file to save the results to as JSON.')
+    parser.add_argument('--compare', help='The results of another run to compare with.')
+    parser.add_argument('--quick', action='store_true', help='Run a smaller sweep.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of times to run each benchmark.')
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='The seconds each synthetic request takes in the get_price_data benchmarks.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='How much slower than --compare a benchmark can be before it is a regression.')
+    args = parser.parse_args()
+
+    scenario = SCENARIOS['quick' if args.quick else 'full']
+    with logbook.NullHandler().applicationbound():
+        results = run_suite(scenario, args.repeat, args.latency)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'config': {'scenario': scenario, 'repeat': args.repeat, 'latency': args.latency},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Saved the results to {}'.format(args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
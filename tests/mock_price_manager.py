@@ -1,4 +1,5 @@
-from azul import price_manager_registry, BasePriceManager
+from azul import price_manager_registry, BasePriceManager, BaseAsyncPriceManager
+import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
@@ -38,3 +39,88 @@ class MockPriceManager(BasePriceManager):
         df = df[self._cols]
 
         return df
+
+
+@price_manager_registry.register('failing_mock_price_manager')
+class FailingMockPriceManager(MockPriceManager):
+    """
+    A MockPriceManager that raises an exception whenever it is asked for data for one of its failing tickers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failing_tickers = ['AAPL']
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        if ticker in self.failing_tickers:
+            raise RuntimeError('Failed to get data for {}'.format(ticker))
+        return super()._minute_dataframe_for_date(ticker, start_timestamp)
+
+
+@price_manager_registry.register('mock_range_price_manager')
+class MockRangePriceManager(MockPriceManager):
+    """
+    A MockPriceManager that fetches several sessions at a time and counts the requests it makes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.MAX_SESSIONS_PER_REQUEST = 10
+        self.num_requests = 0
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        self.num_requests += 1
+        return super()._minute_dataframe_for_date(ticker, start_timestamp)
+
+    def _minute_dataframe_for_date_range(self, ticker, start_timestamp, end_timestamp):
+        self.num_requests += 1
+        session_dates = self._calendar.sessions_in_range(start_timestamp, end_timestamp)
+        dfs = [MockPriceManager._minute_dataframe_for_date(self, ticker, timestamp) for timestamp in session_dates]
+        dfs = [df for df in dfs if not df.empty]
+        return pd.concat(dfs) if dfs else pd.DataFrame()
+
+
+class SimulatedCrash(BaseException):
+    """
+    Stands in for the process being killed. It isn't an Exception so it isn't caught and logged like a failed symbol.
+    """
+
+
+@price_manager_registry.register('crashing_mock_range_price_manager')
+class CrashingMockRangePriceManager(MockRangePriceManager):
+    """
+    A MockRangePriceManager that crashes after a number of requests. The requests are counted across instances.
+    """
+
+    # The number of requests made and the number after which to crash. None never crashes.
+    total_requests = 0
+    crash_after = None
+
+    def _minute_dataframe_for_date(self, ticker, start_timestamp):
+        self._count_request()
+        return super()._minute_dataframe_for_date(ticker, start_timestamp)
+
+    def _minute_dataframe_for_date_range(self, ticker, start_timestamp, end_timestamp):
+        self._count_request()
+        return super()._minute_dataframe_for_date_range(ticker, start_timestamp, end_timestamp)
+
+    def _count_request(self):
+        cls = type(self)
+        if cls.crash_after is not None and cls.total_requests >= cls.crash_after:
+            raise SimulatedCrash('Crashed after {} requests'.format(cls.total_requests))
+        cls.total_requests += 1
+
+
+@price_manager_registry.register('mock_async_price_manager')
+class MockAsyncPriceManager(BaseAsyncPriceManager, MockPriceManager):
+    """
+    A MockPriceManager whose fetches are coroutines that take latency seconds.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.latency = 0.01
+
+    async def _minute_dataframe_for_date_async(self, ticker, start_timestamp):
+        await asyncio.sleep(self.latency)
+        return MockPriceManager._minute_dataframe_for_date(self, ticker, start_timestamp)
@@ -0,0 +1,263 @@
+import unittest
+import asyncio
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from azul import price_manager_registry, storage_registry, SyncPriceManagerAdapter
+from azul.async_fetch_scheduler import AsyncFetchScheduler
+from azul.async_polygon_price_manager import aiohttp
+from azul.base_async_price_manager import run_coroutine
+from azul.metrics import RunMetrics
+# Registers the mock price managers.
+from tests.mock_price_manager import MockAsyncPriceManager  # noqa: F401
+
+
+class StubPolygonServer(ThreadingMixIn, HTTPServer):
+    """
+    A local server that answers historic agg requests like polygon does, slowly, and counts them.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.05):
+        super().__init__(('127.0.0.1', 0), StubPolygonHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.num_requests = 0
+        self.num_in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class StubPolygonHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.num_requests += 1
+            server.num_in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.num_in_flight)
+        try:
+            time.sleep(server.latency)
+            url = urlparse(self.path)
+            ticker = url.path.split('/')[-1]
+            session = pd.Timestamp(parse_qs(url.query)['from'][0]).normalize()
+            minutes = pd.date_range(session.replace(hour=14, minute=31), periods=390, freq='min')
+            body = json.dumps({
+                'ticks': [{'o': 10.0, 'h': 10.5, 'l': 9.5, 'c': 10.25, 'v': 100, 't': t.value // 1000000}
+                          for t in minutes],
+                'map': {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 't': 'timestamp'},
+                'aggType': 'min',
+                'symbol': ticker
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.num_in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAsyncFetchScheduler(unittest.TestCase):
+
+    def test_limits_the_fetches_in_flight(self):
+        # Given a scheduler that allows 10 fetches at once
+        scheduler = AsyncFetchScheduler(max_concurrency=10)
+
+        async def fetch(i):
+            await asyncio.sleep(0.01)
+            return i
+
+        async def fetch_all():
+            return await asyncio.gather(*[scheduler.run(fetch, i) for i in range(500)])
+
+        # When 500 fetches are started at once
+        results = run_coroutine(fetch_all())
+
+        # Then they all finish, with no more than 10 in flight at a time.
+        self.assertEqual(list(range(500)), results)
+        self.assertEqual(500, scheduler.num_fetches)
+        self.assertEqual(10, scheduler.max_in_flight)
+        self.assertEqual(0, scheduler.num_in_flight)
+
+    def test_max_concurrency_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            AsyncFetchScheduler(max_concurrency=0)
+
+
+class TestAsyncPriceManager(unittest.TestCase):
+
+    def setUp(self):
+        self.end_date = datetime.now() - timedelta(days=1)
+        self.start_date = self.end_date - timedelta(days=14)
+        self.symbols = ['AAPL', 'AMZN', 'FB', 'GOOG', 'NFLX']
+
+    def assert_same_files(self, expected_dir_name, actual_dir_name):
+        for frequency in ['minute', 'daily']:
+            expected_paths = sorted(pathlib.Path(expected_dir_name, frequency).iterdir())
+            actual_paths = sorted(pathlib.Path(actual_dir_name, frequency).iterdir())
+            self.assertEqual([p.name for p in expected_paths], [p.name for p in actual_paths])
+            for expected_path, actual_path in zip(expected_paths, actual_paths):
+                self.assertEqual(expected_path.read_bytes(), actual_path.read_bytes())
+
+    def test_writes_the_same_files_as_the_sync_price_manager(self):
+        with tempfile.TemporaryDirectory() as sync_dir_name, tempfile.TemporaryDirectory() as async_dir_name:
+            # Given the files written by a sync price manager
+            sync_pm = price_manager_registry.get('mock_price_manager')
+            sync_pm.get_price_data(self.symbols, sync_dir_name, self.start_date, self.end_date)
+
+            # When an async price manager with the same data downloads the same symbols
+            async_pm = price_manager_registry.get('mock_async_price_manager')
+            async_pm.MAX_CONCURRENT_REQUESTS = 8
+            async_pm.SESSIONS_PER_WINDOW = 5
+            async_pm.get_price_data(self.symbols, async_dir_name, self.start_date, self.end_date)
+
+            # Then it writes the same files
+            self.assert_same_files(sync_dir_name, async_dir_name)
+
+            # And fetched the symbols concurrently, with no more fetches in flight than allowed.
+            self.assertEqual(8, async_pm.scheduler.max_in_flight)
+
+    def test_stops_fetching_a_symbol_without_data(self):
+        # Given a price manager with no data before its data start date
+        pm = price_manager_registry.get('mock_async_price_manager')
+        pm.SESSIONS_PER_WINDOW = 5
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            # When it is asked for a year of data
+            pm.get_price_data(['AAPL'], dir_name, self.end_date - timedelta(days=365), self.end_date)
+
+            # Then it stops fetching within a window of the threshold being reached
+            num_sessions_with_data = len(pm._calendar.sessions_in_range(pm.data_start_date, self.end_date))
+            self.assertLessEqual(pm.scheduler.num_fetches,
+                                 num_sessions_with_data + pm.MISSING_DATE_THRESHOLD + pm.SESSIONS_PER_WINDOW)
+
+            # And still writes the data that was available.
+            self.assertTrue(pathlib.Path(dir_name, 'daily', 'AAPL.csv').exists())
+
+    def test_adapter_runs_a_sync_price_manager(self):
+        with tempfile.TemporaryDirectory() as sync_dir_name, tempfile.TemporaryDirectory() as async_dir_name:
+            # Given the files written by a sync price manager that fails for AAPL
+            sync_pm = price_manager_registry.get('failing_mock_price_manager')
+            sync_pm.get_price_data(self.symbols, sync_dir_name, self.start_date, self.end_date)
+
+            # When the same price manager is run through the adapter
+            adapter = SyncPriceManagerAdapter(price_manager_registry.get('failing_mock_price_manager'), max_workers=4)
+            adapter.get_price_data(self.symbols, async_dir_name, self.start_date, self.end_date)
+
+            # Then the same files are written, without AAPL.
+            self.assert_same_files(sync_dir_name, async_dir_name)
+            self.assertFalse(pathlib.Path(async_dir_name, 'minute', 'AAPL.csv').exists())
+            self.assertLessEqual(adapter.scheduler.max_in_flight, 4)
+
+    def test_adapter_shares_the_settings_of_the_sync_price_manager(self):
+        # Given an adapter
+        sync_pm = price_manager_registry.get('failing_mock_price_manager')
+        adapter = SyncPriceManagerAdapter(sync_pm)
+        self.assertIs(sync_pm.storage, adapter.storage)
+
+        # When the settings are changed on either one after the adapter is created
+        sync_pm.storage = storage_registry.get('parquet')
+        adapter.streaming = True
+
+        # Then both see the change.
+        self.assertIs(sync_pm.storage, adapter.storage)
+        self.assertTrue(sync_pm.streaming)
+
+    def test_get_price_data_async_runs_on_a_running_event_loop(self):
+        pm = price_manager_registry.get('mock_async_price_manager')
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            # When get_price_data_async is awaited by the caller's own event loop
+            run_coroutine(pm.get_price_data_async(['AAPL', 'AMZN'], dir_name, self.start_date, self.end_date))
+
+            # Then the symbols are written.
+            self.assertEqual(['AAPL', 'AMZN'], pm.storage.tickers(pathlib.Path(dir_name, 'minute')))
+
+
+class TestAsyncPolygonPriceManager(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubPolygonServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetches_sessions_concurrently_from_the_server(self):
+        # Given an async polygon price manager pointed at a local stub server
+        with mock.patch.dict(os.environ, {'AZUL_POLYGON_API_KEY': 'test'}):
+            pm = price_manager_registry.get('polygon_async')
+        pm._base_url = self.server.url
+        pm.MAX_CONCURRENT_REQUESTS = 8
+
+        start_date = datetime(2019, 3, 4)
+        end_date = datetime(2019, 3, 15)
+        num_sessions = len(pm._calendar.sessions_in_range(start_date, end_date))
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            # When it downloads three symbols
+            pm.get_price_data(['AAPL', 'AMZN', 'FB'], dir_name, start_date, end_date)
+
+            # Then each session is requested once, several at a time but no more than allowed
+            self.assertEqual(3 * num_sessions, self.server.num_requests)
+            self.assertGreater(self.server.max_in_flight, 1)
+            self.assertLessEqual(self.server.max_in_flight, 8)
+
+            # And each symbol has a daily bar for every session.
+            daily_df = pm.storage.read(pm.storage.path(pathlib.Path(dir_name, 'daily'), 'FB'))
+            self.assertEqual(num_sessions, len(daily_df))
+            self.assertEqual(390 * 100, daily_df['volume'].iloc[0])
+
+    @unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+    def test_sessions_that_cant_be_fetched_fail_on_their_own(self):
+        # Given an async polygon price manager pointed at a server that is down
+        with mock.patch.dict(os.environ, {'AZUL_POLYGON_API_KEY': 'test'}):
+            pm = price_manager_registry.get('polygon_async')
+        url = self.server.url
+        self.server.shutdown()
+        self.server.server_close()
+        pm._base_url = url
+        pm.metrics = RunMetrics()
+        session = pd.Timestamp('2019-03-04', tz='UTC')
+
+        async def fetch():
+            await pm._open_async()
+            try:
+                return await pm._historic_agg_response_async('AAPL', session, session.replace(hour=23, minute=59))
+            finally:
+                await pm._close_async()
+
+        # When a session is fetched
+        with mock.patch.object(pm._http_client, 'max_retries', 1), \
+                mock.patch.object(pm._http_client, 'backoff_factor', 0.01):
+            data = run_coroutine(fetch())
+
+        # Then it has no data and counts as an http error, rather than raising.
+        self.assertIsNone(data)
+        self.assertEqual(1, pm.metrics.to_dict()['counters']['http_errors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import os
+import pathlib
+import tempfile
+from unittest import mock
+from azul.atomic_file import AtomicFile, atomic_write
+
+
+class TestAtomicFile(unittest.TestCase):
+
+    def test_replaces_the_file(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given a file
+            path = pathlib.Path(dir_name, 'sub', 'file.json')
+            path.parent.mkdir()
+            path.write_text('old')
+
+            # When it is written atomically
+            with atomic_write(path) as f:
+                f.write('new')
+
+            # Then it is replaced and no temporary file is left behind.
+            self.assertEqual('new', path.read_text())
+            self.assertEqual([path], list(path.parent.iterdir()))
+
+    def test_leaves_the_file_if_writing_fails(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given a file
+            path = pathlib.Path(dir_name, 'file.json')
+            path.write_text('old')
+
+            # When writing it raises
+            with self.assertRaises(RuntimeError):
+                with atomic_write(path) as f:
+                    f.write('new')
+                    raise RuntimeError('Failed')
+
+            # Then the file is unchanged and the temporary file is deleted.
+            self.assertEqual('old', path.read_text())
+            self.assertEqual([path], list(pathlib.Path(dir_name).iterdir()))
+
+    @unittest.skipIf(os.name == 'nt', 'Windows files only have a read only permission')
+    def test_has_the_permissions_of_a_new_file_or_the_file_it_replaces(self):
+        with tempfile.TemporaryDirectory() as dir_name, mock.patch('azul.atomic_file._UMASK', 0o022):
+            # When a new file is written
+            path = pathlib.Path(dir_name, 'metrics.prom')
+            with atomic_write(path) as f:
+                f.write('new')
+
+            # Then it can be read by everyone, like a file that is opened for writing
+            self.assertEqual(0o644, path.stat().st_mode & 0o777)
+
+            # And a file that is replaced keeps its permissions.
+            path.chmod(0o640)
+            with atomic_write(path) as f:
+                f.write('newer')
+            self.assertEqual(0o640, path.stat().st_mode & 0o777)
+
+    def test_discard(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given a file that is being written by another writer, e.g. pyarrow
+            path = pathlib.Path(dir_name, 'file.parquet')
+            atomic_file = AtomicFile(path)
+            atomic_file.temp_path.write_text('partial')
+
+            # When it is discarded
+            atomic_file.discard()
+
+            # Then neither file exists.
+            self.assertEqual([], list(pathlib.Path(dir_name).iterdir()))
+
+
+if __name__ == '__main__':
+    unittest.main()
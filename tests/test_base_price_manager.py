@@ -0,0 +1,162 @@
+import unittest
+from tests.mock_price_manager import MockPriceManager, MockRangePriceManager
+from datetime import datetime, timedelta
+import math
+import numpy as np
+import pandas as pd
+
+
+class TestBasePriceManager(unittest.TestCase):
+
+    def setUp(self):
+        self.end_date = datetime.now() - timedelta(days=1)
+
+    def test_range_requests_return_the_same_data_as_session_requests(self):
+
+        # Given price managers that fetch one session and several sessions at a time
+        session_pm = MockPriceManager()
+        range_pm = MockRangePriceManager()
+        start_date = self.end_date - timedelta(days=30)
+
+        # When the minute data is retrieved
+        expected = session_pm._minute_dataframe_for_dates('AAPL', start_date, self.end_date)
+        actual = range_pm._minute_dataframe_for_dates('AAPL', start_date, self.end_date)
+
+        # Then the data is the same but fewer requests were made.
+        pd.testing.assert_frame_equal(expected, actual)
+        num_sessions = len(range_pm._calendar.sessions_in_range(start_date, self.end_date))
+        self.assertEqual(math.ceil(num_sessions / range_pm.MAX_SESSIONS_PER_REQUEST), range_pm.num_requests)
+
+    def test_range_requests_stop_when_no_data_is_returned(self):
+
+        # Given a price manager that fetches several sessions at a time and only has data for the last 35 days
+        range_pm = MockRangePriceManager()
+        start_date = self.end_date - timedelta(days=365)
+
+        # When a year of minute data is retrieved
+        df = range_pm._minute_dataframe_for_dates('AAPL', start_date, self.end_date)
+
+        # Then there is no data from before the data start date
+        self.assertGreaterEqual(df.index[0], range_pm.data_start_date)
+
+        # And it stopped asking for data after it ran out of data.
+        num_sessions = len(range_pm._calendar.sessions_in_range(start_date, self.end_date))
+        self.assertLess(range_pm.num_requests, math.ceil(num_sessions / range_pm.MAX_SESSIONS_PER_REQUEST))
+
+    def test_reconcile_daily_sessions(self):
+
+        # Given daily data with a weekend bar and three missing sessions
+        pm = MockPriceManager()
+        dates = pd.DatetimeIndex(['2019-01-02', '2019-01-05', '2019-01-08'], name='date')
+        df = pd.DataFrame({
+            'open': [10.0, 11.0, 12.0],
+            'high': [10.5, 11.5, 12.5],
+            'low': [9.5, 10.5, 11.5],
+            'close': [10.25, 11.25, 12.25],
+            'volume': [100, 200, 300],
+            'dividend': [0.5, 0.0, 0.0],
+            'split': [1.0, 1.0, 1.0]
+        }, index=dates)
+
+        # When the sessions are reconciled
+        actual, report = pm._reconcile_sessions(df, 'AAPL', frequency='daily')
+
+        # Then the weekend bar was removed
+        self.assertEqual([pd.Timestamp('2019-01-05')], list(report.removed))
+
+        # And the missing sessions were added with the previous session's prices and no volume or dividend.
+        expected_added = pd.DatetimeIndex(['2019-01-03', '2019-01-04', '2019-01-07'])
+        self.assertEqual(list(expected_added), list(report.added))
+        self.assertEqual(list(pd.DatetimeIndex(['2019-01-02']).append(expected_added).append(dates[-1:])),
+                         list(actual.index))
+        self.assertTrue((actual.loc[expected_added, 'close'] == 10.25).all())
+        self.assertTrue((actual.loc[expected_added, 'volume'] == 0).all())
+        self.assertTrue((actual.loc[expected_added, 'dividend'] == 0.0).all())
+        self.assertEqual(df['volume'].dtype, actual['volume'].dtype)
+        self.assertEqual('date', actual.index.name)
+
+    def test_reconcile_minute_sessions(self):
+
+        # Given minute data for a whole (UTC) day
+        pm = MockPriceManager()
+        minutes = pd.date_range('2019-01-02 00:00', '2019-01-02 23:59', freq='min', name='date')
+        df = pd.DataFrame({'close': 1.0, 'volume': 100}, index=minutes)
+
+        # When the sessions are reconciled
+        actual, report = pm._reconcile_sessions(df, 'AAPL', frequency='minute')
+
+        # Then only the 390 trading minutes are left.
+        self.assertEqual(390, len(actual))
+        self.assertEqual(pd.Timestamp('2019-01-02 14:31'), actual.index[0])
+        self.assertEqual(len(minutes) - 390, len(report.removed))
+        self.assertEqual(0, len(report.added))
+        self.assertEqual(0, report.num_missing)
+
+    def test_resample_minute_data_to_daily_data_matches_pandas(self):
+
+        # Given minute data with random prices over several days, including a gap and a weekend day
+        pm = MockPriceManager()
+        rng = np.random.RandomState(0)
+        days = ['2019-01-02', '2019-01-03', '2019-01-05', '2019-01-07']
+        minutes = pd.DatetimeIndex(np.concatenate([
+            pd.date_range(day + ' 14:31', periods=rng.randint(1, 390), freq='min').values for day in days
+        ]), name='date')
+        df = pd.DataFrame({
+            'open': rng.uniform(10, 11, len(minutes)),
+            'high': rng.uniform(11, 12, len(minutes)),
+            'low': rng.uniform(9, 10, len(minutes)),
+            'close': rng.uniform(10, 11, len(minutes)),
+            'volume': rng.randint(0, 1000, len(minutes)),
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=minutes)
+        df.iloc[-1, df.columns.get_loc('dividend')] = 0.25
+
+        # When it is aggregated with NumPy and with pandas
+        actual = pm._resample_minute_data_to_daily_data(df)
+        expected = pm._resample_minute_data_to_daily_data_with_pandas(df)
+
+        # Then the daily bars are the same.
+        self.assertEqual(list(expected.index), list(actual.index))
+        pd.testing.assert_frame_equal(expected.reset_index(), actual.reset_index())
+
+        # And missing values are skipped the same way pandas skips them.
+        for col, position in [('open', 5), ('high', 7), ('open', 0), ('volume', 3)]:
+            df[col] = df[col].astype('float64')
+            df.iloc[position, df.columns.get_loc(col)] = np.nan
+            pd.testing.assert_frame_equal(
+                pm._resample_minute_data_to_daily_data_with_pandas(df).reset_index(),
+                pm._resample_minute_data_to_daily_data(df).reset_index())
+
+    def test_fixna(self):
+
+        # Given minute bars with missing prices and the 0 and -1 prices providers use for missing prices
+        pm = MockPriceManager()
+        df = pd.DataFrame({
+            'open': [0.0, 10.0, np.nan, 12.0],
+            'high': [10.5, -1.0, 11.5, 12.5],
+            'low': [9.5, 9.75, 0.0, 11.5],
+            'close': [10.25, 10.5, 11.25, -1.0],
+            'volume': [100, 200, 300, 400]
+        }, index=pd.date_range('2019-01-02 14:31', periods=4, freq='min', name='date'))
+
+        # When they are fixed
+        actual, num_repaired = pm._fixna_with_count(df.copy(), 'AAPL')
+
+        # Then opens and closes are filled from the next bar, or the previous bar at the end
+        self.assertEqual([10.0, 10.0, 12.0, 12.0], list(actual['open']))
+        self.assertEqual([10.25, 10.5, 11.25, 11.25], list(actual['close']))
+
+        # And missing highs and lows are set to the open
+        self.assertEqual([10.5, 10.0, 11.5, 12.5], list(actual['high']))
+        self.assertEqual([9.5, 9.75, 12.0, 11.5], list(actual['low']))
+
+        # And the repaired prices are counted.
+        self.assertEqual(5, num_repaired)
+        self.assertEqual([100, 200, 300, 400], list(actual['volume']))
+
+        # And clean bars are left alone.
+        clean_df = actual.copy()
+        fixed_df, num_repaired = pm._fixna_with_count(clean_df, 'AAPL')
+        self.assertEqual(0, num_repaired)
+        pd.testing.assert_frame_equal(actual, fixed_df)
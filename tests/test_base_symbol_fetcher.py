@@ -0,0 +1,103 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from azul import BaseSymbolFetcher
+
+
+class CountingSymbolFetcher(BaseSymbolFetcher):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.num_fetches = 0
+        self.fail = False
+
+    def _fetch_symbols(self):
+        self.num_fetches += 1
+        if self.fail:
+            raise RuntimeError('The source is down')
+        return ['AAPL', 'AMZN']
+
+
+class TestBaseSymbolFetcher(unittest.TestCase):
+
+    def test_reuses_the_saved_symbols(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Given symbols fetched by one run
+            CountingSymbolFetcher(cache_dir=cache_dir).symbols()
+
+            # When another run asks for them within the refresh interval
+            fetcher = CountingSymbolFetcher(cache_dir=cache_dir)
+            actual = fetcher.symbols()
+
+            # Then the saved symbols are used.
+            self.assertEqual(['AAPL', 'AMZN'], actual)
+            self.assertEqual(0, fetcher.num_fetches)
+
+    def test_fetches_again_after_the_refresh_interval(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Given symbols fetched two days ago
+            CountingSymbolFetcher(cache_dir=cache_dir).symbols()
+            fetcher = CountingSymbolFetcher(cache_dir=cache_dir, refresh_interval=timedelta(days=1))
+            path = fetcher._newest_cache_path()
+            two_days_ago = time.time() - 2 * 24 * 60 * 60
+            os.utime(str(path), (two_days_ago, two_days_ago))
+
+            # When they are asked for, they are fetched again.
+            fetcher.symbols()
+            self.assertEqual(1, fetcher.num_fetches)
+
+            # And a refresh interval of 0 always fetches them.
+            fetcher.refresh_interval = timedelta(0)
+            fetcher.symbols()
+            self.assertEqual(2, fetcher.num_fetches)
+
+    def test_uses_the_saved_symbols_when_fetching_fails(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            CountingSymbolFetcher(cache_dir=cache_dir).symbols()
+
+            # Given a source that is down
+            fetcher = CountingSymbolFetcher(cache_dir=cache_dir, refresh_interval=timedelta(0))
+            fetcher.fail = True
+
+            # Then the saved symbols are used
+            self.assertEqual(['AAPL', 'AMZN'], fetcher.symbols())
+
+            # But without saved symbols the error is raised.
+            with tempfile.TemporaryDirectory() as empty_cache_dir:
+                fetcher = CountingSymbolFetcher(cache_dir=empty_cache_dir)
+                fetcher.fail = True
+                with self.assertRaises(RuntimeError):
+                    fetcher.symbols()
+
+    def test_fetch_pages(self):
+        fetcher = CountingSymbolFetcher(cache_dir=tempfile.gettempdir())
+        lock = threading.Lock()
+        requested = []
+        in_flight = [0, 0]
+
+        def fetch_page(page):
+            with lock:
+                requested.append(page)
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return ['SYM{}-{}'.format(page, i) for i in range(3)] if page <= 10 else []
+
+        # When there are 10 pages of symbols
+        symbols = fetcher._fetch_pages(fetch_page, workers=4)
+
+        # Then the pages are fetched 4 at a time, stopping at the first empty page, with the symbols in page order.
+        self.assertEqual(30, len(symbols))
+        self.assertEqual('SYM1-0', symbols[0])
+        self.assertEqual('SYM10-2', symbols[-1])
+        self.assertEqual(list(range(1, 13)), sorted(requested))
+        self.assertEqual(4, in_flight[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
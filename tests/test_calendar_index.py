@@ -0,0 +1,70 @@
+import unittest
+from azul.calendar_index import CalendarIndex, get_calendar_index
+import zipline as zl
+import numpy as np
+import pandas as pd
+import pathlib
+import tempfile
+
+
+class TestCalendarIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.calendar = zl.get_calendar(name='NYSE')
+        self.calendar_index = get_calendar_index('NYSE')
+        self.start = pd.Timestamp('2018-11-01', tz='UTC')
+        self.end = pd.Timestamp('2019-01-10', tz='UTC')
+
+    def test_is_shared(self):
+        self.assertIs(self.calendar_index, get_calendar_index('NYSE'))
+
+    def test_sessions_match_the_calendar(self):
+        expected = self.calendar.sessions_in_range(self.start, self.end)
+        actual = self.calendar_index.sessions_in_range(self.start, self.end)
+        self.assertEqual(list(expected), list(actual))
+
+    def test_minutes_match_the_calendar(self):
+        # The range includes early closes for Thanksgiving and Christmas Eve.
+        expected = self.calendar.minutes_for_sessions_in_range(self.start, self.end)
+        actual = self.calendar_index.minutes_for_sessions_in_range(self.start, self.end)
+        self.assertEqual(len(expected), len(actual))
+        self.assertTrue((expected == actual).all())
+
+    def test_minutes_are_slices_of_one_index(self):
+        # When the minutes of different ranges are asked for
+        thanksgiving = pd.Timestamp('2018-11-23', tz='UTC')
+        minutes = self.calendar_index.minutes_for_sessions_in_range(self.start, self.end)
+        session_minutes = self.calendar_index.minutes_for_session(thanksgiving)
+
+        # Then they share the memory of the index rather than each having a copy
+        self.assertTrue(np.shares_memory(minutes.asi8, session_minutes.asi8))
+
+        # And they are the minutes of those sessions.
+        self.assertEqual(list(self.calendar.minutes_for_sessions_in_range(thanksgiving, thanksgiving)),
+                         list(session_minutes))
+        self.assertEqual(0, len(self.calendar_index.minutes_for_sessions_in_range(self.end, self.start)))
+
+    def test_minute_to_session_label_matches_the_calendar(self):
+        minutes = ['2018-11-02 03:00', '2018-11-02 13:31', '2018-11-02 20:00', '2018-11-02 20:01',
+                   '2018-11-03 12:00', '2018-11-23 18:00', '2018-11-23 18:01']
+        for minute in minutes:
+            minute = pd.Timestamp(minute, tz='UTC')
+            for direction in ['next', 'previous']:
+                expected = self.calendar.minute_to_session_label(minute, direction=direction)
+                actual = self.calendar_index.minute_to_session_label(minute, direction=direction)
+                self.assertEqual(expected, actual, '{} {}'.format(minute, direction))
+
+    def test_persists_to_disk(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Given a calendar index that was persisted
+            expected = CalendarIndex('NYSE', cache_dir=cache_dir)
+            self.assertTrue(pathlib.Path(cache_dir, 'NYSE.npz').exists())
+
+            # When it is loaded again
+            actual = CalendarIndex('NYSE', cache_dir=cache_dir)
+
+            # Then it has the same sessions and minutes.
+            self.assertEqual(list(expected.sessions_in_range(self.start, self.end)),
+                             list(actual.sessions_in_range(self.start, self.end)))
+            self.assertTrue((expected.minutes_for_sessions_in_range(self.start, self.end) ==
+                             actual.minutes_for_sessions_in_range(self.start, self.end)).all())
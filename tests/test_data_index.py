@@ -0,0 +1,198 @@
+import hashlib
+import json
+import pathlib
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import pandas as pd
+from click.testing import CliRunner
+
+import azul
+from azul.data_index import DataIndex, INDEX_FILE_NAME, CHANGED, MISSING, OK, UNINDEXED
+
+
+class TestDataIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.start_date = datetime(2019, 12, 2)
+        self.end_date = datetime(2019, 12, 20)
+
+    def download(self, dir_name, end_date=None, **kwargs):
+        azul.get_price_data('faang', 'synthetic', dir_name, self.start_date, end_date or self.end_date, cache=False,
+                            **kwargs)
+
+    def test_records_every_file_written(self):
+        for streaming in [False, True]:
+            with self.subTest(streaming=streaming), tempfile.TemporaryDirectory() as dir_name:
+                # When data is downloaded
+                self.download(dir_name, streaming=streaming)
+
+                # Then the index describes each file
+                index = DataIndex(dir_name)
+                self.assertEqual(['AAPL', 'AMZN', 'FB', 'GOOG', 'NFLX'], index.tickers())
+                for frequency in ['minute', 'daily']:
+                    path = pathlib.Path(dir_name, frequency, 'AAPL.csv')
+                    df = pd.read_csv(path, index_col=0, parse_dates=True)
+                    entry = index.entry('AAPL', frequency)
+                    self.assertEqual(len(df), entry['rows'])
+                    self.assertEqual(df.index[0], pd.Timestamp(entry['first']))
+                    self.assertEqual(df.index[-1], pd.Timestamp(entry['last']))
+                    self.assertEqual('sha256:' + hashlib.sha256(path.read_bytes()).hexdigest(), entry['checksum'])
+                    self.assertTrue(index.is_current('AAPL', frequency, path))
+
+                # And no temporary files are left behind.
+                self.assertEqual([INDEX_FILE_NAME], [path.name for path in pathlib.Path(dir_name).glob('.*index*')])
+
+    def test_counts_missing_sessions(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given a provider that has no bars for some sessions
+            pm = azul.price_manager_registry.get('synthetic', missing_session_probability=0.3)
+            pm.data_index = DataIndex(dir_name)
+
+            # When the data is downloaded
+            pm.get_price_data(['AAPL'], dir_name, self.start_date, self.end_date)
+
+            # Then the sessions that were filled in are counted.
+            minute_df = pd.read_csv(pathlib.Path(dir_name, 'minute', 'AAPL.csv'), index_col=0, parse_dates=True)
+            daily_df = pd.read_csv(pathlib.Path(dir_name, 'daily', 'AAPL.csv'), index_col=0, parse_dates=True)
+            num_sessions_with_bars = len(minute_df.index.normalize().unique())
+            missing_sessions = DataIndex(dir_name).entry('AAPL', 'daily')['missing_sessions']
+            self.assertGreater(missing_sessions, 0)
+            self.assertEqual(len(daily_df) - num_sessions_with_bars, missing_sessions)
+
+    def test_changed_files_are_not_current(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given an indexed file that was changed afterwards
+            self.download(dir_name)
+            path = pathlib.Path(dir_name, 'minute', 'AAPL.csv')
+            with path.open('a') as f:
+                f.write('2019-12-23 14:31:00,1,1,1,1,1,0.0,1.0\n')
+
+            # Then the index doesn't use it
+            index = DataIndex(dir_name)
+            self.assertFalse(index.is_current('AAPL', 'minute', path))
+            self.assertIsNone(index.last_timestamp('AAPL', 'minute', path))
+            self.assertEqual(CHANGED, index.state('AAPL', 'minute', path))
+            self.assertEqual(CHANGED, index.verify('AAPL', 'minute', path))
+
+    def test_update_uses_and_maintains_the_index(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given data downloaded up to December 20th
+            self.download(dir_name)
+
+            # When it is updated to the end of the year
+            with mock.patch('azul.csv_storage.CSVStorage.last_timestamp') as last_timestamp:
+                azul.update_price_data('synthetic', pathlib.Path(dir_name), end=datetime(2019, 12, 31), cache=False)
+
+            # Then the last bars come from the index instead of the files
+            last_timestamp.assert_not_called()
+
+            # And the index describes the appended files
+            index = DataIndex(dir_name)
+            for frequency in ['minute', 'daily']:
+                path = pathlib.Path(dir_name, frequency, 'AAPL.csv')
+                df = pd.read_csv(path, index_col=0, parse_dates=True)
+                entry = index.entry('AAPL', frequency)
+                self.assertEqual(len(df), entry['rows'])
+                self.assertEqual(df.index[-1], pd.Timestamp(entry['last']))
+
+                # Without reading them for a checksum, which is computed when they are verified.
+                self.assertIsNone(entry['checksum'])
+                self.assertEqual(OK, index.verify('AAPL', frequency, path))
+                self.assertEqual('sha256:' + hashlib.sha256(path.read_bytes()).hexdigest(),
+                                 index.entry('AAPL', frequency)['checksum'])
+
+    def test_appended_files_that_changed_fail_verification(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given a file that was changed after bars were appended to it
+            self.download(dir_name, end_date=datetime(2019, 12, 13))
+            azul.update_price_data('synthetic', pathlib.Path(dir_name), end=self.end_date, cache=False)
+            path = pathlib.Path(dir_name, 'minute', 'AAPL.csv')
+            with path.open('a') as f:
+                f.write('2019-12-23 14:31:00,1,1,1,1,1,0.0,1.0\n')
+
+            # Then it isn't verified.
+            self.assertEqual(CHANGED, DataIndex(dir_name).verify('AAPL', 'minute', path))
+
+    def test_update_replaces_a_partial_last_session(self):
+        with tempfile.TemporaryDirectory() as expected_dir_name, tempfile.TemporaryDirectory() as dir_name:
+            # Given data that was downloaded up to December 20th
+            self.download(expected_dir_name)
+
+            # And the same data as if it had been downloaded during December 20th
+            self.download(dir_name)
+            cutoff = pd.Timestamp('2019-12-20 18:00')
+            pm = azul.price_manager_registry.get('synthetic')
+            for ticker in DataIndex(dir_name).tickers():
+                minute_path = pathlib.Path(dir_name, 'minute', ticker + '.csv')
+                minute_df = pd.read_csv(minute_path, index_col=0, parse_dates=True)
+                minute_df = minute_df[minute_df.index < cutoff]
+                minute_df.to_csv(minute_path)
+                pm._resample_minute_data_to_daily_data(minute_df).to_csv(
+                    pathlib.Path(dir_name, 'daily', ticker + '.csv'))
+            DataIndex(dir_name).rebuild(pm.storage)
+
+            # When both are updated
+            for name in [expected_dir_name, dir_name]:
+                azul.update_price_data('synthetic', pathlib.Path(name), end=datetime(2019, 12, 31), cache=False)
+
+            # Then the partial session's minute bars and daily bar were replaced
+            for frequency in ['minute', 'daily']:
+                expected_path = pathlib.Path(expected_dir_name, frequency, 'AAPL.csv')
+                path = pathlib.Path(dir_name, frequency, 'AAPL.csv')
+                self.assertEqual(expected_path.read_bytes(), path.read_bytes())
+
+                # And the index still describes the files.
+                entry = DataIndex(dir_name).entry('AAPL', frequency)
+                self.assertEqual(DataIndex(expected_dir_name).entry('AAPL', frequency)['rows'], entry['rows'])
+                self.assertEqual(OK, DataIndex(dir_name).verify('AAPL', frequency, path))
+
+    def test_status(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given downloaded data, one file of which was removed and one of which was never indexed
+            self.download(dir_name)
+            pathlib.Path(dir_name, 'daily', 'FB.csv').unlink()
+            index = DataIndex(dir_name)
+            index.remove('GOOG')
+            index.save()
+
+            # When the status is asked for
+            status = {row['symbol']: row for row in azul.get_price_data_status(dir_name)}
+
+            # Then each symbol's coverage comes from the index
+            self.assertEqual(OK, status['AAPL']['state'])
+            self.assertEqual('2019-12-02T14:31:00', status['AAPL']['first'])
+            self.assertEqual('2019-12-20T21:00:00', status['AAPL']['last'])
+            self.assertEqual(15, status['AAPL']['daily_rows'])
+            self.assertEqual(0, status['AAPL']['missing_sessions'])
+            self.assertEqual(MISSING, status['FB']['state'])
+            self.assertEqual(UNINDEXED, status['GOOG']['state'])
+            self.assertIsNone(status['GOOG']['minute_rows'])
+
+            # And rebuilding the index indexes every file again.
+            status = {row['symbol']: row for row in azul.get_price_data_status(dir_name, rebuild=True)}
+            self.assertEqual(OK, status['GOOG']['state'])
+            self.assertEqual(status['AAPL']['minute_rows'], status['GOOG']['minute_rows'])
+            self.assertEqual(OK, status['FB']['state'])
+            self.assertIsNone(status['FB']['daily_rows'])
+
+    def test_status_command(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            # Given downloaded data
+            self.download(dir_name)
+
+            # When the status command is run
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, ['status', '-o', dir_name, '--json', 'AAPL', 'TSLA'])
+
+            # Then it prints the status of the symbols.
+            self.assertEqual(0, result.exit_code, result.output)
+            rows = json.loads(result.output[result.output.index('['):])
+            self.assertEqual(['AAPL', 'TSLA'], [row['symbol'] for row in rows])
+            self.assertEqual([OK, MISSING], [row['state'] for row in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,10 @@
 import unittest
+import json
 from click.testing import CliRunner
 import azul
-import os
 import pathlib
 import pandas as pd
 import shutil
-import datetime
 from tests.mock_price_manager import MockPriceManager
 import tempfile
 from datetime import datetime, timedelta
@@ -151,6 +150,103 @@ class TestDownloadCommand(unittest.TestCase):
             expected_dates = pd.date_range(start=start_date, end=data_start_date).normalize()
             self.assertTrue(set(expected_dates).isdisjoint(actual_dates))
 
+    def test_download_with_workers_matches_serial_download(self):
 
+        # Given two directories for the data to be downloaded.
+        with tempfile.TemporaryDirectory() as serial_dir_name, tempfile.TemporaryDirectory() as parallel_dir_name:
 
+            # When the azul download command is run serially and with several workers
+            runner = CliRunner()
+            for output_dir_name, workers in [(serial_dir_name, '1'), (parallel_dir_name, '4')]:
+                result = runner.invoke(azul.cli, [
+                    'download',
+                    '--symbol-source', 'faang',
+                    '--data-source', 'mock_price_manager',
+                    '--start', self.start_date_str,
+                    '--output-dir', output_dir_name,
+                    '--workers', workers
+                ])
+                self.assertEqual(0, result.exit_code)
+
+            # Then both runs wrote exactly the same files.
+            for frequency in ['minute', 'daily']:
+                serial_files = sorted(pathlib.Path(serial_dir_name, frequency).iterdir())
+                parallel_files = sorted(pathlib.Path(parallel_dir_name, frequency).iterdir())
+                self.assertEqual([p.name for p in serial_files], [p.name for p in parallel_files])
+                for serial_file, parallel_file in zip(serial_files, parallel_files):
+                    self.assertEqual(serial_file.read_bytes(), parallel_file.read_bytes())
+
+    def test_failing_symbol_does_not_stop_the_other_symbols(self):
+
+        # Given a place to put data
+        with tempfile.TemporaryDirectory() as output_dir_name:
+
+            # When price data is retrieved from a source that fails for AAPL
+            start_date = datetime.now() - timedelta(days=4)
+            failed = azul.get_price_data('faang', 'failing_mock_price_manager', output_dir_name, start_date, None,
+                                         workers=3)
+
+            # Then AAPL is returned as failed
+            self.assertEqual(['AAPL'], failed)
+
+            # And the other symbols were still written.
+            minute_path = pathlib.Path(output_dir_name, 'minute')
+            self.assertFalse(pathlib.Path(minute_path, 'AAPL.csv').exists())
+            for ticker in ['FB', 'AMZN', 'NFLX', 'GOOG']:
+                self.assertTrue(pathlib.Path(minute_path, ticker + '.csv').exists())
+
+    def test_download_exits_with_an_error_when_a_symbol_fails(self):
+
+        # Given a place to put data
+        with tempfile.TemporaryDirectory() as output_dir_name:
+
+            # When the azul download command is run with a source that fails for AAPL
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, [
+                'download',
+                '--symbol-source', 'faang',
+                '--data-source', 'failing_mock_price_manager',
+                '--start', self.start_date_str,
+                '--output-dir', output_dir_name
+            ])
+
+            # Then the command fails, after writing the other symbols.
+            self.assertEqual(1, result.exit_code)
+            self.assertTrue(pathlib.Path(output_dir_name, 'minute', 'FB.csv').exists())
+
+    def test_download_writes_metrics(self):
+
+        # Given a place to put data and metrics
+        with tempfile.TemporaryDirectory() as output_dir_name:
+            json_path = pathlib.Path(output_dir_name, 'metrics.json')
+            prom_path = pathlib.Path(output_dir_name, 'azul.prom')
+
+            # When the azul download command is run with the metrics options
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, [
+                'download',
+                '--symbol-source', 'faang',
+                '--data-source', 'synthetic',
+                '--start', '2019-03-04',
+                '--end', '2019-03-08',
+                '--output-dir', output_dir_name,
+                '--metrics-json', str(json_path),
+                '--metrics-prom', str(prom_path)
+            ])
+            self.assertEqual(0, result.exit_code)
+
+            # Then the rows written and the time spent writing them were recorded for each symbol
+            metrics = json.loads(json_path.read_text())
+            self.assertEqual(['AAPL', 'AMZN', 'FB', 'GOOG', 'NFLX'], sorted(metrics['symbols']))
+            aapl = metrics['symbols']['AAPL']
+            self.assertEqual(5 * 390 + 5, aapl['counters']['rows_written'])
+            self.assertEqual(2, aapl['stages']['write']['count'])
+            for stage in ['fixna', 'check_sessions', 'resample', 'write']:
+                self.assertIn(stage, metrics['stages'])
+            self.assertEqual(5 * (5 * 390 + 5), metrics['counters']['rows_written'])
+
+            # And the run totals were written for prometheus.
+            prom = prom_path.read_text()
+            self.assertIn('azul_rows_written_total{{data_source="synthetic"}} {}'.format(5 * (5 * 390 + 5)), prom)
+            self.assertIn('azul_stage_seconds_total{data_source="synthetic",stage="write"}', prom)
 
@@ -0,0 +1,145 @@
+import unittest
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+from azul.http_client import HttpClient
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.num_connections = 0
+        self.num_requests = 0
+        # The status codes to respond with before responding with 200.
+        self.failures = []
+        self.retry_after = None
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/v1/historic/agg/minute/AAPL'.format(self.server_port)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the connection is kept alive between requests.
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # A handler is created for each connection.
+        with self.server.lock:
+            self.server.num_connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.num_requests += 1
+            status = self.server.failures.pop(0) if self.server.failures else 200
+
+        body = json.dumps({'ticks': [{'o': 1.0, 'h': 1.0, 'l': 1.0, 'c': 1.0, 'v': 100, 't': 1546439400000}]})
+        body = body.encode('utf-8') if status == 200 else b'error'
+        self.send_response(status)
+        if status == 429 and self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.client = HttpClient(backoff_factor=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connections(self):
+        # When several requests are made
+        for _ in range(10):
+            response = self.client.get(self.server.url, params={'apikey': 'test'})
+            self.assertEqual(200, response.status_code)
+
+        # Then they were all made over the same connection.
+        self.assertEqual(10, self.server.num_requests)
+        self.assertEqual(1, self.server.num_connections)
+
+    def test_retries_server_errors(self):
+        # Given a server that fails a few times
+        self.server.failures = [503, 502, 500]
+
+        # When a request is made
+        response = self.client.get(self.server.url)
+
+        # Then it is retried until the data is retrieved.
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()['ticks']))
+        self.assertEqual(4, self.server.num_requests)
+
+        # And the failed responses didn't cost a new connection.
+        self.assertEqual(1, self.server.num_connections)
+
+    def test_retries_throttled_requests(self):
+        # Given a server that is throttling requests
+        self.server.failures = [429, 429]
+        self.server.retry_after = 0
+
+        # When a request is made
+        response = self.client.get(self.server.url)
+
+        # Then it is retried until the data is retrieved.
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, self.server.num_requests)
+
+        # And the response counts the retries and the 429s.
+        self.assertEqual(2, response.num_retries)
+        self.assertEqual(2, response.num_throttled)
+
+    def test_retries_take_a_token_from_the_rate_limiter(self):
+        # Given a server that is throttling requests
+        self.server.failures = [429, 503]
+        self.server.retry_after = 0
+        rate_limiter = mock.Mock()
+
+        # When a request is made with a rate limiter
+        response = self.client.get(self.server.url, rate_limiter=rate_limiter)
+
+        # Then each retry waited for the rate limiter. The caller waits for the first attempt.
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, rate_limiter.acquire.call_count)
+
+    def test_returns_last_response_when_retries_are_exhausted(self):
+        # Given a server that keeps failing
+        self.client.max_retries = 2
+        self.server.failures = [503] * 5
+
+        # When a request is made
+        response = self.client.get(self.server.url)
+
+        # Then the last failed response is returned.
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(3, self.server.num_requests)
+
+    def test_does_not_retry_client_errors(self):
+        # Given a server that rejects the request
+        self.server.failures = [404]
+
+        # When a request is made
+        response = self.client.get(self.server.url)
+
+        # Then it isn't retried.
+        self.assertEqual(404, response.status_code)
+        self.assertEqual(1, self.server.num_requests)
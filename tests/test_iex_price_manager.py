@@ -4,7 +4,12 @@ import azul
 import os
 import pathlib
 import shutil
+import json
+import tempfile
+import pandas as pd
 from datetime import datetime, timedelta
+from unittest import mock
+from azul.response_cache import ResponseCache
 
 
 class TestIEPriceManager(unittest.TestCase):
@@ -90,3 +95,122 @@ class TestIEPriceManager(unittest.TestCase):
         # Then the start date is actually 30 days ago
         self.assertEqual(thirty_days_ago.date(), actual_start_date.date())
         self.assertEqual(today.date(), actual_end_date.date())
+
+
+def fake_chart(session):
+    # A chart like the ones IEX returns, with a bar for every regular trading minute of the session.
+    minutes = pd.date_range(session.strftime('%Y-%m-%d') + ' 09:30', periods=390, freq='min')
+    return [{
+        'date': minute.strftime('%Y%m%d'),
+        'minute': minute.strftime('%H:%M'),
+        'label': minute.strftime('%I:%M %p'),
+        'high': 10.5, 'low': 9.5, 'open': 10.0, 'close': 10.25, 'volume': 100,
+        'marketHigh': 10.5, 'marketLow': 9.5, 'marketOpen': 10.0, 'marketClose': 10.25, 'marketVolume': 1000,
+        'marketAverage': 10.1, 'marketNotional': 10100.0, 'marketNumberOfTrades': 10
+    } for minute in minutes]
+
+
+class FakeResponse(object):
+
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+
+
+class TestIEXBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.pm = azul.price_manager_registry.get('iex')
+        self.requests = []
+
+        def get(url, params=None, **kwargs):
+            self.requests.append((url, params))
+            session = pd.Timestamp(params['exactDate'])
+            charts = {ticker: {'chart': fake_chart(session)} for ticker in params['symbols'].split(',')}
+            return FakeResponse(json.dumps(charts).encode('utf-8'))
+
+        self.pm._http_client = mock.Mock(get=get)
+
+    def test_batches_symbols_per_request(self):
+        # Given 10 symbols and a batch size of 4
+        symbols = ['SYM{}'.format(i) for i in range(10)]
+        self.pm.MAX_SYMBOLS_PER_REQUEST = 4
+        end_date = datetime.today() - timedelta(days=1)
+        start_date = end_date - timedelta(days=6)
+        num_sessions = len(self.pm._calendar.sessions_in_range(start_date, end_date))
+
+        with tempfile.TemporaryDirectory() as dir_name, mock.patch('pyEX.chart') as chart:
+            # When the symbols are downloaded
+            self.pm.get_price_data(symbols, dir_name, start_date, end_date)
+
+            # Then each group of symbols takes one request per session, and no symbol is fetched on its own
+            self.assertEqual(3 * num_sessions, len(self.requests))
+            self.assertEqual('SYM0,SYM1,SYM2,SYM3', self.requests[0][1]['symbols'])
+            self.assertTrue(self.requests[0][0].endswith('/stock/market/batch'))
+            chart.assert_not_called()
+
+            # And every symbol has a daily bar for every session.
+            daily_dir_path = pathlib.Path(dir_name, 'daily')
+            self.assertEqual(symbols, self.pm.storage.tickers(daily_dir_path))
+            daily_df = self.pm.storage.read(self.pm.storage.path(daily_dir_path, 'SYM9'))
+            self.assertEqual(num_sessions, len(daily_df))
+            # The 09:30 bar is outside the calendar's minutes, which start at 09:31.
+            self.assertEqual(389 * 1000, daily_df['volume'].iloc[0])
+
+    def test_symbols_missing_from_a_batch_are_fetched_on_their_own(self):
+        # Given a batch response that leaves out one of the symbols
+        symbols = ['SYM0', 'SYM1', 'SYM2']
+        get = self.pm._http_client.get
+
+        def get_without_sym1(url, params=None, **kwargs):
+            response = get(url, params=params, **kwargs)
+            charts = json.loads(response.content.decode('utf-8'))
+            del charts['SYM1']
+            return FakeResponse(json.dumps(charts).encode('utf-8'))
+
+        self.pm._http_client = mock.Mock(get=get_without_sym1)
+        end_date = datetime.today() - timedelta(days=1)
+        start_date = end_date - timedelta(days=6)
+        sessions = self.pm._calendar.sessions_in_range(start_date, end_date)
+
+        with tempfile.TemporaryDirectory() as dir_name, mock.patch('pyEX.chart') as chart:
+            chart.side_effect = lambda ticker, timeframe, date: fake_chart(date)
+            self.pm.response_cache = ResponseCache(pathlib.Path(dir_name, 'cache'))
+
+            # When the symbols are downloaded
+            self.pm.get_price_data(symbols, pathlib.Path(dir_name, 'data'), start_date, end_date)
+
+            # Then the missing symbol's sessions are fetched on their own, not cached as empty
+            self.assertEqual(len(sessions), chart.call_count)
+            self.assertEqual({'SYM1'}, {call[0][0] for call in chart.call_args_list})
+
+            # And it has a daily bar for every session.
+            daily_df = self.pm.storage.read(self.pm.storage.path(pathlib.Path(dir_name, 'data', 'daily'), 'SYM1'))
+            self.assertEqual(len(sessions), len(daily_df))
+            self.assertTrue((daily_df['volume'] > 0).all())
+
+    def test_minute_dataframe_from_chart(self):
+        # Given a chart with a bad tick
+        chart = fake_chart(pd.Timestamp('2019-03-01'))
+        chart[1]['marketClose'] = 0
+
+        # When the minute bars are created from it
+        df = self.pm._minute_dataframe_from_chart(chart, 'AAPL', pd.Timestamp('2019-03-01'))
+
+        # Then they are in UTC, with the market prices and the bad tick repaired.
+        self.assertEqual(['open', 'high', 'low', 'close', 'volume', 'dividend', 'split'], list(df.columns))
+        self.assertEqual(pd.Timestamp('2019-03-01 14:30'), df.index[0])
+        self.assertEqual(pd.Timestamp('2019-03-01 20:59'), df.index[-1])
+        self.assertEqual('date', df.index.name)
+        self.assertEqual(10.25, df['close'].iloc[1])
+        self.assertEqual(1000, df['volume'].iloc[0])
+
+    def test_minute_index(self):
+        # Dates can be YYYYMMDD or YYYY-MM-DD, and the minutes are in New York time, which observes DST.
+        for dates in [['20190301', '20190701'], ['2019-03-01', '2019-07-01']]:
+            index = self.pm._minute_index(dates, ['09:30', '15:59'])
+            self.assertEqual([pd.Timestamp('2019-03-01 14:30'), pd.Timestamp('2019-07-01 19:59')], list(index))
+
+        # Minutes that can't be parsed become NaT.
+        index = self.pm._minute_index(['20190301'], ['bad'])
+        self.assertTrue(index.isnull().all())
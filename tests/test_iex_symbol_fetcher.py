@@ -0,0 +1,33 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from azul import symbol_fetcher_registry
+
+
+class FakeResponse(object):
+
+    def __init__(self, json_list):
+        self.status_code = 200
+        self._json_list = json_list
+
+    def json(self):
+        return self._json_list
+
+
+class TestIEXSymbolFetcher(unittest.TestCase):
+
+    def test_returns_the_enabled_symbols(self):
+        with mock.patch.dict(os.environ, {'AZUL_SYMBOL_CACHE_DIR': tempfile.mkdtemp()}):
+            fetcher = symbol_fetcher_registry.get('iex')
+        fetcher._http_client = mock.Mock(get=lambda url: FakeResponse([
+            {'symbol': 'AAPL', 'isEnabled': True, 'type': 'cs'},
+            {'symbol': 'OLD', 'isEnabled': False, 'type': 'cs'},
+            {'symbol': 'SPY', 'isEnabled': True, 'type': 'et'}
+        ]))
+
+        self.assertEqual(['AAPL', 'SPY'], fetcher.symbols())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import unittest
+import filecmp
+import json
+import pathlib
+import tempfile
+import pandas as pd
+import azul
+from click.testing import CliRunner
+from datetime import datetime, timedelta
+from unittest import mock
+from azul.atomic_file import TEMP_SUFFIX
+from azul.job_manifest import JobManifest, MANIFEST_FILE_NAME, SPOOL_DIR_NAME
+from tests.mock_price_manager import CrashingMockRangePriceManager, SimulatedCrash
+
+
+class TestJobManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self.temp_dir.name
+        self.sessions = pd.DatetimeIndex(['2019-01-02', '2019-01-03'], tz='UTC')
+        self.df = pd.DataFrame(
+            {'open': [1.0], 'high': [2.0], 'low': [0.5], 'close': [1.5], 'volume': [100], 'dividend': [0.0],
+             'split': [1.0]},
+            index=pd.DatetimeIndex([datetime(2019, 1, 2, 14, 31)], name='date')
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_records_sessions_and_symbols(self):
+        # Given a manifest with sessions recorded for a symbol
+        manifest = JobManifest(self.output_dir, params={'start': '2019-01-01'})
+        self.assertIsNone(manifest.sessions('AAPL', self.sessions))
+        manifest.record_sessions('AAPL', self.sessions, [self.df, pd.DataFrame()])
+
+        # When the job is resumed
+        resumed = JobManifest(self.output_dir, params={'start': '2019-01-01'}, resume=True)
+
+        # Then the sessions are read back from the spool.
+        dfs = resumed.sessions('AAPL', self.sessions)
+        pd.testing.assert_frame_equal(self.df, dfs[0])
+        self.assertTrue(dfs[1].empty)
+        self.assertFalse(resumed.is_symbol_complete('AAPL'))
+
+        # And completing the symbol removes its spooled sessions.
+        resumed.mark_symbol_complete('AAPL')
+        self.assertTrue(JobManifest(self.output_dir, params={'start': '2019-01-01'}, resume=True)
+                        .is_symbol_complete('AAPL'))
+        self.assertFalse(pathlib.Path(self.output_dir, SPOOL_DIR_NAME, 'AAPL').exists())
+
+    def test_different_params_start_a_new_job(self):
+        # Given a job with a complete symbol
+        manifest = JobManifest(self.output_dir, params={'start': '2019-01-01'})
+        manifest.mark_symbol_complete('AAPL')
+
+        # When a job with different parameters is resumed, or a job isn't resumed
+        different = JobManifest(self.output_dir, params={'start': '2018-01-01'}, resume=True)
+        not_resumed = JobManifest(self.output_dir, params={'start': '2019-01-01'})
+
+        # Then nothing is complete.
+        self.assertFalse(different.is_symbol_complete('AAPL'))
+        self.assertFalse(not_resumed.is_symbol_complete('AAPL'))
+
+    def test_manifest_is_valid_json_after_every_write(self):
+        manifest = JobManifest(self.output_dir, params={})
+        manifest.record_sessions('AAPL', self.sessions, [self.df, pd.DataFrame()])
+        with pathlib.Path(self.output_dir, MANIFEST_FILE_NAME).open() as f:
+            recorded = json.load(f)
+        self.assertEqual({'2019-01-02': 'data', '2019-01-03': 'empty'}, recorded['symbols']['AAPL']['sessions'])
+
+        # No temporary files are left behind.
+        self.assertEqual([], list(pathlib.Path(self.output_dir).glob('*' + TEMP_SUFFIX)))
+
+
+class TestResumeDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.end_date = datetime.now() - timedelta(days=2)
+        self.start_date = self.end_date - timedelta(days=60)
+        CrashingMockRangePriceManager.total_requests = 0
+        CrashingMockRangePriceManager.crash_after = None
+
+    def tearDown(self):
+        CrashingMockRangePriceManager.total_requests = 0
+        CrashingMockRangePriceManager.crash_after = None
+
+    def download(self, output_dir, resume=False, **kwargs):
+        azul.get_price_data('faang', 'crashing_mock_range_price_manager', output_dir, self.start_date,
+                            self.end_date, cache=False, resume=resume, **kwargs)
+
+    def test_resumed_download_matches_uninterrupted_download(self):
+        with tempfile.TemporaryDirectory() as expected_dir, tempfile.TemporaryDirectory() as output_dir:
+            # Given an uninterrupted download
+            self.download(expected_dir)
+            num_requests = CrashingMockRangePriceManager.total_requests
+
+            # When a download that records its progress crashes part way through
+            crash_after = num_requests // 2 + 1
+            CrashingMockRangePriceManager.total_requests = 0
+            CrashingMockRangePriceManager.crash_after = crash_after
+            with self.assertRaises(SimulatedCrash):
+                self.download(output_dir, resume=True)
+
+            # And is resumed
+            CrashingMockRangePriceManager.total_requests = 0
+            CrashingMockRangePriceManager.crash_after = None
+            self.download(output_dir, resume=True)
+
+            # Then only the missing requests are made
+            self.assertEqual(num_requests - crash_after, CrashingMockRangePriceManager.total_requests)
+
+            # And the files are the same as the uninterrupted download's.
+            for dir_name in ['minute', 'daily']:
+                expected_files = sorted(p.name for p in pathlib.Path(expected_dir, dir_name).iterdir())
+                output_files = sorted(p.name for p in pathlib.Path(output_dir, dir_name).iterdir())
+                self.assertEqual(expected_files, output_files)
+                match, mismatch, errors = filecmp.cmpfiles(
+                    str(pathlib.Path(expected_dir, dir_name)), str(pathlib.Path(output_dir, dir_name)),
+                    expected_files, shallow=False)
+                self.assertEqual(expected_files, match)
+
+            # And the spooled sessions are removed.
+            self.assertFalse(pathlib.Path(output_dir, SPOOL_DIR_NAME).exists())
+
+            # And resuming the finished download does nothing.
+            CrashingMockRangePriceManager.total_requests = 0
+            self.download(output_dir, resume=True)
+            self.assertEqual(0, CrashingMockRangePriceManager.total_requests)
+
+    def test_downloads_that_arent_resumed_record_nothing(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # Given a recorded job that was interrupted
+            CrashingMockRangePriceManager.crash_after = 5
+            with self.assertRaises(SimulatedCrash):
+                self.download(output_dir, resume=True)
+            self.assertTrue(pathlib.Path(output_dir, SPOOL_DIR_NAME).exists())
+
+            # When the data is downloaded without resume
+            CrashingMockRangePriceManager.crash_after = None
+            self.download(output_dir)
+
+            # Then there is no manifest or spool, and no job left to resume.
+            self.assertFalse(pathlib.Path(output_dir, MANIFEST_FILE_NAME).exists())
+            self.assertFalse(pathlib.Path(output_dir, SPOOL_DIR_NAME).exists())
+
+    def test_streaming_reuses_the_spooled_sessions(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # When a download that records its progress streams the symbols
+            to_pickle = pd.DataFrame.to_pickle
+            with mock.patch.object(pd.DataFrame, 'to_pickle', autospec=True, side_effect=to_pickle) as spooled:
+                self.download(output_dir, resume=True, streaming=True)
+
+            # Then each session with data is spooled once, by the job manifest
+            minute_files = pathlib.Path(output_dir, 'minute').glob('*.csv')
+            num_sessions = sum(len(pd.read_csv(path, index_col=0, parse_dates=True).index.normalize().unique())
+                               for path in minute_files)
+            self.assertEqual(num_sessions, spooled.call_count)
+            self.assertTrue(all(SPOOL_DIR_NAME in str(call[0][1]) for call in spooled.call_args_list))
+
+            # And the spool is removed when the job finishes.
+            self.assertFalse(pathlib.Path(output_dir, SPOOL_DIR_NAME).exists())
+
+    def test_resume_cli_option(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, [
+                'download',
+                '--symbol-source', 'faang',
+                '--data-source', 'mock_price_manager',
+                '--start', self.start_date.strftime('%Y-%m-%d'),
+                '--output-dir', output_dir,
+                '--no-cache',
+                '--resume'
+            ])
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertTrue(pathlib.Path(output_dir, MANIFEST_FILE_NAME).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
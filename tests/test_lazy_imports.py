@@ -0,0 +1,102 @@
+import os
+import pathlib
+import subprocess
+import sys
+import unittest
+
+import azul
+
+REPO_DIR = str(pathlib.Path(__file__).resolve().parent.parent)
+
+# The dependencies that are slow to import and only needed by some of the price managers.
+HEAVY_MODULES = ['pandas', 'numpy', 'requests', 'zipline', 'pyEX', 'aiohttp']
+
+
+def imported_heavy_modules(code):
+    # Runs code in a new interpreter and returns the heavy modules it imported.
+    script = code + '\nimport sys\nprint(",".join(m for m in {!r} if m in sys.modules))\n'.format(HEAVY_MODULES)
+    python_path = [REPO_DIR] + ([os.environ['PYTHONPATH']] if os.environ.get('PYTHONPATH') else [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=REPO_DIR, env=env)
+    last_line = output.decode('utf-8').strip().splitlines()[-1] if output.strip() else ''
+    return [module for module in last_line.split(',') if module in HEAVY_MODULES]
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_importing_azul_doesnt_import_heavy_modules(self):
+        # When azul is imported
+        modules = imported_heavy_modules('import azul')
+
+        # Then none of the heavy dependencies are imported.
+        self.assertEqual([], modules)
+
+    def test_help_doesnt_import_heavy_modules(self):
+        for args in [['--help'], ['download', '--help'], ['update', '--help']]:
+            with self.subTest(args=args):
+                # When the help of a command is shown
+                modules = imported_heavy_modules(
+                    'from azul.scripts.azul import cli\n'
+                    'try:\n'
+                    '    cli({!r})\n'
+                    'except SystemExit:\n'
+                    '    pass'.format(args))
+
+                # Then none of the heavy dependencies are imported.
+                self.assertEqual([], modules)
+
+    def test_listing_the_registries_doesnt_import_heavy_modules(self):
+        # When the registered keys are listed
+        modules = imported_heavy_modules(
+            'import azul\n'
+            'assert "polygon" in list(azul.price_manager_registry.keys())\n'
+            'assert "feather" in list(azul.storage_registry.keys())\n'
+            'assert "faang" in list(azul.symbol_fetcher_registry.keys())')
+
+        # Then none of the heavy dependencies are imported.
+        self.assertEqual([], modules)
+
+    def test_looking_up_a_price_manager_only_imports_what_it_needs(self):
+        # When the synthetic and polygon price managers are looked up
+        modules = imported_heavy_modules(
+            'import azul\n'
+            'azul.price_manager_registry.get_class("synthetic")\n'
+            'azul.price_manager_registry.get_class("polygon")')
+
+        # Then pandas is imported, but not pyEX, which only the iex price manager uses, or requests, which isn't
+        # needed until a request is sent.
+        self.assertIn('pandas', modules)
+        self.assertNotIn('pyEX', modules)
+        self.assertNotIn('requests', modules)
+
+    def test_python_without_module_getattr_imports_everything(self):
+        # When azul is imported by a Python before 3.7, which doesn't support a module __getattr__. The dependencies
+        # that check the version themselves are imported first.
+        script = ('import sys, class_registry, click, logbook, numpy, pandas\n'
+                  'version_info = sys.version_info\n'
+                  'sys.version_info = (3, 6, 9)\n'
+                  'import azul\n'
+                  'sys.version_info = version_info\n'
+                  'print(",".join(name for name in list(azul._LAZY_ATTRIBUTES) + azul._LAZY_MODULES\n'
+                  '               if name not in vars(azul)))\n')
+        python_path = [REPO_DIR] + ([os.environ['PYTHONPATH']] if os.environ.get('PYTHONPATH') else [])
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=REPO_DIR, env=env)
+
+        # Then the lazy classes and modules are imported straight away.
+        self.assertEqual('', output.decode('utf-8').strip())
+
+    def test_lazy_attributes(self):
+        # The lazy classes are the registered classes
+        self.assertIs(azul.price_manager_registry.get_class('polygon'), azul.PolygonPriceManager)
+        self.assertIs(azul.storage_registry.get_class('csv'), azul.CSVStorage)
+        self.assertTrue(issubclass(azul.SyntheticPriceManager, azul.BasePriceManager))
+        self.assertIn('BasePriceManager', dir(azul))
+
+        # And unknown attributes still raise AttributeError.
+        with self.assertRaises(AttributeError):
+            azul.NoSuchPriceManager
+
+
+if __name__ == '__main__':
+    unittest.main()
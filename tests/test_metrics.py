@@ -0,0 +1,102 @@
+import unittest
+import json
+import pathlib
+import tempfile
+import threading
+import time
+from azul import RunMetrics
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def test_nested_stages_are_not_counted_twice(self):
+        metrics = RunMetrics()
+
+        # When a stage runs inside another one
+        with metrics.time('decode', 'AAPL'):
+            time.sleep(0.02)
+            with metrics.time('fixna', 'AAPL'):
+                time.sleep(0.05)
+
+        # Then the outer stage doesn't include the time of the inner one.
+        stages = metrics.to_dict()['symbols']['AAPL']['stages']
+        self.assertGreaterEqual(stages['fixna']['wall'], 0.05)
+        self.assertGreaterEqual(stages['decode']['wall'], 0.02)
+        self.assertLess(stages['decode']['wall'], 0.05)
+        self.assertEqual(1, stages['decode']['count'])
+
+    def test_counts_per_symbol_and_run(self):
+        metrics = RunMetrics()
+
+        # When counters are recorded by several threads, with and without a symbol
+        def record(ticker):
+            for _ in range(100):
+                metrics.count('requests', ticker)
+                metrics.count('bytes_received', ticker, 10)
+        threads = [threading.Thread(target=record, args=(ticker,)) for ticker in ['AAPL', 'AMZN', None]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Then the symbols have their own counts and the run has all of them.
+        actual = metrics.to_dict()
+        self.assertEqual({'requests': 300, 'bytes_received': 3000}, actual['counters'])
+        self.assertEqual({'requests': 100, 'bytes_received': 1000}, actual['symbols']['AAPL']['counters'])
+        self.assertEqual(['AAPL', 'AMZN'], sorted(actual['symbols']))
+
+    def test_merge(self):
+        # Given metrics recorded in a worker process
+        worker_metrics = RunMetrics()
+        worker_metrics.add_time('write', 'AAPL', wall=1.0, cpu=0.5)
+        worker_metrics.count('rows_written', 'AAPL', 390)
+
+        # When they are merged into the run's metrics
+        metrics = RunMetrics()
+        metrics.add_time('write', 'AMZN', wall=2.0, cpu=1.0)
+        metrics.merge(worker_metrics.to_dict())
+
+        # Then they are added to the run and to the symbol.
+        actual = metrics.to_dict()
+        self.assertEqual({'count': 2, 'wall': 3.0, 'cpu': 1.5}, actual['stages']['write'])
+        self.assertEqual({'rows_written': 390}, actual['symbols']['AAPL']['counters'])
+        self.assertEqual({'count': 1, 'wall': 1.0, 'cpu': 0.5}, actual['symbols']['AAPL']['stages']['write'])
+
+    def test_summary(self):
+        metrics = RunMetrics()
+        metrics.add_time('write', 'AAPL', wall=1.5, cpu=0.5)
+        metrics.add_time('http', 'AMZN', wall=3.0)
+        metrics.count('requests', 'AMZN', 4)
+        metrics.finish()
+
+        lines = metrics.summary().splitlines()
+
+        # The stages are in the order they happen, followed by the counters and the slowest symbols.
+        self.assertTrue(lines[1].startswith('http'))
+        self.assertTrue(lines[2].startswith('write'))
+        self.assertIn('requests', metrics.summary())
+        self.assertEqual(['AMZN', 'AAPL'], [line.split()[0] for line in lines[-2:]])
+
+    def test_write_json_and_prometheus(self):
+        metrics = RunMetrics()
+        metrics.add_time('http', 'AAPL', wall=1.25, cpu=0.25)
+        metrics.count('throttled', 'AAPL', 2)
+        metrics.finish()
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            json_path = pathlib.Path(dir_name, 'metrics', 'run.json')
+            prom_path = pathlib.Path(dir_name, 'azul.prom')
+            metrics.write_json(str(json_path))
+            metrics.write_prometheus(str(prom_path), labels={'data_source': 'polygon'})
+
+            self.assertEqual(metrics.to_dict(), json.loads(json_path.read_text()))
+            prom = prom_path.read_text().splitlines()
+            self.assertIn('# TYPE azul_stage_seconds_total counter', prom)
+            self.assertIn('azul_stage_seconds_total{data_source="polygon",stage="http"} 1.25', prom)
+            self.assertIn('azul_throttled_total{data_source="polygon"} 2', prom)
+            # And no temporary files were left behind.
+            self.assertEqual(['azul.prom', 'metrics'], sorted(path.name for path in pathlib.Path(dir_name).iterdir()))
+
+
+if __name__ == '__main__':
+    unittest.main()
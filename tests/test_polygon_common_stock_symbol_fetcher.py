@@ -0,0 +1,52 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from azul import symbol_fetcher_registry
+
+
+class FakeResponse(object):
+
+    def __init__(self, json_dict, status_code=200):
+        self.status_code = status_code
+        self._json_dict = json_dict
+
+    def json(self):
+        return self._json_dict
+
+
+class TestPolygonCommonStockSymbolFetcher(unittest.TestCase):
+
+    def test_fetches_every_page(self):
+        pages = []
+
+        def get(url, params=None, **kwargs):
+            # There are 120 common stocks, 50 to a page.
+            pages.append(params['page'])
+            first = (params['page'] - 1) * params['perpage']
+            return FakeResponse({'symbols': [{'symbol': 'SYM{}'.format(i)} for i in range(first, min(first + 50, 120))]})
+
+        env = {'AZUL_POLYGON_API_KEY': 'test', 'AZUL_SYMBOL_CACHE_DIR': tempfile.mkdtemp()}
+        with mock.patch.dict(os.environ, env):
+            fetcher = symbol_fetcher_registry.get('polygon_cs')
+        fetcher._http_client = mock.Mock(get=get)
+
+        # When the symbols are fetched
+        actual = fetcher.symbols()
+
+        # Then the symbols on every page are returned in order, after one round of concurrent requests.
+        self.assertEqual(['SYM{}'.format(i) for i in range(120)], actual)
+        self.assertEqual(list(range(1, fetcher.workers + 1)), sorted(pages))
+
+    def test_raises_on_errors(self):
+        env = {'AZUL_POLYGON_API_KEY': 'test', 'AZUL_SYMBOL_CACHE_DIR': tempfile.mkdtemp()}
+        with mock.patch.dict(os.environ, env):
+            fetcher = symbol_fetcher_registry.get('polygon_cs')
+        fetcher._http_client = mock.Mock(get=lambda url, params=None: FakeResponse({}, status_code=401))
+
+        with self.assertRaises(RuntimeError):
+            fetcher.symbols()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,11 @@ from click.testing import CliRunner
 import tempfile
 import pathlib
 import azul
+import json
+import os
+import numpy as np
+import pandas as pd
+from unittest import mock
 
 
 class TestPolygonPriceManager(unittest.TestCase):
@@ -17,10 +22,10 @@ class TestPolygonPriceManager(unittest.TestCase):
     @unittest.skip
     def test_raise_value_error_if_no_env_var_set(self):
         with self.assertRaises(ValueError):
-            pm = price_manager_registry.get('polygon')
+            price_manager_registry.get('polygon')
 
     def test_env_var_set(self):
-        pm = price_manager_registry.get('polygon')
+        self.assertIsNotNone(price_manager_registry.get('polygon'))
 
     def test_download_faang_polygon(self):
 
@@ -43,3 +48,47 @@ class TestPolygonPriceManager(unittest.TestCase):
             self.assertTrue(pathlib.Path(expected).exists())
             expected = pathlib.Path(output_dir_path, 'daily')
             self.assertTrue(pathlib.Path(expected).exists())
+
+
+class TestPolygonDecoding(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.dict(os.environ, {'AZUL_POLYGON_API_KEY': 'key'}):
+            self.pm = price_manager_registry.get('polygon')
+        self.map = {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 't': 'timestamp'}
+        start = pd.Timestamp('2019-01-02 14:31').value // 1000000
+        self.ticks = [
+            {'o': 10.0 + i, 'h': 11.0 + i, 'l': 9.0 + i, 'c': 10.5 + i, 'v': 100 * i, 't': start + 60000 * i}
+            for i in range(5)
+        ]
+
+    def test_ticks_are_read_into_columns(self):
+        # Given ticks returned out of order
+        shuffled = [self.ticks[i] for i in [3, 0, 4, 1, 2]]
+        payload = json.loads(json.dumps({'ticks': shuffled, 'map': self.map, 'aggType': 'min'}))
+
+        # When the minute bars are created
+        df = self.pm._minute_dataframe_from_payload(payload)
+
+        # Then they are sorted oldest first with the columns in order
+        self.assertEqual(['open', 'high', 'low', 'close', 'volume', 'dividend', 'split'], list(df.columns))
+        self.assertEqual('date', df.index.name)
+        self.assertEqual(pd.Timestamp('2019-01-02 14:31'), df.index[0])
+        self.assertTrue(df.index.is_monotonic_increasing)
+        self.assertEqual([10.0, 11.0, 12.0, 13.0, 14.0], list(df['open']))
+        self.assertEqual([0, 100, 200, 300, 400], list(df['volume']))
+        self.assertTrue((df['dividend'] == 0.0).all())
+        self.assertTrue((df['split'] == 1.0).all())
+
+    def test_missing_values_and_empty_responses(self):
+        # Given a tick without a volume
+        del self.ticks[2]['v']
+        df = self.pm._minute_dataframe_from_payload({'ticks': self.ticks, 'map': self.map, 'aggType': 'min'})
+
+        # Then its volume is missing.
+        self.assertEqual(5, len(df))
+        self.assertTrue(np.isnan(df['volume'].iloc[2]))
+
+        # And an empty response has no bars.
+        df = self.pm._minute_dataframe_from_payload({'ticks': [], 'map': self.map, 'aggType': 'min'})
+        self.assertTrue(df.empty)
@@ -0,0 +1,102 @@
+import unittest
+import pathlib
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import azul
+from azul import post_processing
+from tests.mock_price_manager import MockPriceManager
+
+
+class TestPostProcessing(unittest.TestCase):
+
+    def setUp(self):
+        dates = pd.DatetimeIndex([datetime(2019, 1, 2, 14, 31) + timedelta(minutes=i) for i in range(10)], name='date')
+        self.df = pd.DataFrame({
+            'open': np.linspace(10.0, 11.0, 10),
+            'high': np.linspace(10.5, 11.5, 10),
+            'low': np.linspace(9.5, 10.5, 10),
+            'close': np.linspace(10.25, 11.25, 10),
+            'volume': np.arange(10) * 100,
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=dates)
+
+    def test_encode_and_decode_dataframe(self):
+        # When a DataFrame is encoded and decoded
+        encoding, data = post_processing.encode_dataframe(self.df)
+        actual = post_processing.decode_dataframe(encoding, data)
+
+        # Then it is the same DataFrame, sent as Arrow IPC if pyarrow is installed
+        pd.testing.assert_frame_equal(self.df, actual)
+        self.assertEqual(post_processing.ARROW_IPC if post_processing.pa else post_processing.PICKLE, encoding)
+
+    def test_encode_and_decode_dataframe_without_pyarrow(self):
+        with mock.patch.object(post_processing, 'pa', None):
+            encoding, data = post_processing.encode_dataframe(self.df)
+            actual = post_processing.decode_dataframe(encoding, data)
+
+        self.assertEqual(post_processing.PICKLE, encoding)
+        pd.testing.assert_frame_equal(self.df, actual)
+
+    def test_process_pool_writes_the_same_files(self):
+        end = datetime.now() - timedelta(days=2)
+        start = end - timedelta(days=20)
+
+        with tempfile.TemporaryDirectory() as thread_dir_name, tempfile.TemporaryDirectory() as process_dir_name:
+            # Given the files written when the data is processed on the download threads
+            azul.get_price_data('faang', 'mock_price_manager', thread_dir_name, start, end, workers=2, cache=False)
+
+            # When the data is processed on a pool of processes
+            with mock.patch.object(post_processing, 'create_process_pool',
+                                   wraps=post_processing.create_process_pool) as create_process_pool:
+                azul.get_price_data('faang', 'mock_price_manager', process_dir_name, start, end, workers=2,
+                                    cache=False, processes=2)
+            create_process_pool.assert_called_once_with(2)
+
+            # Then the same files are written.
+            for frequency in ['minute', 'daily']:
+                thread_paths = sorted(pathlib.Path(thread_dir_name, frequency).iterdir())
+                process_paths = sorted(pathlib.Path(process_dir_name, frequency).iterdir())
+                self.assertEqual([p.name for p in thread_paths], [p.name for p in process_paths])
+                for thread_path, process_path in zip(thread_paths, process_paths):
+                    self.assertEqual(thread_path.read_bytes(), process_path.read_bytes())
+
+    def test_process_and_write_data_returns_its_metrics(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            minute_dir_path = pathlib.Path(dir_name, 'minute')
+            daily_dir_path = pathlib.Path(dir_name, 'daily')
+            args = ['NYSE', azul.CSVStorage, None, 'AAPL'] + list(post_processing.encode_dataframe(self.df))
+
+            # When the worker is asked to record metrics
+            metrics = post_processing.process_and_write_data(*args, minute_dir_path, daily_dir_path, True)['metrics']
+
+            # Then the rows it wrote and the time it spent are returned
+            self.assertEqual(11, metrics['symbols']['AAPL']['counters']['rows_written'])
+            self.assertEqual(2, metrics['stages']['write']['count'])
+
+            # But nothing is returned otherwise.
+            recorded = post_processing.process_and_write_data(*args, minute_dir_path, daily_dir_path)
+            self.assertIsNone(recorded['metrics'])
+            self.assertIsNone(recorded['index'])
+
+    def test_process_and_write_data_returns_the_files_it_indexed(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            minute_dir_path = pathlib.Path(dir_name, 'minute')
+            daily_dir_path = pathlib.Path(dir_name, 'daily')
+            args = ['NYSE', azul.CSVStorage, None, 'AAPL'] + list(post_processing.encode_dataframe(self.df))
+
+            # When the worker is asked to record the files it writes for the data index
+            index = post_processing.process_and_write_data(*args, minute_dir_path, daily_dir_path, False, True)['index']
+
+            # Then the minute and daily files are returned
+            self.assertEqual(10, index['AAPL']['minute']['rows'])
+            self.assertEqual('AAPL.csv', index['AAPL']['minute']['file'])
+            self.assertEqual(1, index['AAPL']['daily']['rows'])
+
+if __name__ == '__main__':
+    unittest.main()
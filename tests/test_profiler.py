@@ -0,0 +1,138 @@
+import unittest
+import pathlib
+import pstats
+import tempfile
+import threading
+import sys
+import time
+from click.testing import CliRunner
+from unittest import mock
+import azul
+from azul.profiler import Profiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def work_on_a_thread():
+    thread = threading.Thread(target=busy, args=(0.2,), name='worker')
+    thread.start()
+    busy(0.1)
+    thread.join()
+
+
+class TestProfiler(unittest.TestCase):
+
+    def profile(self, mode):
+        profiler = Profiler(mode, interval=0.001)
+        profiler.start()
+        work_on_a_thread()
+        profiler.stop()
+        return profiler
+
+    def test_profiles_every_thread(self):
+        for mode in ['cprofile', 'sampling']:
+            with self.subTest(mode=mode), tempfile.TemporaryDirectory() as dir_name:
+                # When work is done on the calling thread and on a thread it starts
+                profiler = self.profile(mode)
+                pstats_path = str(pathlib.Path(dir_name, 'profile.pstats'))
+                collapsed_path = pathlib.Path(dir_name, 'profile.collapsed')
+                profiler.write_pstats(pstats_path)
+                profiler.write_collapsed_stacks(str(collapsed_path))
+
+                # Then the time spent on both threads is in the pstats file
+                stats = pstats.Stats(pstats_path).stats
+                busy_stats = [stats[key] for key in stats if key[2] == 'busy']
+                self.assertEqual(1, len(busy_stats))
+                self.assertGreater(busy_stats[0][3], 0.2)
+
+                # And the collapsed stacks start at the thread they were sampled on.
+                stacks = collapsed_path.read_text().splitlines()
+                self.assertTrue(stacks)
+                self.assertTrue(any(line.startswith('worker;') and 'busy' in line for line in stacks))
+                self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in stacks))
+
+    def test_samples_on_python_versions_that_only_profile_one_thread(self):
+        # When the threads are profiled with cProfile on Python 3.12
+        with mock.patch.object(sys, 'version_info', (3, 12, 0)):
+            profiler = self.profile('cprofile')
+
+        # Then they are sampled instead, so the time spent on the thread that was started is in the profile.
+        self.assertEqual('sampling', profiler.mode)
+        busy_stats = [stats for key, stats in profiler._stats.items() if key[2] == 'busy']
+        self.assertEqual(1, len(busy_stats))
+        self.assertGreater(busy_stats[0][3], 0.2)
+
+    def test_threads_that_cant_be_profiled_stop_calling_the_profiler(self):
+        # Given a profiler that another cProfile profiler keeps from being enabled, as on Python 3.12
+        profiler = Profiler('cprofile')
+        profile_functions = []
+
+        def work_on_a_thread():
+            # The profiler's threading.setprofile makes _profile_thread the thread's profile function.
+            sys.setprofile(profiler._profile_thread)
+            time.sleep(0)
+            profile_functions.append(sys.getprofile())
+
+        # When a thread tries to enable its profiler
+        sys_profile = sys.getprofile()
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is active')):
+            thread = threading.Thread(target=work_on_a_thread)
+            thread.start()
+            thread.join()
+
+        # Then the thread has no profile function left, and the calling thread's is unchanged.
+        self.assertEqual([None], profile_functions)
+        self.assertIs(sys_profile, sys.getprofile())
+
+    def test_hot_functions(self):
+        profiler = self.profile('cprofile')
+
+        # When the hottest functions in this file are asked for
+        functions = profiler.hot_functions(lambda filename: filename == __file__, num_functions=2)
+
+        # Then busy is first, and the time work_on_a_thread waited for the thread isn't counted towards it.
+        self.assertEqual(2, len(functions))
+        own, cumulative, calls, function = functions[0]
+        self.assertTrue(function.endswith('(busy)'))
+        self.assertEqual(2, calls)
+        self.assertGreater(own, 0.25)
+        own, cumulative, calls, function = functions[1]
+        self.assertTrue(function.endswith('(work_on_a_thread)'))
+        self.assertLess(own, 0.05)
+
+
+class TestProfileOption(unittest.TestCase):
+
+    def test_download_with_profile(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            profile_output = str(pathlib.Path(dir_name, 'download'))
+
+            # When a download is profiled
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, [
+                '--profile',
+                '--profile-output', profile_output,
+                'download',
+                '--symbol-source', 'faang',
+                '--data-source', 'synthetic',
+                '--start', '2019-03-04',
+                '--end', '2019-03-08',
+                '--output-dir', str(pathlib.Path(dir_name, 'data')),
+                '--workers', '2'
+            ])
+            self.assertEqual(0, result.exit_code)
+
+            # Then the profile includes the work done by the download workers.
+            stats = pstats.Stats(profile_output + '.pstats').stats
+            names = {key[2] for key in stats}
+            self.assertIn('get_price_data', names)
+            self.assertIn('_session_minute_dataframe', names)
+            self.assertTrue(pathlib.Path(profile_output + '.collapsed').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+from azul import rate_limiter
+from azul.rate_limiter import TokenBucketRateLimiter, parse_rate
+from tests.mock_price_manager import MockRangePriceManager
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(5.0, parse_rate('5/s'))
+        self.assertEqual(5.0, parse_rate('300/min'))
+        self.assertEqual(1.0, parse_rate('3600/h'))
+        with self.assertRaises(ValueError):
+            parse_rate('fast')
+
+    def test_limits_the_rate(self):
+        # Given a limiter that allows 50 requests per second with no bursts
+        limiter = TokenBucketRateLimiter(50, capacity=1)
+
+        # When 11 requests are made
+        start = time.monotonic()
+        for _ in range(11):
+            limiter.acquire()
+        elapsed = time.monotonic() - start
+
+        # Then they take at least 10 / 50 seconds
+        self.assertGreaterEqual(elapsed, 0.19)
+
+        # And the time spent waiting is counted.
+        stats = limiter.stats()
+        self.assertEqual(11, stats['num_requests'])
+        self.assertEqual(10, stats['num_waits'])
+        self.assertGreaterEqual(stats['wait_time'], 0.19)
+
+    def test_limits_the_rate_across_threads(self):
+        # Given a limiter shared by several threads
+        limiter = TokenBucketRateLimiter(100, capacity=1)
+
+        # When the threads make 21 requests between them
+        def make_requests(n):
+            for _ in range(n):
+                limiter.acquire()
+
+        threads = [threading.Thread(target=make_requests, args=(7,)) for _ in range(3)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        # Then together they respect the rate.
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertEqual(21, limiter.stats()['num_requests'])
+
+    def test_limits_the_rate_across_tasks(self):
+        # Given a limiter shared by several asyncio tasks
+        limiter = TokenBucketRateLimiter(100, capacity=1)
+
+        async def make_requests():
+            await asyncio.gather(*[limiter.acquire_async() for _ in range(21)])
+
+        # When the tasks make 21 requests between them
+        loop = asyncio.new_event_loop()
+        start = time.monotonic()
+        try:
+            loop.run_until_complete(make_requests())
+        finally:
+            loop.close()
+        elapsed = time.monotonic() - start
+
+        # Then together they respect the rate.
+        self.assertGreaterEqual(elapsed, 0.19)
+
+    def test_rate_limiters_are_shared_by_key(self):
+        rate_limiter.configure_rate_limits('test_source=5/s, other_test_source=10/min')
+        self.assertIs(rate_limiter.get_rate_limiter('test_source'), rate_limiter.get_rate_limiter('test_source'))
+        self.assertEqual(5.0, rate_limiter.get_rate_limiter('test_source').rate)
+        self.assertIsNone(rate_limiter.get_rate_limiter('unlimited_test_source'))
+
+    def test_configured_rate_limits_override_the_env_var(self):
+        # Given rate limits set in the environment variable
+        with mock.patch.dict(os.environ, {'AZUL_RATE_LIMITS': 'env_test_source=1/s,other_env_test_source=2/s'}), \
+                mock.patch.object(rate_limiter, '_env_var_loaded', False), \
+                mock.patch.object(rate_limiter, '_rate_limiters', {}):
+
+            # When one of them is also set explicitly, as with --rate-limit
+            rate_limiter.configure_rate_limits('env_test_source=50/s')
+
+            # Then the explicit rate wins
+            self.assertEqual(50.0, rate_limiter.get_rate_limiter('env_test_source').rate)
+
+            # And the environment variable still sets the others.
+            self.assertEqual(2.0, rate_limiter.get_rate_limiter('other_env_test_source').rate)
+
+    def test_price_manager_requests_go_through_the_rate_limiter(self):
+        # Given a rate limited price manager
+        pm = MockRangePriceManager()
+        pm.rate_limiter = TokenBucketRateLimiter(1000)
+
+        # When minute data is retrieved
+        end_date = datetime.now() - timedelta(days=1)
+        pm._minute_dataframe_for_dates('AAPL', end_date - timedelta(days=30), end_date)
+
+        # Then every request was counted by the rate limiter.
+        self.assertEqual(pm.num_requests, pm.rate_limiter.stats()['num_requests'])
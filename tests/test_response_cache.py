@@ -0,0 +1,176 @@
+import unittest
+import json
+import os
+import tempfile
+import time
+import pandas as pd
+from unittest import mock
+from datetime import datetime, timedelta
+from azul import price_manager_registry
+from azul.response_cache import ResponseCache
+
+
+class StubResponse(object):
+
+    def __init__(self, json_dict):
+        self.status_code = 200
+        self.content = json.dumps(json_dict).encode('utf-8')
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+def historic_agg(params):
+    # One bar at the open of each weekday between from and to.
+    ticks = []
+    for day in pd.date_range(pd.Timestamp(params['from']).normalize(), pd.Timestamp(params['to']), freq='D'):
+        if day.weekday() < 5:
+            minute = day + pd.Timedelta('14:31:00')
+            ticks.append({'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': 1.5, 'v': 100, 't': int(minute.value // 1000000)})
+    return StubResponse({
+        'ticks': ticks,
+        'map': {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 't': 'timestamp'},
+        'aggType': 'min'
+    })
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.temp_dir.name, max_bytes=1000, ttl=60)
+        self.old_session = pd.Timestamp('2019-01-02', tz='UTC')
+        self.today = pd.Timestamp(datetime.utcnow().date(), tz='UTC')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_put_and_get(self):
+        # Given a response in the cache
+        self.cache.put('polygon', 'AAPL', self.old_session, b'response')
+
+        # Then it can be read back for the same provider, ticker and session only.
+        self.assertEqual(b'response', self.cache.get('polygon', 'AAPL', self.old_session))
+        self.assertTrue(self.cache.contains('polygon', 'AAPL', self.old_session))
+        self.assertIsNone(self.cache.get('iex', 'AAPL', self.old_session))
+        self.assertIsNone(self.cache.get('polygon', 'MSFT', self.old_session))
+        self.assertIsNone(self.cache.get('polygon', 'AAPL', self.old_session + timedelta(days=1)))
+
+    def test_finalized_sessions_never_expire(self):
+        # Given a response for an old session that was written long ago
+        self.cache.put('polygon', 'AAPL', self.old_session, b'response')
+        path = self.cache._path('polygon', 'AAPL', self.old_session)
+        written = time.time() - 365 * 24 * 60 * 60
+        os.utime(str(path), (written, written))
+
+        # Then it is still used.
+        self.assertEqual(b'response', self.cache.get('polygon', 'AAPL', self.old_session))
+
+    def test_current_session_expires(self):
+        # Given a response for today's session
+        self.cache.put('polygon', 'AAPL', self.today, b'response')
+        self.assertEqual(b'response', self.cache.get('polygon', 'AAPL', self.today))
+
+        # When it is older than the ttl
+        path = self.cache._path('polygon', 'AAPL', self.today)
+        written = time.time() - 61
+        os.utime(str(path), (written, written))
+
+        # Then it isn't used.
+        self.assertIsNone(self.cache.get('polygon', 'AAPL', self.today))
+        self.assertFalse(self.cache.contains('polygon', 'AAPL', self.today))
+
+    def test_evicts_least_recently_used(self):
+        # Given a cache holding three responses, the first of which was read recently
+        sessions = [self.old_session + timedelta(days=i) for i in range(4)]
+        for i, session in enumerate(sessions[:3]):
+            self.cache.put('polygon', 'AAPL', session, b'x' * 300)
+            path = self.cache._path('polygon', 'AAPL', session)
+            os.utime(str(path), (time.time() - 100 + i, time.time() - 100 + i))
+        self.cache.get('polygon', 'AAPL', sessions[0])
+
+        # When another response takes the cache over its size limit
+        self.cache.put('polygon', 'AAPL', sessions[3], b'x' * 300)
+
+        # Then the least recently used response is removed.
+        self.assertIsNotNone(self.cache.get('polygon', 'AAPL', sessions[0]))
+        self.assertIsNone(self.cache.get('polygon', 'AAPL', sessions[1]))
+        self.assertIsNotNone(self.cache.get('polygon', 'AAPL', sessions[2]))
+        self.assertIsNotNone(self.cache.get('polygon', 'AAPL', sessions[3]))
+        self.assertLessEqual(self.cache.size(), 1000)
+
+    def test_puts_over_the_limit_dont_rescan_the_cache(self):
+        # When many responses are added to a full cache
+        sessions = [self.old_session + timedelta(days=i) for i in range(100)]
+        with mock.patch.object(self.cache, '_entries', wraps=self.cache._entries) as entries:
+            for session in sessions:
+                self.cache.put('polygon', 'AAPL', session, b'x' * 300)
+
+            # Then the cache is only read from the disk once
+            self.assertEqual(1, entries.call_count)
+
+        # And it is evicted down to its low water mark, keeping the newest responses.
+        self.assertEqual(900, self.cache.size())
+        self.assertIsNotNone(self.cache.get('polygon', 'AAPL', sessions[-1]))
+        self.assertIsNone(self.cache.get('polygon', 'AAPL', sessions[-4]))
+
+    def test_clear(self):
+        self.cache.put('polygon', 'AAPL', self.old_session, b'response')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('polygon', 'AAPL', self.old_session))
+        self.assertEqual(0, self.cache.size())
+
+
+class TestPolygonResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with mock.patch.dict(os.environ, {'AZUL_POLYGON_API_KEY': 'key'}):
+            self.pm = price_manager_registry.get('polygon')
+        self.pm.response_cache = ResponseCache(self.temp_dir.name)
+        self.requests = []
+
+        def get(url, params=None, **kwargs):
+            self.requests.append(params)
+            return historic_agg(params)
+
+        self.pm._http_client = mock.Mock()
+        self.pm._http_client.get = get
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_finalized_sessions_are_only_fetched_once(self):
+        start = datetime(2019, 3, 1)
+        end = datetime(2019, 3, 29)
+
+        # Given data that has been fetched once
+        first_df = self.pm._minute_dataframe_for_dates('AAPL', start, end)
+        self.assertGreater(len(self.requests), 0)
+        self.assertEqual(21, len(first_df))
+
+        # When it is fetched again
+        self.requests.clear()
+        second_df = self.pm._minute_dataframe_for_dates('AAPL', start, end)
+
+        # Then polygon isn't asked for anything and the data is the same.
+        self.assertEqual(0, len(self.requests))
+        pd.testing.assert_frame_equal(first_df, second_df)
+
+    def test_only_uncached_sessions_are_fetched(self):
+        # Given the first half of March in the cache
+        self.pm._minute_dataframe_for_dates('AAPL', datetime(2019, 3, 1), datetime(2019, 3, 15))
+
+        # When all of March is fetched
+        self.requests.clear()
+        df = self.pm._minute_dataframe_for_dates('AAPL', datetime(2019, 3, 1), datetime(2019, 3, 29))
+
+        # Then only the second half is requested.
+        self.assertEqual(1, len(self.requests))
+        self.assertEqual(pd.Timestamp('2019-03-18').date(), pd.Timestamp(self.requests[0]['from']).date())
+        self.assertEqual(21, len(df))
+        self.assertFalse(df.index.duplicated().any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 from azul import symbol_fetcher_registry
+from azul.sp500_wikipedia_symbol_fetcher import SP500WikipediaSymbolFetcher
 
 
 class TestSP500WikiSymbolFetcher(unittest.TestCase):
@@ -10,3 +11,17 @@ class TestSP500WikiSymbolFetcher(unittest.TestCase):
         self.assertEqual(505, len(actual))
         expected = ['BK', 'CI', 'JPM', 'DD-B', 'CL', 'HIG']
         self.assertFalse(set(expected).isdisjoint(actual))
+
+    def test_reads_the_symbols_from_the_first_table(self):
+        html = """
+        <table class="wikitable sortable" id="constituents">
+        <tbody><tr><th>Symbol</th><th>Security</th></tr>
+        <tr><td><a class="external text" href="https://www.nyse.com/quote/XNYS:MMM">MMM</a>
+        </td><td><a href="/wiki/3M">3M</a></td></tr>
+        <tr><td><a class="external text" href="https://www.nyse.com/quote/XNYS:BRK.B">BRK.B</a></td>
+        <td><table><tr><td>nested</td></tr></table></td></tr>
+        </tbody></table>
+        <table><tr><td>Date</td></tr><tr><td>ADDED</td></tr></table>
+        """
+        actual = SP500WikipediaSymbolFetcher._symbols_from_html(html)
+        self.assertEqual(['MMM', 'BRK.B'], actual)
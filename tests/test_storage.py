@@ -0,0 +1,211 @@
+import unittest
+from click.testing import CliRunner
+from tests.mock_price_manager import MockPriceManager
+from datetime import datetime, timedelta
+import azul
+import numpy as np
+import pandas as pd
+import pathlib
+import tempfile
+
+
+class TestStorage(unittest.TestCase):
+
+    def setUp(self):
+        dates = pd.date_range('2019-01-02 14:30', periods=10, freq='min')
+        self.df = pd.DataFrame({
+            'open': np.linspace(10.0, 11.0, 10),
+            'high': np.linspace(10.5, 11.5, 10),
+            'low': np.linspace(9.5, 10.5, 10),
+            'close': np.linspace(10.25, 11.25, 10),
+            'volume': np.arange(10) * 100,
+            'dividend': 0.0,
+            'split': 1.0
+        }, index=pd.Index(dates, name='date'))
+
+    def test_round_trip(self):
+        for file_format in ['csv', 'parquet', 'feather']:
+            storage = azul.storage_registry.get(file_format)
+            with tempfile.TemporaryDirectory() as dir_name:
+                # When a DataFrame is written and read back
+                path = storage.path(dir_name, 'AAPL')
+                storage.write(self.df, path)
+                actual = storage.read(path)
+
+                # Then it has the same data
+                np.testing.assert_allclose(self.df.values, actual.values.astype('float64'), rtol=1e-6)
+                self.assertTrue((self.df.index == actual.index).all())
+                self.assertEqual(['AAPL'], storage.tickers(dir_name))
+
+                # And the last timestamp can be found.
+                self.assertEqual(self.df.index[-1], storage.last_timestamp(path))
+
+    def test_columnar_formats_use_compact_dtypes(self):
+        for file_format in ['parquet', 'feather']:
+            storage = azul.storage_registry.get(file_format, compression='zstd')
+            with tempfile.TemporaryDirectory() as dir_name:
+                path = storage.path(dir_name, 'AAPL')
+                storage.write(self.df, path)
+                actual = storage.read(path)
+                self.assertEqual(np.float32, actual['close'].dtype)
+                self.assertEqual(np.int64, actual['volume'].dtype)
+
+    def test_append(self):
+        for file_format in ['csv', 'parquet', 'feather']:
+            storage = azul.storage_registry.get(file_format)
+            with tempfile.TemporaryDirectory() as dir_name:
+                # When the data is written in two parts
+                path = storage.path(dir_name, 'AAPL')
+                storage.append(self.df.iloc[:4], path)
+                storage.append(self.df.iloc[4:], path)
+
+                # Then it is all there in order.
+                actual = storage.read(path)
+                self.assertEqual(len(self.df), len(actual))
+                self.assertEqual(self.df.index[-1], storage.last_timestamp(path))
+
+    def test_writer(self):
+        for file_format in ['csv', 'parquet', 'feather']:
+            storage = azul.storage_registry.get(file_format)
+            with tempfile.TemporaryDirectory() as dir_name:
+                # Given a file written all at once
+                expected_path = storage.path(pathlib.Path(dir_name, 'expected'), 'AAPL')
+                expected_path.parent.mkdir()
+                storage.write(self.df, expected_path)
+
+                # When the same data is written in pieces
+                path = storage.path(dir_name, 'AAPL')
+                with storage.writer(path) as writer:
+                    writer.write(self.df.iloc[:3])
+                    writer.write(self.df.iloc[3:7])
+                    writer.write(self.df.iloc[7:])
+
+                # Then the data read back is the same.
+                pd.testing.assert_frame_equal(storage.read(expected_path), storage.read(path))
+                self.assertEqual(self.df.index[-1], storage.last_timestamp(path))
+
+                # And a CSV file is byte for byte the same.
+                if file_format == 'csv':
+                    self.assertEqual(expected_path.read_bytes(), path.read_bytes())
+
+    def test_aborted_writer_leaves_no_file(self):
+        for file_format in ['csv', 'parquet', 'feather']:
+            storage = azul.storage_registry.get(file_format)
+            with self.subTest(file_format=file_format), tempfile.TemporaryDirectory() as dir_name:
+                # When writing a file in pieces raises part way through
+                path = storage.path(dir_name, 'AAPL')
+                with self.assertRaises(RuntimeError):
+                    with storage.writer(path) as writer:
+                        writer.write(self.df.iloc[:3])
+                        raise RuntimeError('Failed')
+
+                # Then neither the file nor a partial one is left behind.
+                self.assertFalse(path.exists())
+                self.assertEqual([], list(pathlib.Path(dir_name).iterdir()))
+
+    def test_truncate(self):
+        for file_format in ['csv', 'parquet', 'feather']:
+            storage = azul.storage_registry.get(file_format)
+            with self.subTest(file_format=file_format), tempfile.TemporaryDirectory() as dir_name:
+                # Given a file
+                path = storage.path(dir_name, 'AAPL')
+                storage.write(self.df, path)
+
+                # When the rows from the 7th on are removed, reading the CSV file a few bytes at a time
+                kwargs = {'block_size': 50} if file_format == 'csv' else {}
+                removed = storage.truncate(path, self.df.index[6], **kwargs)
+
+                # Then they are returned and the rest of the rows are left
+                self.assertEqual(list(self.df.index[6:]), list(removed.index))
+                self.assertEqual(list(self.df.index[:6]), list(storage.read(path).index))
+
+                # And more rows can be appended.
+                storage.append(self.df.iloc[6:], path)
+                self.assertEqual(list(self.df.index), list(storage.read(path).index))
+
+                # And removing every row leaves an empty file.
+                removed = storage.truncate(path, self.df.index[0])
+                self.assertEqual(len(self.df), len(removed))
+                self.assertTrue(storage.read(path).empty)
+
+    def test_csv_is_not_compressed(self):
+        with self.assertRaises(ValueError):
+            azul.storage_registry.get('csv', compression='gzip')
+
+    def test_csv_last_timestamp(self):
+        storage = azul.storage_registry.get('csv')
+        with tempfile.TemporaryDirectory() as dir_name:
+            path = storage.path(dir_name, 'AAPL')
+
+            # A file with only a header has no last timestamp.
+            path.write_text('date,open,high,low,close,volume,dividend,split\n')
+            self.assertIsNone(storage.last_timestamp(path))
+
+            # Otherwise it is the first field of the last row.
+            with open(str(path), 'a') as f:
+                for minute in range(100):
+                    f.write('2019-01-02 14:{:02d}:00,1.0,1.0,1.0,1.0,100,0.0,1.0\n'.format(minute % 60))
+                f.write('2019-01-03 15:30:00,1.0,1.0,1.0,1.0,100,0.0,1.0\n')
+            actual = storage.last_timestamp(path, block_size=16)
+            self.assertEqual(pd.Timestamp('2019-01-03 15:30:00'), actual)
+
+    def test_streaming_download_writes_the_same_files(self):
+        end_date = datetime.now() - timedelta(days=2)
+        start_date = end_date - timedelta(days=60)
+
+        for file_format in ['csv', 'parquet', 'feather']:
+            with tempfile.TemporaryDirectory() as expected_dir, tempfile.TemporaryDirectory() as output_dir:
+                # Given data downloaded all at once
+                azul.get_price_data('faang', 'mock_price_manager', expected_dir, start_date, end_date,
+                                    file_format=file_format, cache=False)
+
+                # When the data is downloaded one session at a time
+                azul.get_price_data('faang', 'mock_price_manager', output_dir, start_date, end_date,
+                                    file_format=file_format, cache=False, streaming=True)
+
+                # Then the files have the same data.
+                storage = azul.storage_registry.get(file_format)
+                for frequency in ['minute', 'daily']:
+                    expected_path = storage.path(pathlib.Path(expected_dir, frequency), 'AAPL')
+                    path = storage.path(pathlib.Path(output_dir, frequency), 'AAPL')
+                    pd.testing.assert_frame_equal(storage.read(expected_path), storage.read(path))
+                    if file_format == 'csv':
+                        self.assertEqual(expected_path.read_bytes(), path.read_bytes())
+
+                # And no spooled sessions are left behind.
+                self.assertEqual([], list(pathlib.Path(output_dir).glob('.azul_stream_*')))
+
+    def test_download_parquet_and_convert_to_csv(self):
+        start_date_str = (datetime.now() - timedelta(days=4)).strftime('%Y-%m-%d')
+
+        with tempfile.TemporaryDirectory() as parquet_dir_name, tempfile.TemporaryDirectory() as csv_dir_name:
+            # Given data downloaded as parquet files
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, [
+                'download',
+                '--symbol-source', 'faang',
+                '--data-source', 'mock_price_manager',
+                '--start', start_date_str,
+                '--output-dir', parquet_dir_name,
+                '--format', 'parquet',
+                '--compression', 'snappy'
+            ])
+            self.assertEqual(0, result.exit_code)
+            self.assertTrue(pathlib.Path(parquet_dir_name, 'minute', 'AAPL.parquet').exists())
+            self.assertTrue(pathlib.Path(parquet_dir_name, 'daily', 'AAPL.parquet').exists())
+
+            # When it is converted to csv
+            result = runner.invoke(azul.cli, [
+                'convert',
+                '--input-dir', parquet_dir_name,
+                '--input-format', 'parquet',
+                '--output-dir', csv_dir_name
+            ])
+            self.assertEqual(0, result.exit_code)
+
+            # Then there are csv files in the layout zipline expects.
+            for frequency in ['minute', 'daily']:
+                path = pathlib.Path(csv_dir_name, frequency, 'AAPL.csv')
+                self.assertTrue(path.exists())
+                df = pd.read_csv(path, index_col='date', parse_dates=True)
+                self.assertEqual(['open', 'high', 'low', 'close', 'volume', 'dividend', 'split'], list(df.columns))
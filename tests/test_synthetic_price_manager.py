@@ -0,0 +1,88 @@
+import unittest
+import pathlib
+import tempfile
+import time
+import pandas as pd
+from datetime import datetime
+from azul import price_manager_registry
+
+
+class TestSyntheticPriceManager(unittest.TestCase):
+
+    def setUp(self):
+        self.session = pd.Timestamp('2019-03-05', tz='UTC')
+
+    def test_generates_the_sessions_minutes(self):
+        pm = price_manager_registry.get('synthetic')
+
+        df = pm._minute_dataframe_for_date('AAPL', self.session)
+
+        # Then there is a bar for every trading minute with consistent prices.
+        expected_index = pm._calendar.minutes_for_session(self.session).tz_convert(None)
+        self.assertTrue(df.index.equals(expected_index))
+        self.assertEqual(pm._cols, list(df.columns))
+        self.assertTrue((df['high'] >= df[['open', 'close']].max(axis=1)).all())
+        self.assertTrue((df['low'] <= df[['open', 'close']].min(axis=1)).all())
+        self.assertTrue((df['low'] > 0).all())
+
+    def test_is_deterministic(self):
+        # Given two price managers with the same seed
+        pm1 = price_manager_registry.get('synthetic', seed=7)
+        pm2 = price_manager_registry.get('synthetic', seed=7)
+
+        # When one asks for the sessions in a different order
+        df1 = pm1._minute_dataframe_for_date('AAPL', self.session)
+        pm2._minute_dataframe_for_date('AAPL', pd.Timestamp('2019-03-06', tz='UTC'))
+        pm2._minute_dataframe_for_date('AMZN', self.session)
+        df2 = pm2._minute_dataframe_for_date('AAPL', self.session)
+
+        # Then the same bars are generated
+        pd.testing.assert_frame_equal(df1, df2)
+
+        # But another seed generates other bars.
+        df3 = price_manager_registry.get('synthetic', seed=8)._minute_dataframe_for_date('AAPL', self.session)
+        self.assertFalse(df1['close'].equals(df3['close']))
+
+    def test_gaps_and_bad_ticks(self):
+        pm = price_manager_registry.get('synthetic', gap_probability=0.1, bad_tick_probability=0.05)
+
+        df = pm._minute_dataframe_for_date('AAPL', self.session)
+
+        # Then about a tenth of the minutes are missing, and the bad ticks were repaired.
+        self.assertLess(len(df), 380)
+        self.assertGreater(len(df), 310)
+        self.assertTrue((df[['open', 'high', 'low', 'close']] > 0).all().all())
+
+        # And a session can be missing altogether.
+        pm = price_manager_registry.get('synthetic', missing_session_probability=1.0)
+        self.assertTrue(pm._minute_dataframe_for_date('AAPL', self.session).empty)
+
+    def test_latency(self):
+        pm = price_manager_registry.get('synthetic', latency=0.05)
+
+        start = time.perf_counter()
+        pm._minute_dataframe_for_date('AAPL', self.session)
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual(1, pm.num_requests)
+
+    def test_get_price_data_with_range_requests(self):
+        # Given a price manager that returns 10 sessions per request
+        pm = price_manager_registry.get('synthetic', sessions_per_request=10)
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            pm.get_price_data(['AAPL'], dir_name, datetime(2019, 3, 1), datetime(2019, 3, 29))
+            minute_df = pm.storage.read(pathlib.Path(dir_name, 'minute', 'AAPL.csv'))
+            daily_df = pm.storage.read(pathlib.Path(dir_name, 'daily', 'AAPL.csv'))
+
+        # Then the 21 sessions are fetched with 3 requests, and match the ones fetched one at a time.
+        self.assertEqual(3, pm.num_requests)
+        self.assertEqual(21, len(daily_df))
+        self.assertEqual(21 * 390, len(minute_df))
+        session_df = price_manager_registry.get('synthetic')._minute_dataframe_for_date('AAPL', self.session)
+        self.assertEqual(list(session_df['close']),
+                         list(minute_df.loc[session_df.index[0]:session_df.index[-1], 'close']))
+
+
+if __name__ == '__main__':
+    unittest.main()
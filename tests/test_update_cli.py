@@ -1,21 +1,24 @@
 import unittest
-from tests.mock_price_manager import MockPriceManager
+from tests.mock_price_manager import MockPriceManager, MockRangePriceManager
 from datetime import datetime, timedelta
 import pathlib
-import shutil
 import azul
 from click.testing import CliRunner
 import tempfile
 import pandas as pd
 
 
+def _utc_dates(df):
+    # Older versions of pandas read the dates as naive UTC times, newer ones keep their time zone.
+    return df.index if df.index.tz is None else df.index.tz_convert(None)
+
+
 class TestUpdateCommand(unittest.TestCase):
 
     def setUp(self):
         # Set start date 30 days before today
         pass
 
-    @unittest.skip
     def test_update_existing_data_dir(self):
         # Given an existing data dir
         with tempfile.TemporaryDirectory() as output_dir_name:
@@ -35,12 +38,12 @@ class TestUpdateCommand(unittest.TestCase):
             self.assertTrue(pathlib.Path(daily_path).exists())
 
             # Sanity check that we don't have any data from the last 7 days in the daily files.
-            aapl_daily_path = pathlib.Path(daily_path, 'aapl.csv')
+            aapl_daily_path = pathlib.Path(daily_path, 'AAPL.csv')
             self.assertTrue(pathlib.Path(aapl_daily_path).exists())
             df = pd.read_csv(aapl_daily_path, parse_dates=True, index_col='date')
-            dr = df.index
-            out_side_dates = pd.date_range(end_date, datetime.now())
-            self.assertTrue(out_side_dates not in dr)
+            dr = _utc_dates(df)
+            out_side_dates = pd.date_range(end_date + timedelta(days=1), datetime.now()).normalize()
+            self.assertFalse(dr.isin(out_side_dates).any())
 
             # When updated
             azul.update_price_data(data_source=data_source, output_dir_path=output_dir_path)
@@ -53,7 +56,59 @@ class TestUpdateCommand(unittest.TestCase):
             # Check that we have the new data from the last 7 days in the daily files.
             self.assertTrue(pathlib.Path(aapl_daily_path).exists())
             df = pd.read_csv(aapl_daily_path, parse_dates=True, index_col='date')
-            actual_dates = df.index
+            actual_dates = _utc_dates(df)
             expected_dates = pd.date_range(end_date, datetime.now()).normalize()
             self.assertFalse(set(expected_dates).isdisjoint(actual_dates))
 
+    def test_update_command_only_fetches_new_sessions(self):
+        # Given an existing data dir with data up to a week ago
+        with tempfile.TemporaryDirectory() as output_dir_name:
+            pm = MockRangePriceManager()
+            pm.MAX_SESSIONS_PER_REQUEST = 1
+            start_date = datetime.now() - timedelta(days=30)
+            end_date = datetime.now() - timedelta(days=7)
+            pm.get_price_data(['AAPL'], output_dir_name, start_date, end_date)
+            minute_file = pathlib.Path(output_dir_name, 'minute', 'AAPL.csv')
+            daily_file = pathlib.Path(output_dir_name, 'daily', 'AAPL.csv')
+            old_minute_bytes = minute_file.read_bytes()
+            old_daily_bytes = daily_file.read_bytes()
+
+            # When updated
+            pm.num_requests = 0
+            today = datetime.now()
+            pm.update_price_data(output_dir_name, today)
+
+            # Then only the new sessions were requested
+            new_sessions = pm._calendar.sessions_in_range(
+                (end_date + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0), today)
+            self.assertEqual(len(new_sessions), pm.num_requests)
+
+            # And the new data was appended to the existing files.
+            self.assertTrue(minute_file.read_bytes().startswith(old_minute_bytes))
+            self.assertTrue(daily_file.read_bytes().startswith(old_daily_bytes))
+            df = pd.read_csv(daily_file, parse_dates=True, index_col='date')
+            self.assertTrue(df.index.is_monotonic_increasing)
+            self.assertFalse(df.index.has_duplicates)
+
+            # And updating again doesn't fetch any sessions.
+            pm.num_requests = 0
+            pm.update_price_data(output_dir_name, today)
+            self.assertEqual(0, pm.num_requests)
+
+    def test_update_command(self):
+        # Given an existing data dir with data up to a week ago
+        with tempfile.TemporaryDirectory() as output_dir_name:
+            start_date = datetime.now() - timedelta(days=30)
+            end_date = datetime.now() - timedelta(days=7)
+            azul.get_price_data('faang', 'mock_price_manager', output_dir_name, start_date, end_date)
+
+            # When the azul update command is run
+            runner = CliRunner()
+            result = runner.invoke(azul.cli, [
+                'update',
+                '--data-source', 'mock_price_manager',
+                '--output-dir', output_dir_name
+            ])
+
+            # Then it succeeds.
+            self.assertEqual(0, result.exit_code)
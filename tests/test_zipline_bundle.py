@@ -0,0 +1,39 @@
+import unittest
+from tests.mock_price_manager import MockPriceManager
+from azul.zipline_bundle import register_azul_bundle
+from zipline.data import bundles
+from datetime import datetime, timedelta
+import pandas as pd
+import tempfile
+
+
+class TestZiplineBundle(unittest.TestCase):
+
+    def test_ingest_from_price_manager(self):
+
+        # Given a bundle that gets its data from the mock price manager
+        end_date = datetime.now() - timedelta(days=1)
+        start_date = end_date - timedelta(days=10)
+        register_azul_bundle('azul-test', 'faang', 'mock_price_manager', start=start_date, end=end_date)
+
+        with tempfile.TemporaryDirectory() as zipline_root:
+            environ = {'ZIPLINE_ROOT': zipline_root}
+
+            # When it is ingested
+            bundles.ingest('azul-test', environ=environ, show_progress=False)
+
+            # Then zipline can find the assets
+            bundle_data = bundles.load('azul-test', environ=environ)
+            assets = bundle_data.asset_finder.lookup_symbols(['AAPL', 'FB'], as_of_date=None)
+            self.assertEqual(['AAPL', 'FB'], [asset.symbol for asset in assets])
+
+            # And read their minute and daily bars.
+            aapl = assets[0]
+            last_session = bundle_data.equity_daily_bar_reader.last_available_dt
+            close = bundle_data.equity_daily_bar_reader.get_value(aapl.sid, last_session, 'close')
+            self.assertEqual(13.0, close)
+            last_minute = bundle_data.equity_minute_bar_reader.last_available_dt
+            volume = bundle_data.equity_minute_bar_reader.get_value(aapl.sid, last_minute, 'volume')
+            self.assertEqual(100000, volume)
+
+        bundles.unregister('azul-test')